@@ -55,7 +55,7 @@ class BaseAnnotationProvider(ABC):
         pass
 
     @abstractmethod
-    def get_annotations(self, db: Session, file_id: int) -> List[models.Annotation]:
+    def get_annotations(self, db: Session, file_id: int) -> List[Dict[str, Any]]:
         """
         取得檔案的所有標註
         
@@ -64,7 +64,7 @@ class BaseAnnotationProvider(ABC):
             file_id: 檔案 ID
             
         Returns:
-            List[models.Annotation]: 標註列表
+            List[Dict[str, Any]]: 標註列表（id/file_id/data/source/created_at 欄位字典）
         """
         pass
 
@@ -89,8 +89,19 @@ class LocalAnnotationProvider(BaseAnnotationProvider):
         db.refresh(db_annotation)
         return db_annotation
 
-    def get_annotations(self, db: Session, file_id: int) -> List[models.Annotation]:
-        """從本地資料庫查詢標註"""
-        return db.query(models.Annotation).filter(models.Annotation.file_id == file_id).all()
+    def get_annotations(self, db: Session, file_id: int) -> List[Dict[str, Any]]:
+        """從本地資料庫查詢標註（只選取欄位，不建立 ORM 物件）"""
+        rows = (
+            db.query(
+                models.Annotation.id,
+                models.Annotation.file_id,
+                models.Annotation.data,
+                models.Annotation.source,
+                models.Annotation.created_at,
+            )
+            .filter(models.Annotation.file_id == file_id)
+            .all()
+        )
+        return [row._asdict() for row in rows]
 
 
@@ -21,7 +21,7 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_db
-from ..security import get_current_user_optional, is_offline_user
+from ..security import get_current_user_optional, require_online_user
 from ..services.classification_service import FileClassificationService
 
 logger = logging.getLogger(__name__)
@@ -50,15 +50,9 @@ classification_service = FileClassificationService()
 def batch_classify_files(
     request: schemas.BatchClassificationRequest,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(require_online_user),
 ):
     """批量分類檔案"""
-    # 檢查離線模式
-    if is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="離線模式下不允許執行批量分類。請登錄後執行此操作。",
-        )
     # 檢查權限（需要 editor 或 admin）
     if current_user.get("role") not in ["editor", "admin"]:
         raise HTTPException(
@@ -182,15 +176,9 @@ def auto_classify_file(
     auto_tag: bool = True,
     auto_create_tags: bool = True,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(require_online_user),
 ):
     """自動分類單個檔案"""
-    # 檢查離線模式
-    if is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="離線模式下不允許執行檔案分類。請登錄後執行此操作。",
-        )
     # 檢查權限
     if current_user.get("role") not in ["editor", "admin"]:
         raise HTTPException(
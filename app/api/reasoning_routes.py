@@ -22,6 +22,11 @@ router = APIRouter(prefix="/reasoning", tags=["reasoning"])
 storage = LocalStorage()
 
 
+def get_reasoning_service(db: Session = Depends(database.get_db)) -> ReasoningService:
+    """Build one ReasoningService per request, bound to the shared storage."""
+    return ReasoningService(db, storage=storage)
+
+
 def _serialize_chain(chain: models.ReasoningChain, include_nodes: bool = False) -> Dict[str, Any]:
     payload = {
         "id": str(chain.id),
@@ -94,18 +99,11 @@ def _serialize_execution_detail(execution: models.ReasoningExecution) -> Dict[st
 )
 def create_reasoning_chain(
     chain_data: schemas.ReasoningChainCreate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(security.get_current_user_optional),
+    service: ReasoningService = Depends(get_reasoning_service),
+    current_user = Depends(security.require_online_user),
 ):
     """Create a reasoning chain."""
-    # Check if offline user tries to create chain
-    if security.is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="離線模式下不允許建立推理鏈。請登錄後執行此操作。"
-        )
     try:
-        service = ReasoningService(db, storage=storage)
         chain = service.create_chain(
             name=chain_data.name,
             description=chain_data.description or "",
@@ -124,12 +122,11 @@ def create_reasoning_chain(
 def list_reasoning_chains(
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(database.get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user = Depends(security.get_current_user_optional),
 ):
     """List reasoning chains."""
     try:
-        service = ReasoningService(db, storage=storage)
         chains = service.list_chains(skip=skip, limit=limit)
         return [_serialize_chain(chain) for chain in chains]
     except Exception as exc:
@@ -140,12 +137,11 @@ def list_reasoning_chains(
 @router.get("/chains/{chain_id}", response_model=schemas.ReasoningChainResponse)
 def get_reasoning_chain(
     chain_id: str,
-    db: Session = Depends(database.get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user = Depends(security.get_current_user_optional),
 ):
     """Get a reasoning chain."""
     try:
-        service = ReasoningService(db, storage=storage)
         chain = service.get_chain(UUID(chain_id))
         if not chain:
             raise HTTPException(status_code=404, detail="Chain not found")
@@ -161,18 +157,11 @@ def get_reasoning_chain(
 def update_reasoning_chain(
     chain_id: str,
     update_data: schemas.ReasoningChainUpdate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(security.get_current_user_optional),
+    service: ReasoningService = Depends(get_reasoning_service),
+    current_user = Depends(security.require_online_user),
 ):
     """Update a reasoning chain."""
-    # Check if offline user tries to update chain
-    if security.is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="離線模式下不允許修改推理鏈。請登錄後執行此操作。"
-        )
     try:
-        service = ReasoningService(db, storage=storage)
         nodes: Optional[List[Dict[str, Any]]] = None
         if update_data.nodes is not None:
             nodes = [node.model_dump() for node in update_data.nodes]
@@ -196,18 +185,11 @@ def update_reasoning_chain(
 @router.delete("/chains/{chain_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_reasoning_chain(
     chain_id: str,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(security.get_current_user_optional),
+    service: ReasoningService = Depends(get_reasoning_service),
+    current_user = Depends(security.require_online_user),
 ):
     """Delete a reasoning chain."""
-    # Check if offline user tries to delete chain
-    if security.is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="離線模式下不允許刪除推理鏈。請登錄後執行此操作。"
-        )
     try:
-        service = ReasoningService(db, storage=storage)
         service.delete_chain(UUID(chain_id))
         logger.info("Deleted reasoning chain: %s", chain_id)
     except Exception as exc:
@@ -222,18 +204,11 @@ def delete_reasoning_chain(
 def execute_reasoning_chain(
     chain_id: str,
     payload: schemas.ReasoningExecuteRequest = Body(default_factory=schemas.ReasoningExecuteRequest),
-    db: Session = Depends(database.get_db),
-    current_user = Depends(security.get_current_user_optional),
+    service: ReasoningService = Depends(get_reasoning_service),
+    current_user = Depends(security.require_online_user),
 ):
     """Execute a reasoning chain."""
-    # Check if offline user tries to execute chain
-    if security.is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="離線模式下不允許執行推理鏈。請登錄後執行此操作。"
-        )
     try:
-        service = ReasoningService(db, storage=storage)
         execution = service.execute_chain(
             UUID(chain_id),
             payload.input_data or {},
@@ -254,12 +229,11 @@ def execute_reasoning_chain(
 )
 def get_execution_result(
     execution_id: str,
-    db: Session = Depends(database.get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user = Depends(security.get_current_user),
 ):
     """Get execution result."""
     try:
-        service = ReasoningService(db, storage=storage)
         execution = service.get_execution(UUID(execution_id))
         if not execution:
             raise HTTPException(status_code=404, detail="Execution not found")
@@ -278,12 +252,11 @@ def get_execution_result(
 def get_reasoning_chain_history(
     chain_id: str,
     days: int = 30,
-    db: Session = Depends(database.get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user = Depends(security.get_current_user),
 ):
     """Get execution history for a chain."""
     try:
-        service = ReasoningService(db, storage=storage)
         history = service.get_execution_history(UUID(chain_id), days=days)
         if not history:
             raise HTTPException(status_code=404, detail="Chain history not found")
@@ -303,12 +276,11 @@ def list_chain_executions(
     chain_id: str,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(database.get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user = Depends(security.get_current_user),
 ):
     """List executions for a specific chain."""
     try:
-        service = ReasoningService(db, storage=storage)
         executions = service.list_executions(UUID(chain_id), skip=skip, limit=limit)
         return [_serialize_execution_summary(execution) for execution in executions]
     except Exception as exc:
@@ -17,6 +17,8 @@ Redis 快取層模組
 
 import os
 import json
+import time
+import hashlib
 import logging
 from typing import Optional, Any, Dict
 from functools import wraps
@@ -160,5 +162,65 @@ def cache_result(ttl: int = DEFAULT_TTL, key_prefix: str = ""):
     return decorator
 
 
+def _response_body(result: Any) -> bytes:
+    """將端點回傳值轉為 JSON bytes（已是 Response 時直接取其 body）"""
+    body = getattr(result, "body", None)
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body)
+    import orjson
+    return orjson.dumps(result)
+
+
+def cached_response(ttl: int, key_prefix: str = "", stale_ttl: int = 0):
+    """FastAPI 端點回應快取裝飾器
+
+    - 以端點名稱與查詢參數的 SHA1 作為快取鍵
+    - 命中時直接回傳快取的 JSON bytes，不執行端點（不觸及資料庫）
+    - 過期後仍保留 stale_ttl 秒；若重新計算失敗則回傳舊資料
+
+    使用範例：
+    @app.get("/classification/stats")
+    @cached_response(ttl=30, stale_ttl=300)
+    def get_classification_stats(db: Session = Depends(get_db)):
+        ...
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            from fastapi.responses import Response
+
+            params = sorted(
+                (k, str(v)) for k, v in kwargs.items()
+                if isinstance(v, (str, int, float, bool, type(None)))
+            )
+            digest = hashlib.sha1(repr(params).encode("utf-8")).hexdigest()
+            cache_key = CacheManager.get_cache_key("response", key_prefix or func.__name__, digest)
+
+            entry = CacheManager.get(cache_key)
+            now = time.time()
+            if entry is not None and now - entry["ts"] < ttl:
+                logger.debug(f"回應快取命中: {cache_key}")
+                return Response(content=entry["body"], media_type="application/json")
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                if entry is not None and now < entry["stale_ok_until"]:
+                    logger.warning(f"重新計算失敗，回傳過期快取: {cache_key}")
+                    return Response(content=entry["body"], media_type="application/json")
+                raise
+
+            body = _response_body(result)
+            CacheManager.set(
+                cache_key,
+                {"body": body.decode("utf-8"), "ts": now, "stale_ok_until": now + ttl + stale_ttl},
+                ttl + stale_ttl,
+            )
+            return Response(content=body, media_type="application/json")
+
+        return wrapper
+    return decorator
+
+
 # 初始化 Redis 連線
 init_redis()
@@ -0,0 +1,17 @@
+"""
+Shared pytest hooks for the app test suite.
+"""
+
+import pytest
+
+import app.main as main
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """User ids repeat across per-test databases; never carry cached snapshots between tests."""
+    with main._user_cache_lock:
+        main._user_cache.clear()
+    yield
+    with main._user_cache_lock:
+        main._user_cache.clear()
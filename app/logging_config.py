@@ -20,10 +20,13 @@ logger.info("Application started")
 - CRITICAL: 嚴重錯誤
 """
 
+import atexit
+import copy
 import logging
 import logging.handlers
 import json
 import os
+import queue
 import sys
 from datetime import datetime
 from typing import Optional
@@ -56,9 +59,11 @@ class StructuredFormatter(logging.Formatter):
             "line": record.lineno,
         }
         
-        # 添加額外信息
+        # 添加額外信息（經由佇列傳遞的記錄只保留已格式化的 exc_text）
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_data["exception"] = record.exc_text
         
         # 添加自定義字段（如果有）
         if hasattr(record, "custom_fields"):
@@ -82,6 +87,48 @@ class TextFormatter(logging.Formatter):
         return formatter.format(record)
 
 
+# ============================================================================
+# 非同步日誌佇列
+# ============================================================================
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    佇列處理器：請求路徑上只做一次 put_nowait，實際 I/O 交給背景執行緒
+
+    與標準 QueueHandler 不同，送入佇列前只合併訊息參數，
+    例外資訊以 exc_text 保留，讓下游格式化器（JSON/文字）自行輸出。
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# 背景日誌監聽器（全域單例，重新配置時會先停止舊的監聽器）
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stop_queue_listener() -> None:
+    """停止背景監聽器並關閉實際輸出的處理器（會先清空佇列）"""
+    global _queue_listener
+    if _queue_listener is None:
+        return
+    listener, _queue_listener = _queue_listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(_stop_queue_listener)
+
+
 # ============================================================================
 # 日誌配置函數
 # ============================================================================
@@ -105,6 +152,9 @@ def configure_logging(
     """
     配置全域日誌系統
     
+    根日誌記錄器只掛載 QueueHandler，控制台與檔案輸出由背景
+    QueueListener 執行，避免日誌 I/O 阻塞請求。
+    
     【參數】
     level: 日誌級別 (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     log_format: 日誌格式 (text, json)
@@ -113,6 +163,7 @@ def configure_logging(
     【範例】
     configure_logging(level="DEBUG", log_format="json")
     """
+    global _queue_listener
     is_pytest = "PYTEST_CURRENT_TEST" in os.environ or any("pytest" in arg for arg in sys.argv)
     if is_pytest:
         log_file = None
@@ -125,10 +176,11 @@ def configure_logging(
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, level.upper()))
     
-    # 移除現有處理器
+    # 移除現有處理器，並停止先前的背景監聽器
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
         handler.close()
+    _stop_queue_listener()
     
     # 選擇格式化器
     if log_format.lower() == "json":
@@ -140,9 +192,10 @@ def configure_logging(
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(getattr(logging, level.upper()))
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    output_handlers = [console_handler]
     
     # 2. 檔案處理器（若指定）
+    file_handler_error = None
     if log_file:
         try:
             file_handler = logging.handlers.RotatingFileHandler(
@@ -153,9 +206,20 @@ def configure_logging(
             )
             file_handler.setLevel(getattr(logging, level.upper()))
             file_handler.setFormatter(formatter)
-            root_logger.addHandler(file_handler)
+            output_handlers.append(file_handler)
         except Exception as e:
-            root_logger.warning(f"無法設置檔案日誌處理器: {e}")
+            file_handler_error = e
+    
+    # 3. 佇列處理器 + 背景監聽器
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    root_logger.addHandler(RecordQueueHandler(log_queue))
+    _queue_listener = logging.handlers.QueueListener(
+        log_queue, *output_handlers, respect_handler_level=True
+    )
+    _queue_listener.start()
+    
+    if file_handler_error is not None:
+        root_logger.warning(f"無法設置檔案日誌處理器: {file_handler_error}")
     
     root_logger.info(f"日誌配置完成: level={level}, format={log_format}, file={log_file}")
 
@@ -32,38 +32,72 @@ LabFlow API - 實驗室資料管理系統後端
 - STORAGE_PATH：檔案儲存路徑（預設：data/managed）
 """
 
+import asyncio
 import os
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 from uuid import UUID, uuid4
 
+import anyio.to_thread
+import orjson
+from cachetools import TTLCache
 from fastapi import (
+    BackgroundTasks,
     Body,
     Depends,
     FastAPI,
     File,
     Header,
     HTTPException,
+    Query,
     Request,
     UploadFile,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    ORJSONResponse,
+    Response,
+    StreamingResponse,
+)
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import Column, MetaData, Table, Text, exists, false, func, insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
 
 from . import annotation, database, i18n, models, schemas, security
 from .api.classification_routes import router as classification_router
+from .cache import cached_response
 from .api.reasoning_routes import router as reasoning_router
 from .logging_config import configure_logging, get_logger, log_with_context
 from .models import file_tags
-from .services.analysis_service import AnalysisService, AnalysisServiceError
+from .query_optimization import (
+    file_count,
+    load_file_children,
+    optimize_file_query,
+    reset_request_query_cache,
+)
+from .services.analysis_service import (
+    AnalysisService,
+    AnalysisServiceError,
+    AnalysisToolRegistry,
+)
 from .services.classification_service import FileClassificationService
 from .services.reasoning_service import ReasoningService
-from .services.script_service import ScriptService
-from .storage import LocalStorage, calculate_file_hash
+from .services.script_service import (
+    ScriptNotFoundError,
+    ScriptService,
+    ScriptServiceError,
+)
+from .storage import LocalStorage, calculate_file_hash, get_io_executor
 
 # 設定日誌
 configure_logging()
@@ -72,6 +106,17 @@ logger = get_logger(__name__)
 # 初始化資料庫 (若 labflow.db 不存在會自動建立)
 models.Base.metadata.create_all(bind=database.engine)
 
+# 同步端點在 anyio 執行緒池中執行，每個請求佔用一條執行緒直到資料庫往返結束；
+# 預設 40 條執行緒會成為批次端點的並行上限，這裡至少放大到連線池可承受的連線數
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(max(40, database.DB_MAX_CONNECTIONS))))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+
+
 app = FastAPI(
     title="LabFlow API",
     description="實驗室研究資料管理系統 - 支援檔案去重、標籤、結論、結構化標註、JWT 身份驗證",
@@ -79,39 +124,61 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    # orjson 序列化比標準 json 快數倍，且原生支援 datetime/UUID
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+
+# 不記錄請求日誌的路徑（健康檢查等高頻探測），可由環境變數 LOG_SKIP_PATHS 以逗號覆寫
+_SKIP_LOG_PATHS = frozenset(
+    path.strip()
+    for path in os.getenv("LOG_SKIP_PATHS", "/,/health").split(",")
+    if path.strip()
 )
+_log_request_info = logger.info
 
 
 @app.middleware("http")
 async def request_observability_middleware(request: Request, call_next):
+    # 每個請求使用獨立的查詢語句快取
+    reset_request_query_cache()
+    path = request.url.path
     request_id = request.headers.get("X-Request-Id") or str(uuid4())
-    start_time = time.perf_counter()
+    if path in _SKIP_LOG_PATHS:
+        # 健康檢查等高頻路徑不計時、不記錄日誌，但仍回傳關聯 ID
+        response = await call_next(request)
+        response.headers["X-Request-Id"] = request_id
+        return response
+
+    start_ns = time.perf_counter_ns()
     try:
         response = await call_next(request)
     except Exception as exc:
-        duration_ms = (time.perf_counter() - start_time) * 1000
         log_with_context(
             logger,
             "error",
             "Request failed",
             request_id=request_id,
             method=request.method,
-            path=request.url.path,
-            duration_ms=round(duration_ms, 2),
+            path=path,
+            duration_us=(time.perf_counter_ns() - start_ns) // 1000,
             error=str(exc),
         )
         raise
-    duration_ms = (time.perf_counter() - start_time) * 1000
+    duration_us = (time.perf_counter_ns() - start_ns) // 1000
     response.headers["X-Request-Id"] = request_id
-    log_with_context(
-        logger,
-        "info",
+    _log_request_info(
         "Request completed",
-        request_id=request_id,
-        method=request.method,
-        path=request.url.path,
-        status_code=response.status_code,
-        duration_ms=round(duration_ms, 2),
+        extra={
+            "custom_fields": {
+                "request_id": request_id,
+                "method": request.method,
+                "path": path,
+                "status_code": response.status_code,
+                "duration_us": duration_us,
+            }
+        },
     )
     return response
 
@@ -125,8 +192,10 @@ app.add_middleware(
         "http://127.0.0.1:3000",
     ],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # 明確列出方法與標頭（取代 "*"），讓預檢回應固定並由瀏覽器快取 24 小時
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type", "X-Request-Id", "If-None-Match"],
+    max_age=86400,
 )
 
 
@@ -217,6 +286,31 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+# 預先序列化的 OpenAPI 文件（首次請求時建立）
+_openapi_bytes: Optional[bytes] = None
+
+
+def get_openapi_bytes() -> bytes:
+    """取得序列化後的 OpenAPI 文件，避免每次請求 /openapi.json 都重新編碼"""
+    global _openapi_bytes
+    if _openapi_bytes is None:
+        _openapi_bytes = orjson.dumps(app.openapi())
+    return _openapi_bytes
+
+
+# 以快取的 bytes 取代 FastAPI 內建的 /openapi.json 路由
+app.router.routes = [
+    route
+    for route in app.router.routes
+    if getattr(route, "path", None) != app.openapi_url
+]
+
+
+@app.get(app.openapi_url, include_in_schema=False)
+def openapi_json():
+    return Response(get_openapi_bytes(), media_type="application/json")
+
+
 app.include_router(reasoning_router)
 app.include_router(classification_router)
 
@@ -229,6 +323,9 @@ storage = LocalStorage()
 # 建立全域檔案分類服務實例
 classification_service = FileClassificationService()
 
+# 分析工具規格於啟動時序列化一次，各請求共用
+analysis_registry = AnalysisToolRegistry()
+
 # 最大上傳大小（bytes），可由環境變數覆寫，預設 50 MiB
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
 
@@ -245,22 +342,79 @@ def get_db():
         db.close()
 
 
-def check_offline_write(current_user: Dict[str, Any], operation: str = "修改") -> None:
+def get_reasoning_service(db: Session = Depends(get_db)) -> ReasoningService:
+    """每個請求建立一個 ReasoningService，共用全域 storage"""
+    return ReasoningService(db, storage=storage)
+
+
+def get_session_factory(db: Session = Depends(get_db)) -> Callable[[], Session]:
+    """
+    與請求 session 使用同一引擎的 session 工廠
+
+    背景工作在請求 session 關閉後才執行，需自行開啟 session；
+    引擎取自請求 session，因此會跟隨 get_db 的依賴覆寫（如測試資料庫）
+    """
+    return sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+
+
+def run_reasoning_execution(
+    execution_id: UUID, session_factory: Callable[[], Session]
+) -> None:
+    """背景執行推理鏈；請求的 session 在回應後即關閉，因此以工廠開啟新的 session"""
+    db = session_factory()
+    try:
+        ReasoningService(db, storage=storage).run_execution(execution_id)
+    except Exception as e:
+        logger.error(f"背景推理鏈執行失敗: {execution_id} - {e}")
+    finally:
+        db.close()
+
+
+# 用戶快照快取（user_id -> 用戶欄位），減少 /auth/refresh 與 /users/me 的資料庫往返
+# 多 worker 部署時各程序各自快取，以短 TTL 控制資料延遲
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
+_user_cache: TTLCache = TTLCache(maxsize=10000, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+
+
+def get_cached_user(db: Session, user_id: int, fresh: bool = False) -> Optional[Dict[str, Any]]:
     """
-    檢查離線用戶是否嘗試修改操作
+    取得用戶快照（優先讀取快取，未命中時查詢資料庫並寫入快取）
 
     Args:
-        current_user: 當前用戶信息
-        operation: 操作名稱（用於錯誤訊息）
+        fresh: 略過快取直接讀取資料庫並更新快取（授權判斷用，避免沿用過期的 is_active/role）
 
-    Raises:
-        HTTPException: 若為離線用戶且嘗試修改
+    Returns:
+        包含 id/username/email/role/is_active/created_at 的字典；用戶不存在時為 None
     """
-    if security.is_offline_user(current_user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"離線模式下不允許執行 {operation} 操作。請登錄後執行此操作。",
-        )
+    if not fresh:
+        with _user_cache_lock:
+            cached = _user_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        invalidate_cached_user(user_id)
+        return None
+
+    snapshot = {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "role": user.role,
+        "is_active": bool(user.is_active),
+        "created_at": user.created_at,
+    }
+    with _user_cache_lock:
+        _user_cache[user_id] = snapshot
+    return snapshot
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    """用戶資料變更或刪除時清除快取"""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
 
 
 # 定義接收資料的格式
@@ -340,16 +494,15 @@ def translate_key(locale: str, key: str):
 @app.get(
     "/analysis/tools", response_model=List[schemas.AnalysisToolSpec], tags=["分析工具"]
 )
-def list_analysis_tools(db: Session = Depends(get_db)):
-    service = AnalysisService(db, storage)
-    return service.list_tools()
+def list_analysis_tools():
+    return analysis_registry.list_tools()
 
 
 @app.post(
     "/analysis/run", response_model=schemas.AnalysisRunResponse, tags=["分析工具"]
 )
 def run_analysis(request: schemas.AnalysisRunRequest, db: Session = Depends(get_db)):
-    service = AnalysisService(db, storage)
+    service = AnalysisService(db, storage, registry=analysis_registry)
     try:
         result = service.run_tool(
             tool_id=request.tool_id,
@@ -380,24 +533,24 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
     - 對密碼進行 bcrypt 雜湊
     - 預設角色為 viewer
     """
-    # 檢查用戶名稱是否已存在
-    existing_user = (
-        db.query(models.User).filter(models.User.username == user_data.username).first()
+    # 以單一 EXISTS 查詢同時檢查用戶名稱與郵件，不載入整列資料
+    email_taken = (
+        exists().where(models.User.email == user_data.email)
+        if user_data.email
+        else false()
     )
-    if existing_user:
+    username_taken, email_taken = db.query(
+        exists().where(models.User.username == user_data.username),
+        email_taken,
+    ).one()
+    if username_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="用戶名稱已存在"
         )
-
-    # 檢查郵件是否已存在
-    if user_data.email:
-        existing_email = (
-            db.query(models.User).filter(models.User.email == user_data.email).first()
+    if email_taken:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="郵件已被使用"
         )
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="郵件已被使用"
-            )
 
     # 建立新用戶
     hashed_password = security.hash_password(user_data.password)
@@ -408,7 +561,14 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         role="viewer",
     )
     db.add(db_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 併發註冊時由唯一索引兜底
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="用戶名稱或郵件已存在"
+        )
     db.refresh(db_user)
 
     logger.info(f"新用戶已註冊: {user_data.username}")
@@ -475,21 +635,21 @@ def refresh_token(token_req: security.TokenRequest, db: Session = Depends(get_db
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="無效的刷新令牌"
             )
 
-        # 從資料庫重新查詢用戶信息
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        if not user or not user.is_active:
+        # 確認用戶仍存在且啟用；is_active/role 決定是否核發新令牌，一律從資料庫讀取
+        user = get_cached_user(db, user_id, fresh=True)
+        if not user or not user["is_active"]:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="用戶不存在或已停用"
             )
 
         # 建立新的 access_token
         access_token = security.create_access_token(
-            {"sub": user.id, "username": user.username, "role": user.role}
+            {"sub": user["id"], "username": user["username"], "role": user["role"]}
         )
 
         # 建立新的 refresh_token
         new_refresh_token = security.create_refresh_token(
-            {"sub": user.id, "username": user.username}
+            {"sub": user["id"], "username": user["username"]}
         )
 
         return {
@@ -514,7 +674,7 @@ def get_current_user_info(
 
     - 需要提供有效的 Bearer token
     """
-    user = db.query(models.User).filter(models.User.id == current_user["id"]).first()
+    user = get_cached_user(db, current_user["id"])
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用戶不存在")
@@ -567,6 +727,7 @@ def update_user(
 
     db.commit()
     db.refresh(user)
+    invalidate_cached_user(user_id)
     return user
 
 
@@ -587,6 +748,7 @@ def delete_user(
 
     db.delete(user)
     db.commit()
+    invalidate_cached_user(user_id)
     logger.info(f"用戶已刪除: {user.username}")
     return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content=None)
 
@@ -599,7 +761,7 @@ async def upload_file(
     file: UploadFile = File(...),
     auto_classify: bool = True,
     auto_tag: bool = True,
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
     """
@@ -622,8 +784,6 @@ async def upload_file(
     - 403: 離線模式下無法上傳
     - 500: 伺服器錯誤
     """
-    # 檢查離線用戶是否嘗試上傳
-    check_offline_write(current_user, "檔案上傳")
     try:
         # 驗證檔案不為空
         if not file or not file.filename:
@@ -666,8 +826,8 @@ async def upload_file(
             filename=file.filename, storage_key=storage_key, file_hash=file_hash
         )
         db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
+        # flush 取得主鍵即可，整個上傳流程最後只 commit 一次
+        db.flush()
 
         # 自動分類和標籤
         if auto_classify:
@@ -676,57 +836,61 @@ async def upload_file(
                     file.filename
                 )
                 logger.info(
-                    f"檔案分類完成: {file.filename} -> {classification_result.file_type} "
-                    f"(confidence: {classification_result.confidence:.2f})"
+                    "檔案分類完成: %s -> %s (confidence: %.2f)",
+                    file.filename,
+                    classification_result.file_type,
+                    classification_result.confidence,
                 )
 
-                # 自動添加標籤
+                # 自動添加標籤（以 SAVEPOINT 包覆，失敗時不影響檔案記錄）
                 if auto_tag and classification_result.suggested_tags:
-                    for tag_name in classification_result.suggested_tags:
-                        # 查找或創建標籤
-                        tag = (
-                            db.query(models.Tag)
-                            .filter(models.Tag.name == tag_name)
-                            .first()
-                        )
-                        if not tag:
-                            tag = models.Tag(name=tag_name)
-                            db.add(tag)
-                            db.commit()
-                            db.refresh(tag)
-                            logger.info(f"創建新標籤: {tag_name}")
-
-                        # 添加標籤到檔案（避免重複）
-                        if tag not in db_file.tags:
-                            db_file.tags.append(tag)
-
-                    db.commit()
-                    db.refresh(db_file)
+                    with db.begin_nested():
+                        # 標籤名稱唯一；以集合判斷重複（新建標籤尚未 flush，沒有 id）
+                        existing_tag_names = {tag.name for tag in db_file.tags}
+                        for tag_name in dict.fromkeys(
+                            classification_result.suggested_tags
+                        ):
+                            # 查找或創建標籤
+                            tag = (
+                                db.query(models.Tag)
+                                .filter(models.Tag.name == tag_name)
+                                .first()
+                            )
+                            if not tag:
+                                tag = models.Tag(name=tag_name)
+                                db.add(tag)
+                                logger.info(f"創建新標籤: {tag_name}")
+
+                            # 添加標籤到檔案（避免重複）
+                            if tag_name not in existing_tag_names:
+                                db_file.tags.append(tag)
+                                existing_tag_names.add(tag_name)
                     logger.info(
                         f"已自動添加 {len(classification_result.suggested_tags)} 個標籤"
                     )
 
                 # 將分類元數據存儲為註解
                 if classification_result.metadata:
-                    annotation = models.Annotation(
-                        file_id=db_file.id,
-                        data={
-                            "classification": {
-                                "file_type": classification_result.file_type,
-                                "confidence": classification_result.confidence,
-                                "metadata": classification_result.metadata,
-                            }
-                        },
-                        source="auto_classification",
-                    )
-                    db.add(annotation)
-                    db.commit()
+                    with db.begin_nested():
+                        annotation = models.Annotation(
+                            file_id=db_file.id,
+                            data={
+                                "classification": {
+                                    "file_type": classification_result.file_type,
+                                    "confidence": classification_result.confidence,
+                                    "metadata": classification_result.metadata,
+                                }
+                            },
+                            source="auto_classification",
+                        )
+                        db.add(annotation)
                     logger.info("已存儲分類元數據為註解")
 
             except Exception as e:
                 logger.error(f"自動分類失敗: {str(e)}")
                 # 分類失敗不影響檔案上傳
 
+        db.commit()
         return db_file
 
     except HTTPException:
@@ -745,8 +909,24 @@ def read_files(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     取得所有檔案列表
     - 支援分頁（skip/limit）
     """
-    files = db.query(models.File).offset(skip).limit(limit).all()
-    return files
+    # 回應模型會序列化 tags/conclusions/annotations：
+    # 檔案一次查詢，三種關聯再以單一 UNION ALL 查詢載入（共兩次往返，與檔案數量無關）
+    stmt = optimize_file_query(db, with_relations=False).offset(skip).limit(limit)
+    files = db.execute(stmt).scalars().all()
+    tags, conclusions, annotations = load_file_children(db, [f.id for f in files])
+    return [
+        {
+            "id": f.id,
+            "filename": f.filename,
+            "storage_key": f.storage_key,
+            "file_hash": f.file_hash,
+            "created_at": f.created_at,
+            "tags": tags[f.id],
+            "conclusions": conclusions[f.id],
+            "annotations": annotations[f.id],
+        }
+        for f in files
+    ]
 
 
 @app.get("/files/search")
@@ -766,7 +946,8 @@ def search_files(
     if tag_id:
         query = query.join(models.File.tags).filter(models.Tag.id == tag_id)
 
-    total = query.count()
+    # 未篩選時總數直接讀取 file_stats 計數列，不掃描整張 files
+    total = query.count() if q or tag_id else file_count(db)
     items = query.offset(skip).limit(limit).all()
     return {"items": items, "total": total, "limit": limit, "offset": skip}
 
@@ -781,33 +962,63 @@ def get_file(file_id: int, db: Session = Depends(get_db)):
     return file
 
 
+# 檔案以內容雜湊定址，同一 ID 的內容不會改變，可長期快取
+DOWNLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判斷 If-None-Match 是否命中（支援多值、弱比較與 *）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
 @app.get("/files/{file_id}/download")
-def download_file(file_id: int, db: Session = Depends(get_db)):
+def download_file(file_id: int, request: Request, db: Session = Depends(get_db)):
     file = db.query(models.File).filter(models.File.id == file_id).first()
     if not file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"檔案 ID {file_id} 不存在"
         )
+
+    # 以檔案雜湊作為強 ETag，客戶端已有相同內容時直接回傳 304，不讀取磁碟
+    etag = f'"{file.file_hash}"'
+    cache_headers = {"ETag": etag, "Cache-Control": DOWNLOAD_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
     path = file.storage_key
-    if not os.path.exists(path):
+    # 只做一次 stat，並交給 FileResponse 重用，避免 exists + stat 兩次系統呼叫
+    try:
+        stat_result = os.stat(path)
+    except OSError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="實體檔案不存在"
         )
     return FileResponse(
-        path, media_type="application/octet-stream", filename=file.filename
+        path,
+        media_type="application/octet-stream",
+        filename=file.filename,
+        stat_result=stat_result,
+        headers=cache_headers,
     )
 
 
 @app.delete("/files/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_file(
     file_id: int,
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
     """刪除檔案"""
-    # 檢查離線用戶
-    check_offline_write(current_user, "檔案刪除")
-
     file = db.query(models.File).filter(models.File.id == file_id).first()
     if not file:
         raise HTTPException(
@@ -834,14 +1045,12 @@ def list_tags(db: Session = Depends(get_db)):
 def add_tag_to_file_body(
     file_id: int,
     payload: Dict[str, int],
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
     """
     新增標籤關聯（接受 body: {"tag_id": int}），相容於文件規格
     """
-    check_offline_write(current_user, "標籤添加")
-
     tag_id = payload.get("tag_id")
     if tag_id is None:
         raise HTTPException(
@@ -876,11 +1085,9 @@ def add_tag_to_file_body(
 def remove_tag_from_file(
     file_id: int,
     tag_id: int,
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
-    check_offline_write(current_user, "標籤移除")
-
     file = db.query(models.File).filter(models.File.id == file_id).first()
     tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
     if not file or not tag:
@@ -893,27 +1100,43 @@ def remove_tag_from_file(
     return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, content=None)
 
 
-@app.get("/files/{file_id}/conclusions/", response_model=List[schemas.Conclusion])
-def get_conclusions(file_id: int, db: Session = Depends(get_db)):
-    file = db.query(models.File).filter(models.File.id == file_id).first()
-    if not file:
+def _file_exists(db: Session, file_id: int) -> bool:
+    """以 EXISTS 探測檔案是否存在，不載入整列資料"""
+    return db.query(exists().where(models.File.id == file_id)).scalar()
+
+
+# 列表端點直接回傳欄位字典（response_model=None），略過 Pydantic 對 ORM 物件的二次驗證；
+# 回應結構仍透過 responses 記錄在 OpenAPI 文件中
+@app.get(
+    "/files/{file_id}/conclusions/",
+    response_model=None,
+    responses={200: {"model": List[schemas.Conclusion]}},
+)
+def get_conclusions(file_id: int, db: Session = Depends(get_db)) -> List[Dict[str, Any]]:
+    if not _file_exists(db, file_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"檔案 ID {file_id} 不存在"
         )
-    return (
-        db.query(models.Conclusion).filter(models.Conclusion.file_id == file_id).all()
+    rows = (
+        db.query(
+            models.Conclusion.id,
+            models.Conclusion.file_id,
+            models.Conclusion.content,
+            models.Conclusion.created_at,
+        )
+        .filter(models.Conclusion.file_id == file_id)
+        .all()
     )
+    return [row._asdict() for row in rows]
 
 
 @app.put("/conclusions/{conclusion_id}")
 def update_conclusion(
     conclusion_id: int,
     payload: Dict[str, str],
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
-    check_offline_write(current_user, "結論更新")
-
     c = (
         db.query(models.Conclusion)
         .filter(models.Conclusion.id == conclusion_id)
@@ -937,11 +1160,9 @@ def update_conclusion(
 @app.delete("/conclusions/{conclusion_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_conclusion(
     conclusion_id: int,
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
-    check_offline_write(current_user, "結論刪除")
-
     c = (
         db.query(models.Conclusion)
         .filter(models.Conclusion.id == conclusion_id)
@@ -959,7 +1180,7 @@ def delete_conclusion(
 @app.post("/tags/", response_model=schemas.Tag, status_code=status.HTTP_201_CREATED)
 def create_tag(
     tag: schemas.TagCreate,
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
     """
@@ -977,7 +1198,6 @@ def create_tag(
     - 400: 標籤名稱不能為空
     - 403: 離線模式下無法建立標籤
     """
-    check_offline_write(current_user, "標籤建立")
     if not tag.name or not tag.name.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="標籤名稱不能為空"
@@ -1007,7 +1227,7 @@ def create_tag(
 def add_tag_to_file(
     file_id: int,
     tag_id: int,
-    current_user: Dict[str, Any] = Depends(security.get_current_user_optional),
+    current_user: Dict[str, Any] = Depends(security.require_online_user),
     db: Session = Depends(get_db),
 ):
     """
@@ -1025,8 +1245,6 @@ def add_tag_to_file(
     - 200: 標籤添加成功
     - 404: 檔案或標籤不存在
     """
-    check_offline_write(current_user, "標籤添加")
-
     file = db.query(models.File).filter(models.File.id == file_id).first()
     tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
 
@@ -1081,8 +1299,7 @@ def create_conclusion(
             status_code=status.HTTP_400_BAD_REQUEST, detail="結論內容不能為空"
         )
 
-    file = db.query(models.File).filter(models.File.id == file_id).first()
-    if not file:
+    if not _file_exists(db, file_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"檔案 ID {file_id} 不存在"
         )
@@ -1124,8 +1341,7 @@ def add_annotation(file_id: int, ann: AnnotationCreate, db: Session = Depends(ge
     """
     try:
         # 驗證檔案是否存在
-        file = db.query(models.File).filter(models.File.id == file_id).first()
-        if not file:
+        if not _file_exists(db, file_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"檔案 ID {file_id} 不存在",
@@ -1152,8 +1368,12 @@ def add_annotation(file_id: int, ann: AnnotationCreate, db: Session = Depends(ge
         )
 
 
-@app.get("/files/{file_id}/annotations/", response_model=List[schemas.Annotation])
-def get_annotations(file_id: int, db: Session = Depends(get_db)):
+@app.get(
+    "/files/{file_id}/annotations/",
+    response_model=None,
+    responses={200: {"model": List[schemas.Annotation]}},
+)
+def get_annotations(file_id: int, db: Session = Depends(get_db)) -> List[Dict[str, Any]]:
     """
     取得檔案的所有註解端點
 
@@ -1168,8 +1388,7 @@ def get_annotations(file_id: int, db: Session = Depends(get_db)):
     - 404: 檔案不存在
     """
     # 檢查檔案是否存在
-    file = db.query(models.File).filter(models.File.id == file_id).first()
-    if not file:
+    if not _file_exists(db, file_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"檔案 ID {file_id} 不存在"
         )
@@ -1178,6 +1397,166 @@ def get_annotations(file_id: int, db: Session = Depends(get_db)):
 
 
 # --- 系統維護端點 ---
+
+# SQLite 單一語句的參數數量有上限，IN 查詢依此分批
+IN_CLAUSE_BATCH_SIZE = 500
+
+# 全表掃描時以 yield_per 分批讀取的列數，記憶體用量與批次大小成正比而非總筆數
+STREAM_BATCH_SIZE = 10000
+
+
+def _chunked(items: List[Any], size: int = IN_CLAUSE_BATCH_SIZE):
+    """將列表切成固定大小的批次"""
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _insert_tags(db: Session, names: List[str]) -> Dict[str, models.Tag]:
+    """
+    以單一多列 INSERT ... RETURNING 建立標籤（只寫入，不 commit）
+
+    SQLite/PostgreSQL 加上 ON CONFLICT DO NOTHING：並行請求已建立的同名標籤
+    不會報錯也不會回傳，由呼叫端再以 IN 查詢取回。
+    不支援多列 RETURNING 的資料庫（如 MySQL）改為先插入、再以 IN 查詢取回。
+    回傳實際新建的 標籤名稱 -> Tag。
+    """
+    if not names:
+        return {}
+    # 批次 INSERT 不經過 Tag 的 @validates，於此檢查
+    for name in names:
+        if not name or not name.strip():
+            raise ValueError("標籤名稱不能為空")
+        if len(name) > 100:
+            raise ValueError("標籤名稱長度不能超過 100 字元")
+
+    bind_dialect = db.get_bind().dialect
+    dialect = bind_dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(models.Tag).on_conflict_do_nothing(index_elements=["name"])
+    else:
+        stmt = insert(models.Tag)
+    created: Dict[str, models.Tag] = {}
+    for batch in _chunked(names):
+        rows = [{"name": name} for name in batch]
+        if bind_dialect.insert_executemany_returning:
+            created.update((tag.name, tag) for tag in db.scalars(stmt.returning(models.Tag), rows))
+        else:
+            db.execute(stmt, rows)
+            created.update(
+                (tag.name, tag)
+                for tag in db.scalars(select(models.Tag).where(models.Tag.name.in_(batch)))
+            )
+    return created
+
+
+def _bulk_delete_file_records(db: Session, file_ids: List[int]) -> None:
+    """
+    以 IN 批次刪除檔案記錄及其標籤關聯、註解、結論（不 commit）
+
+    使用 synchronize_session=False 跳過逐筆的 session 同步
+    """
+    for batch in _chunked(file_ids):
+        db.execute(file_tags.delete().where(file_tags.c.file_id.in_(batch)))
+        db.query(models.Annotation).filter(
+            models.Annotation.file_id.in_(batch)
+        ).delete(synchronize_session=False)
+        db.query(models.Conclusion).filter(
+            models.Conclusion.file_id.in_(batch)
+        ).delete(synchronize_session=False)
+        db.query(models.File).filter(models.File.id.in_(batch)).delete(
+            synchronize_session=False
+        )
+
+
+def _storage_existence_checker(
+    existing: Optional[Set[str]] = None, storage_keys: Optional[List[str]] = None
+):
+    """
+    建立檔案存在檢查函式
+
+    儲存目錄內的路徑以一次 scandir 掃描結果做集合查詢；
+    不在儲存目錄下的路徑（例如舊資料或外部路徑）才退回 os.path.exists。
+    若提供 storage_keys，這些外部路徑會先在 IO 執行緒池中並行檢查
+    """
+    root = os.path.abspath(storage.base_dir) + os.sep
+    if existing is None:
+        existing = storage.scan_existing()
+
+    outside: Dict[str, bool] = {}
+    if storage_keys:
+        paths = list(
+            {
+                os.path.abspath(key)
+                for key in storage_keys
+                if key and not os.path.abspath(key).startswith(root)
+            }
+        )
+        if paths:
+            outside = dict(
+                zip(paths, get_io_executor().map(os.path.exists, paths, chunksize=64))
+            )
+
+    def file_exists(storage_key: Optional[str]) -> bool:
+        if not storage_key:
+            return False
+        path = os.path.abspath(storage_key)
+        if path.startswith(root):
+            return path in existing
+        if path in outside:
+            return outside[path]
+        return os.path.exists(path)
+
+    return file_exists
+
+
+def _orphan_candidates(db: Session, existing: Set[str]) -> Iterator[List[Any]]:
+    """
+    以暫存資料表在資料庫端做集合差，找出 storage_key 不在磁碟掃描結果中的記錄
+
+    暫存表同時放入絕對路徑與 LocalStorage 產生的原始路徑形式（base_dir 可能為相對路徑），
+    候選記錄以 STREAM_BATCH_SIZE 分批產出，仍需以 _storage_existence_checker 確認
+    （例如儲存目錄外的舊路徑）
+    """
+    root = os.path.abspath(storage.base_dir)
+    keys = set(existing)
+    keys.update(
+        os.path.join(storage.base_dir, os.path.relpath(path, root)) for path in existing
+    )
+
+    fs_keys = Table(
+        "fs_keys",
+        MetaData(),
+        Column("k", Text, primary_key=True),
+        prefixes=["TEMPORARY"],
+    )
+    connection = db.connection()
+    fs_keys.drop(connection, checkfirst=True)
+    fs_keys.create(connection)
+    result = None
+    try:
+        if keys:
+            connection.execute(fs_keys.insert(), [{"k": key} for key in keys])
+        result = db.execute(
+            select(models.File.id, models.File.filename, models.File.storage_key)
+            .outerjoin(fs_keys, models.File.storage_key == fs_keys.c.k)
+            .where(fs_keys.c.k.is_(None))
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        yield from result.partitions()
+    finally:
+        # 未讀完的游標會鎖住暫存表，需先關閉再 DROP
+        if result is not None:
+            result.close()
+        fs_keys.drop(connection)
+
+
 @app.post("/admin/sync-files/", response_model=dict, status_code=status.HTTP_200_OK)
 def sync_files(db: Session = Depends(get_db)):
     """
@@ -1196,38 +1575,27 @@ def sync_files(db: Session = Depends(get_db)):
     - message: 詳細訊息
     """
     try:
-        # 查詢所有檔案記錄
-        all_files = db.query(models.File).all()
+        existing = storage.scan_existing()
         orphaned_ids = []
 
-        print(f"[SYNC] 開始同步，掃描 {len(all_files)} 筆記錄...")
+        logger.info(f"[SYNC] 開始同步，磁碟上共 {len(existing)} 個檔案...")
 
-        for file_record in all_files:
-            storage_key = file_record.storage_key
+        # 資料庫端集合差只回傳候選記錄，分批確認（外部路徑並行檢查）
+        for candidates in _orphan_candidates(db, existing):
+            file_exists = _storage_existence_checker(
+                existing, [row.storage_key for row in candidates]
+            )
+            for row in candidates:
+                # 檢查實體檔案是否存在
+                if not file_exists(row.storage_key):
+                    logger.warning(
+                        f"[SYNC] 發現孤立記錄：ID {row.id}, filename={row.filename}"
+                    )
+                    orphaned_ids.append(row.id)
 
-            # 檢查實體檔案是否存在
-            if not storage_key or not os.path.exists(storage_key):
-                logger.warning(
-                    f"[SYNC] 發現孤立記錄：ID {file_record.id}, filename={file_record.filename}"
-                )
-                orphaned_ids.append(file_record.id)
-
-                # 刪除相關的標籤關聯、註解、結論
-                db.query(file_tags).filter(
-                    file_tags.c.file_id == file_record.id
-                ).delete()
-                db.query(models.Annotation).filter(
-                    models.Annotation.file_id == file_record.id
-                ).delete()
-                db.query(models.Conclusion).filter(
-                    models.Conclusion.file_id == file_record.id
-                ).delete()
-
-                # 刪除檔案記錄
-                db.delete(file_record)
-
-        # 提交變更
+        # 讀取游標關閉後，再以 IN 批次刪除相關的標籤關聯、註解、結論與檔案記錄
         if orphaned_ids:
+            _bulk_delete_file_records(db, orphaned_ids)
             db.commit()
             logger.info(f"[SYNC] 已刪除 {len(orphaned_ids)} 筆孤立記錄")
 
@@ -1239,6 +1607,7 @@ def sync_files(db: Session = Depends(get_db)):
         }
 
     except Exception as e:
+        db.rollback()
         logger.error(f"[SYNC] 同步失敗: {str(e)}")
         return {
             "status": "error",
@@ -1248,6 +1617,39 @@ def sync_files(db: Session = Depends(get_db)):
         }
 
 
+@app.post(
+    "/admin/sync-executions/", response_model=dict, status_code=status.HTTP_200_OK
+)
+def sync_executions(
+    max_age_seconds: int = Query(300, ge=1),
+    service: ReasoningService = Depends(get_reasoning_service),
+):
+    """
+    結束卡住的推理鏈執行記錄
+
+    功能：
+    - 背景執行的 worker 中斷後，執行記錄會停在 pending/running
+    - 將開始時間超過 max_age_seconds 的記錄以單一 UPDATE 標記為 failed
+
+    回傳：
+    - failed_executions: 被標記為失敗的筆數
+    - execution_ids: 被標記為失敗的執行 ID
+    """
+    try:
+        failed_ids = service.fail_stale_executions(max_age_seconds=max_age_seconds)
+    except Exception as e:
+        logger.error(f"[SYNC] 結束卡住的執行記錄失敗: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"同步執行記錄失敗: {str(e)}",
+        )
+    return {
+        "status": "success",
+        "failed_executions": len(failed_ids),
+        "execution_ids": [str(execution_id) for execution_id in failed_ids],
+    }
+
+
 @app.get("/admin/file-status/", response_model=dict, status_code=status.HTTP_200_OK)
 def get_file_status(db: Session = Depends(get_db)):
     """
@@ -1260,28 +1662,42 @@ def get_file_status(db: Session = Depends(get_db)):
     - orphaned_details: 孤立記錄的詳細資訊
     """
     try:
-        all_files = db.query(models.File).all()
+        # 只投影需要的欄位，不建立 ORM 物件，並以 yield_per 分批讀取
+        result = db.execute(
+            select(
+                models.File.id,
+                models.File.filename,
+                models.File.storage_key,
+                models.File.created_at,
+            ).execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        existing = storage.scan_existing()
         orphaned_details = []
         valid_count = 0
+        total_count = 0
 
-        for file_record in all_files:
-            storage_key = file_record.storage_key
-            if storage_key and os.path.exists(storage_key):
-                valid_count += 1
-            else:
-                orphaned_details.append(
-                    {
-                        "id": file_record.id,
-                        "filename": file_record.filename,
-                        "storage_key": storage_key,
-                        "created_at": file_record.created_at.isoformat()
-                        if file_record.created_at
-                        else None,
-                    }
-                )
+        for rows in result.partitions():
+            total_count += len(rows)
+            file_exists = _storage_existence_checker(
+                existing, [row.storage_key for row in rows]
+            )
+            for row in rows:
+                if file_exists(row.storage_key):
+                    valid_count += 1
+                else:
+                    orphaned_details.append(
+                        {
+                            "id": row.id,
+                            "filename": row.filename,
+                            "storage_key": row.storage_key,
+                            "created_at": row.created_at.isoformat()
+                            if row.created_at
+                            else None,
+                        }
+                    )
 
         return {
-            "total_db_records": len(all_files),
+            "total_db_records": total_count,
             "valid_files": valid_count,
             "orphaned_files": len(orphaned_details),
             "orphaned_details": orphaned_details,
@@ -1321,33 +1737,34 @@ def batch_delete_files(file_ids: List[int] = None, db: Session = Depends(get_db)
     if not file_ids:
         file_ids = []
 
-    deleted_count = 0
-    failed_ids = []
-
     try:
-        for file_id in file_ids:
-            try:
-                file = db.query(models.File).filter(models.File.id == file_id).first()
-                if not file:
-                    failed_ids.append(file_id)
-                    continue
-
-                # 刪除實體檔案
-                try:
-                    if file.storage_key and os.path.exists(file.storage_key):
-                        os.remove(file.storage_key)
-                except Exception as e:
-                    logger.warning(f"無法刪除實體檔案 {file.storage_key}: {e}")
-
-                # 刪除資料庫記錄
-                db.delete(file)
-                deleted_count += 1
-
-            except Exception as e:
-                logger.error(f"刪除檔案 {file_id} 失敗: {e}")
-                failed_ids.append(file_id)
+        # 去重並排序：重複 ID 不重複查詢/刪除，遞增順序讓 IN 查詢沿主鍵索引依序存取
+        unique_ids = sorted(set(file_ids))
+
+        # 以單一 IN 查詢取得存在的檔案與其儲存路徑
+        rows = []
+        for batch in _chunked(unique_ids):
+            rows.extend(
+                db.query(models.File.id, models.File.storage_key)
+                .filter(models.File.id.in_(batch))
+                .order_by(models.File.id)
+                .all()
+            )
+        found_ids = [file_id for file_id, _ in rows]
+        found_set = set(found_ids)
+        failed_ids = [file_id for file_id in unique_ids if file_id not in found_set]
 
+        # 批次刪除資料庫記錄（含標籤關聯、結論、標註），只 commit 一次
+        if found_ids:
+            _bulk_delete_file_records(db, found_ids)
         db.commit()
+        deleted_count = len(found_ids)
+
+        # 資料庫刪除成功後再並行刪除實體檔案（失敗只記錄，不影響已提交的刪除）
+        failures = storage.delete_many([storage_key for _, storage_key in rows])
+        for storage_key, error in failures.items():
+            logger.warning(f"無法刪除實體檔案 {storage_key}: {error}")
+
         logger.info(f"批量刪除完成: {deleted_count} 成功, {len(failed_ids)} 失敗")
 
         return {
@@ -1357,6 +1774,7 @@ def batch_delete_files(file_ids: List[int] = None, db: Session = Depends(get_db)
         }
 
     except Exception as e:
+        db.rollback()
         logger.error(f"批量刪除失敗: {e}")
         return {
             "deleted_count": 0,
@@ -1392,23 +1810,41 @@ def batch_create_tags(tag_names: List[str] = None, db: Session = Depends(get_db)
     existing_tags = []
 
     try:
-        for tag_name in tag_names:
-            tag_name = tag_name.strip()
-            if not tag_name:
-                continue
+        # 正規化並去重（保留輸入順序）
+        names = list(
+            dict.fromkeys(name.strip() for name in tag_names if name and name.strip())
+        )
+        # 以單一 IN 查詢找出已存在的標籤
+        existing_by_name = {}
+        for batch in _chunked(names):
+            existing_by_name.update(
+                (tag_name, tag_id)
+                for tag_id, tag_name in db.query(models.Tag.id, models.Tag.name)
+                .filter(models.Tag.name.in_(batch))
+                .all()
+            )
 
-            # 檢查標籤是否已存在
-            existing_tag = (
-                db.query(models.Tag).filter(models.Tag.name == tag_name).first()
+        # 新標籤以單一 INSERT ... RETURNING 建立並直接取回 ID
+        to_create = [name for name in names if name not in existing_by_name]
+        created_by_name = {
+            tag_name: tag.id for tag_name, tag in _insert_tags(db, to_create).items()
+        }
+
+        # 被並行請求搶先建立的標籤視為已存在
+        raced = [name for name in to_create if name not in created_by_name]
+        for batch in _chunked(raced):
+            existing_by_name.update(
+                (tag_name, tag_id)
+                for tag_id, tag_name in db.query(models.Tag.id, models.Tag.name)
+                .filter(models.Tag.name.in_(batch))
+                .all()
             )
-            if existing_tag:
-                existing_tags.append({"id": existing_tag.id, "name": existing_tag.name})
+
+        for name in names:
+            if name in created_by_name:
+                created_tags.append({"id": created_by_name[name], "name": name})
             else:
-                # 建立新標籤
-                new_tag = models.Tag(name=tag_name)
-                db.add(new_tag)
-                db.flush()
-                created_tags.append({"id": new_tag.id, "name": new_tag.name})
+                existing_tags.append({"id": existing_by_name[name], "name": name})
 
         db.commit()
         logger.info(
@@ -1436,6 +1872,77 @@ def batch_create_tags(tag_names: List[str] = None, db: Session = Depends(get_db)
         }
 
 
+def _load_files_by_hash(db: Session, file_hashes: List[str]) -> Dict[str, models.File]:
+    """以 IN 查詢取得指定 hash 的既有檔案記錄"""
+    existing_by_hash: Dict[str, models.File] = {}
+    for batch in _chunked(file_hashes):
+        for record in db.query(models.File).filter(models.File.file_hash.in_(batch)):
+            existing_by_hash.setdefault(record.file_hash, record)
+    return existing_by_hash
+
+
+def _persist_new_files(
+    db: Session, records: List[models.File]
+) -> Tuple[List[models.File], List[Tuple[models.File, str]]]:
+    """
+    加入新檔案記錄並 flush 取得主鍵（不 commit）
+
+    整批以單一 SAVEPOINT 寫入；若失敗（例如併發上傳造成唯一鍵衝突），
+    改為逐筆 SAVEPOINT 重試，只排除失敗的記錄
+
+    Returns:
+        (成功寫入的記錄, 失敗的記錄與錯誤訊息)
+    """
+    if not records:
+        return [], []
+    try:
+        with db.begin_nested():
+            db.add_all(records)
+        return records, []
+    except SQLAlchemyError as e:
+        logger.warning(f"批次寫入檔案記錄失敗，改為逐筆寫入: {e}")
+
+    saved = []
+    failed = []
+    for record in records:
+        try:
+            with db.begin_nested():
+                db.add(record)
+            saved.append(record)
+        except SQLAlchemyError as e:
+            logger.error(f"寫入檔案記錄 {record.filename} 失敗: {e}")
+            failed.append((record, str(e)))
+    return saved, failed
+
+
+def _triage_failed_files(
+    db: Session, failed: List[Tuple[models.File, str]]
+) -> Tuple[List[models.File], List[Tuple[models.File, str]], List[str]]:
+    """
+    分類逐筆寫入失敗的檔案記錄
+
+    - 同 hash 已有記錄（併發上傳搶先寫入）：視為重複，回報既有記錄
+    - 其他：回報為錯誤；其 storage_key 沒有任何記錄引用時列為孤兒檔案
+      （儲存路徑由 hash 決定，可能與既有記錄共用，有引用時不能刪除）
+
+    Returns:
+        (既有的重複記錄, 失敗記錄與錯誤訊息, 待刪除的孤兒 storage_key)
+    """
+    if not failed:
+        return [], [], []
+    winners = _load_files_by_hash(db, [record.file_hash for record, _ in failed])
+    duplicates = [winners[record.file_hash] for record, _ in failed if record.file_hash in winners]
+    errors = [(record, error) for record, error in failed if record.file_hash not in winners]
+
+    keys = [record.storage_key for record, _ in errors]
+    referenced: Set[str] = set()
+    for batch in _chunked(keys):
+        referenced.update(
+            db.scalars(select(models.File.storage_key).where(models.File.storage_key.in_(batch)))
+        )
+    return duplicates, errors, [key for key in keys if key not in referenced]
+
+
 class FileBatchUploadRequest(BaseModel):
     """批量上傳請求結構"""
 
@@ -1462,64 +1969,94 @@ async def batch_upload_files(
     - duplicated_count: 重複的檔案數
     - uploaded_files: 新上傳的檔案信息
     - duplicated_files: 重複的檔案信息
+    - errors: 未能儲存的檔案與原因（有錯誤時 status 為 partial）
     """
     uploaded_files = []
     duplicated_files = []
+    errors: List[Dict[str, Any]] = []
+
+    def describe(record: models.File) -> Dict[str, Any]:
+        return {
+            "id": record.id,
+            "filename": record.filename,
+            "file_hash": record.file_hash,
+            "created_at": record.created_at.isoformat() if record.created_at else None,
+        }
 
     try:
-        for file in files:
-            try:
-                # 計算檔案 hash
-                file_hash = await calculate_file_hash(file)
-
-                # 檢查檔案是否已存在
-                existing_file = (
-                    db.query(models.File)
-                    .filter(models.File.file_hash == file_hash)
-                    .first()
-                )
+        # 並行計算所有檔案的 hash
+        hashes = await asyncio.gather(
+            *(calculate_file_hash(file) for file in files), return_exceptions=True
+        )
 
-                if existing_file:
-                    duplicated_files.append(
-                        {
-                            "id": existing_file.id,
-                            "filename": existing_file.filename,
-                            "file_hash": existing_file.file_hash,
-                            "created_at": existing_file.created_at.isoformat()
-                            if existing_file.created_at
-                            else None,
-                        }
-                    )
-                    continue
+        # 以單一 IN 查詢找出已存在的檔案（同步 Session 操作移到執行緒池，不阻塞事件迴圈）
+        unique_hashes = list(
+            dict.fromkeys(h for h in hashes if not isinstance(h, BaseException))
+        )
+        existing_by_hash = await run_in_threadpool(
+            _load_files_by_hash, db, unique_hashes
+        )
 
-                # 儲存檔案
-                await file.seek(0)
-                storage_key = await storage.save(file_hash, file)
+        # 同一批次內重複的內容只儲存第一份
+        to_save: Dict[str, UploadFile] = {}
+        duplicate_hashes: List[str] = []
+        for file, file_hash in zip(files, hashes):
+            if isinstance(file_hash, BaseException):
+                logger.error(f"上傳檔案 {file.filename} 失敗: {file_hash}")
+                errors.append({"filename": file.filename, "error": str(file_hash)})
+            elif file_hash in existing_by_hash or file_hash in to_save:
+                duplicate_hashes.append(file_hash)
+            else:
+                to_save[file_hash] = file
 
-                # 建立資料庫記錄
-                db_file = models.File(
-                    filename=file.filename, storage_key=storage_key, file_hash=file_hash
-                )
-                db.add(db_file)
-                db.flush()
-
-                uploaded_files.append(
-                    {
-                        "id": db_file.id,
-                        "filename": db_file.filename,
-                        "file_hash": db_file.file_hash,
-                        "created_at": db_file.created_at.isoformat()
-                        if db_file.created_at
-                        else None,
-                    }
-                )
+        # 並行儲存新檔案
+        async def save_one(file_hash: str, file: UploadFile) -> str:
+            await file.seek(0)
+            return await storage.save(file_hash, file)
 
-            except Exception as e:
-                logger.error(f"上傳檔案 {file.filename} 失敗: {e}")
+        storage_keys = await asyncio.gather(
+            *(save_one(file_hash, file) for file_hash, file in to_save.items()),
+            return_exceptions=True,
+        )
+        new_records: Dict[str, models.File] = {}
+        for (file_hash, file), storage_key in zip(to_save.items(), storage_keys):
+            if isinstance(storage_key, BaseException):
+                logger.error(f"上傳檔案 {file.filename} 失敗: {storage_key}")
+                errors.append({"filename": file.filename, "error": str(storage_key)})
+                continue
+            new_records[file_hash] = models.File(
+                filename=file.filename, storage_key=storage_key, file_hash=file_hash
+            )
+        # 以 SAVEPOINT 一次寫入所有新記錄以取得 ID，並於 commit 前組好回應（避免過期屬性重新查詢）
+        saved, failed = await run_in_threadpool(
+            _persist_new_files, db, list(new_records.values())
+        )
+        # 寫入失敗的記錄：併發上傳的輸家回報為重複，其餘回報錯誤並清除無人引用的已存檔案
+        lost_to, failed_records, orphan_keys = await run_in_threadpool(
+            _triage_failed_files, db, failed
+        )
+        new_records = {record.file_hash: record for record in saved}
+        for record in lost_to:
+            existing_by_hash.setdefault(record.file_hash, record)
+        duplicate_of = [
+            existing_by_hash.get(file_hash) or new_records[file_hash]
+            for file_hash in duplicate_hashes
+            if file_hash in existing_by_hash or file_hash in new_records
+        ] + lost_to
+        uploaded_files = [describe(record) for record in new_records.values()]
+        duplicated_files = [describe(record) for record in duplicate_of]
+        errors.extend(
+            {"filename": record.filename, "error": error} for record, error in failed_records
+        )
 
-        db.commit()
+        await run_in_threadpool(db.commit)
+        if orphan_keys:
+            failures = await run_in_threadpool(storage.delete_many, orphan_keys)
+            for key, error in failures.items():
+                logger.warning(f"清除未寫入記錄的檔案 {key} 失敗: {error}")
         logger.info(
-            f"批量上傳完成: {len(uploaded_files)} 新上傳, {len(duplicated_files)} 重複"
+            f"批量上傳完成: {len(uploaded_files)} 新上傳, {len(duplicated_files)} 重複, "
+            f"{len(errors)} 失敗"
         )
 
         return {
@@ -1527,17 +2064,19 @@ async def batch_upload_files(
             "duplicated_count": len(duplicated_files),
             "uploaded_files": uploaded_files,
             "duplicated_files": duplicated_files,
-            "status": "success",
+            "errors": errors,
+            "status": "success" if not errors else "partial",
         }
 
     except Exception as e:
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         logger.error(f"批量上傳失敗: {e}")
         return {
             "uploaded_count": 0,
             "duplicated_count": len(duplicated_files),
             "uploaded_files": [],
             "duplicated_files": duplicated_files,
+            "errors": errors,
             "status": "error",
             "error": str(e),
         }
@@ -1546,7 +2085,7 @@ async def batch_upload_files(
 @app.post("/reasoning-chains", tags=["推理鏈"], status_code=status.HTTP_201_CREATED)
 def create_reasoning_chain(
     chain_data: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user=Depends(security.get_current_user),
 ):
     """
@@ -1558,7 +2097,6 @@ def create_reasoning_chain(
       - nodes: 節點配置陣列
     """
     try:
-        service = ReasoningService(db, storage=storage)
         chain = service.create_chain(
             name=chain_data.get("name"),
             description=chain_data.get("description", ""),
@@ -1584,12 +2122,11 @@ def create_reasoning_chain(
 def list_reasoning_chains(
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user=Depends(security.get_current_user),
 ):
     """取得推理鏈列表"""
     try:
-        service = ReasoningService(db, storage=storage)
         chains = service.list_chains(skip=skip, limit=limit)
         return [
             {
@@ -1609,12 +2146,11 @@ def list_reasoning_chains(
 @app.get("/reasoning-chains/{chain_id}", tags=["推理鏈"])
 def get_reasoning_chain(
     chain_id: str,
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user=Depends(security.get_current_user),
 ):
     """取得推理鏈詳細資訊"""
     try:
-        service = ReasoningService(db, storage=storage)
         chain = service.get_chain(UUID(chain_id))
         if not chain:
             raise HTTPException(status_code=404, detail="推理鏈不存在")
@@ -1638,12 +2174,11 @@ def get_reasoning_chain(
 def update_reasoning_chain(
     chain_id: str,
     update_data: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user=Depends(security.get_current_user),
 ):
     """更新推理鏈"""
     try:
-        service = ReasoningService(db, storage=storage)
         chain = service.update_chain(
             chain_id=UUID(chain_id),
             name=update_data.get("name"),
@@ -1671,12 +2206,11 @@ def update_reasoning_chain(
 )
 def delete_reasoning_chain(
     chain_id: str,
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user=Depends(security.get_current_user),
 ):
     """刪除推理鏈"""
     try:
-        service = ReasoningService(db, storage=storage)
         service.delete_chain(UUID(chain_id))
         logger.info(f"刪除推理鏈: {chain_id}")
     except Exception as e:
@@ -1684,16 +2218,21 @@ def delete_reasoning_chain(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/reasoning-chains/{chain_id}/execute", tags=["推理鏈"])
+@app.post(
+    "/reasoning-chains/{chain_id}/execute",
+    tags=["推理鏈"],
+    status_code=status.HTTP_202_ACCEPTED,
+)
 def execute_reasoning_chain(
     chain_id: str,
+    background_tasks: BackgroundTasks,
     payload: Dict[str, Any] = Body(default_factory=dict),
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
     current_user=Depends(security.get_current_user),
 ):
-    """執行推理鏈"""
+    """執行推理鏈（背景執行，透過 /executions/{execution_id} 查詢結果）"""
     try:
-        service = ReasoningService(db, storage=storage)
         input_data = (
             payload.get("input_data")
             if isinstance(payload, dict) and "input_data" in payload
@@ -1703,14 +2242,15 @@ def execute_reasoning_chain(
             input_data = {}
         model_name = payload.get("model_name") if isinstance(payload, dict) else None
         tool_name = payload.get("tool_name") if isinstance(payload, dict) else None
-        execution = service.execute_chain(
+        execution = service.enqueue_execution(
             UUID(chain_id),
             input_data,
             user_id=current_user["id"],
             model_name=model_name,
             tool_name=tool_name,
         )
-        logger.info(f"執行推理鏈: {chain_id}, 執行ID: {execution.id}")
+        background_tasks.add_task(run_reasoning_execution, execution.id, session_factory)
+        logger.info(f"排入推理鏈執行: {chain_id}, 執行ID: {execution.id}")
         return {
             "execution_id": str(execution.id),
             "chain_id": str(execution.chain_id),
@@ -1727,49 +2267,53 @@ def execute_reasoning_chain(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+_UNPARSEABLE = object()
+
+
+def _parse_json_text(text: str) -> Any:
+    """
+    解析 JSON 字串；無法解析時回傳 _UNPARSEABLE
+
+    每次都重新解析，呼叫端取得各自的物件，可自由修改；
+    orjson 重新解析比深拷貝快取的結果快一個數量級以上，快取後再複製並不划算
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return _UNPARSEABLE
+
+
+def _normalize_json(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return value
+    if isinstance(value, str):
+        parsed = _parse_json_text(value)
+        if parsed is not _UNPARSEABLE:
+            return parsed
+    return {}
+
+
+def _normalize_error(value: Any) -> Any:
+    if isinstance(value, str):
+        parsed = _parse_json_text(value)
+        return value if parsed is _UNPARSEABLE else parsed
+    return value
+
+
 @app.get("/executions/{execution_id}", tags=["推理鏈"])
 def get_execution_result(
     execution_id: str,
-    db: Session = Depends(get_db),
+    service: ReasoningService = Depends(get_reasoning_service),
     current_user=Depends(security.get_current_user),
 ):
     """取得推理鏈執行結果"""
     try:
-        service = ReasoningService(db, storage=storage)
         execution = service.get_execution(UUID(execution_id))
         if not execution:
             raise HTTPException(status_code=404, detail="執行記錄不存在")
 
-        def normalize_json(value: Any) -> Any:
-            if value is None:
-                return {}
-            if isinstance(value, (dict, list)):
-                return value
-            if isinstance(value, str):
-                import json
-
-                try:
-                    return json.loads(value)
-                except Exception:
-                    return {}
-            return {}
-
-        def normalize_error(value: Any) -> Any:
-            if value is None:
-                return None
-            if isinstance(value, (dict, list)):
-                return value
-            if isinstance(value, str):
-                import json
-
-                try:
-                    return json.loads(value)
-                except Exception:
-                    return value
-            return value
-
-        results = normalize_json(execution.results)
-        input_data = normalize_json(execution.input_data)
+        results = _normalize_json(execution.results)
+        input_data = _normalize_json(execution.input_data)
 
         return {
             "execution_id": str(execution.id),
@@ -1780,7 +2324,7 @@ def get_execution_result(
             "tool_name": execution.tool_name,
             "input_data": input_data,
             "results": results,
-            "error": normalize_error(execution.error_log),
+            "error": _normalize_error(execution.error_log),
             "started_at": execution.started_at.isoformat()
             if execution.started_at
             else None,
@@ -1798,37 +2342,66 @@ def get_execution_result(
 # 腳本 (Script) 端點 - v0.3 新增
 # ============================================================================
 
+@app.exception_handler(ScriptServiceError)
+async def script_service_error_handler(request: Request, exc: ScriptServiceError):
+    """
+    腳本服務錯誤的統一出口：腳本不存在回 404，其餘（驗證失敗、資料庫錯誤）回 400
+
+    腳本端點不再各自包 try/except，錯誤日誌只在這裡記錄一次
+    """
+    status_code = 404 if isinstance(exc, ScriptNotFoundError) else 400
+    logger.error("%s %s 失敗: %s", request.method, request.url.path, exc)
+    return ORJSONResponse({"detail": str(exc)}, status_code=status_code)
+
 
-@app.post("/scripts", tags=["腳本"], status_code=status.HTTP_201_CREATED)
+@app.post(
+    "/scripts",
+    tags=["腳本"],
+    status_code=status.HTTP_201_CREATED,
+    responses={201: {"model": schemas.ScriptSummary}},
+)
 def create_script(
-    script_data: Dict[str, Any] = Body(...),
+    script_data: schemas.ScriptCreate,
     db: Session = Depends(get_db),
     current_user=Depends(security.get_current_user),
 ):
     """建立新腳本"""
-    try:
-        service = ScriptService(db)
-        script = service.create_script(
-            name=script_data.get("name"),
-            content=script_data.get("content"),
-            category=script_data.get("category", "general"),
-            parameters=script_data.get("parameters", {}),
-            created_by_id=current_user["id"],
-            version=script_data.get("version", "1.0.0"),
-        )
-        logger.info(f"建立腳本: {script.id}")
-        return {
+    service = ScriptService(db)
+    script = service.create_script(
+        name=script_data.name,
+        content=script_data.content,
+        category=script_data.category,
+        parameters=script_data.parameters,
+        created_by_id=current_user["id"],
+        version=script_data.version,
+    )
+    logger.info("建立腳本: %s", script.id)
+    return ORJSONResponse(
+        {
             "id": str(script.id),
             "name": script.name,
             "category": script.category,
-            "created_at": script.created_at.isoformat() if script.created_at else None,
-        }
-    except Exception as e:
-        logger.error(f"建立腳本失敗: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+            "created_at": script.created_at,
+        },
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+@dataclass
+class _ScriptListRow:
+    """腳本列表的固定回應形狀；orjson 原生以 C 迴圈序列化 dataclass，
+    免去逐列建立 dict，__slots__ 也讓每列佔用更少記憶體"""
 
+    __slots__ = ("id", "name", "category", "created_at")
+    id: str
+    name: str
+    category: str
+    created_at: Optional[datetime]
 
-@app.get("/scripts", tags=["腳本"])
+
+@app.get(
+    "/scripts", tags=["腳本"], responses={200: {"model": List[schemas.ScriptSummary]}}
+)
 def list_scripts(
     skip: int = 0,
     limit: int = 10,
@@ -1837,131 +2410,176 @@ def list_scripts(
     current_user=Depends(security.get_current_user),
 ):
     """取得腳本列表"""
-    try:
-        service = ScriptService(db)
-        scripts = service.list_scripts(skip=skip, limit=limit, category=category)
+    service = ScriptService(db)
+    scripts = service.list_scripts(skip=skip, limit=limit, category=category)
 
-        return [
-            {
-                "id": str(s.id),
-                "name": s.name,
-                "category": s.category,
-                "created_at": s.created_at.isoformat() if s.created_at else None,
-            }
-            for s in scripts
-        ]
-    except Exception as e:
-        logger.error(f"列表腳本失敗: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+    # 直接回傳 ORJSONResponse，略過 jsonable_encoder 的逐欄位遞迴；
+    # datetime 直接交給 orjson 序列化（輸出格式與 isoformat() 相同）
+    return ORJSONResponse(
+        [_ScriptListRow(str(s.id), s.name, s.category, s.created_at) for s in scripts]
+    )
 
 
-@app.get("/scripts/{script_id}", tags=["腳本"])
+@app.get(
+    "/scripts/{script_id}", tags=["腳本"], responses={200: {"model": schemas.ScriptDetail}}
+)
 def get_script(
-    script_id: str,
+    script_id: UUID,
     db: Session = Depends(get_db),
     current_user=Depends(security.get_current_user),
 ):
     """取得腳本詳細資訊"""
-    try:
-        service = ScriptService(db)
-        script = service.get_script(UUID(script_id))
-        if not script:
-            raise HTTPException(status_code=404, detail="腳本不存在")
+    service = ScriptService(db)
+    script = service.get_script(script_id)
+    if not script:
+        raise HTTPException(status_code=404, detail="腳本不存在")
 
-        return {
+    return ORJSONResponse(
+        {
             "id": str(script.id),
             "name": script.name,
             "content": script.content,
             "category": script.category,
             "version": script.version,
             "parameters": script.parameters,
-            "created_at": script.created_at.isoformat() if script.created_at else None,
-            "updated_at": script.updated_at.isoformat() if script.updated_at else None,
+            "created_at": script.created_at,
+            "updated_at": script.updated_at,
         }
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"取得腳本失敗: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+    )
 
 
-@app.put("/scripts/{script_id}", tags=["腳本"])
+@app.put(
+    "/scripts/{script_id}",
+    tags=["腳本"],
+    responses={200: {"model": schemas.ScriptUpdateResult}},
+)
 def update_script(
-    script_id: str,
-    update_data: Dict[str, Any] = Body(...),
+    script_id: UUID,
+    update_data: schemas.ScriptUpdate,
     db: Session = Depends(get_db),
     current_user=Depends(security.get_current_user),
 ):
     """更新腳本"""
-    try:
-        service = ScriptService(db)
-        script = service.update_script(
-            script_id=UUID(script_id),
-            name=update_data.get("name"),
-            content=update_data.get("content"),
-            category=update_data.get("category"),
-            parameters=update_data.get("parameters"),
-            version=update_data.get("version"),
-        )
-        if not script:
-            raise HTTPException(status_code=404, detail="腳本不存在")
-        logger.info(f"更新腳本: {script_id}")
-        return {
+    service = ScriptService(db)
+    script = service.update_script(
+        script_id=script_id,
+        name=update_data.name,
+        content=update_data.content,
+        category=update_data.category,
+        parameters=update_data.parameters,
+        version=update_data.version,
+    )
+    logger.info("更新腳本: %s", script_id)
+    return ORJSONResponse(
+        {
             "id": str(script.id),
             "name": script.name,
-            "updated_at": script.updated_at.isoformat() if script.updated_at else None,
+            "updated_at": script.updated_at,
         }
-    except Exception as e:
-        logger.error(f"更新腳本失敗: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+    )
 
 
 @app.delete(
     "/scripts/{script_id}", tags=["腳本"], status_code=status.HTTP_204_NO_CONTENT
 )
 def delete_script(
-    script_id: str,
+    script_id: UUID,
     db: Session = Depends(get_db),
     current_user=Depends(security.get_current_user),
 ):
     """刪除腳本"""
-    try:
-        service = ScriptService(db)
-        service.delete_script(UUID(script_id))
-        logger.info(f"刪除腳本: {script_id}")
-    except Exception as e:
-        logger.error(f"刪除腳本失敗: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+    service = ScriptService(db)
+    service.delete_script(script_id)
+    logger.info("刪除腳本: %s", script_id)
 
 
-@app.post("/scripts/{script_id}/execute", tags=["腳本"])
+@app.post(
+    "/scripts/{script_id}/execute",
+    tags=["腳本"],
+    responses={200: {"model": schemas.ScriptExecutionStarted}},
+)
 def execute_script(
-    script_id: str,
+    script_id: UUID,
     input_data: Dict[str, Any],
     db: Session = Depends(get_db),
     current_user=Depends(security.get_current_user),
 ):
     """執行腳本"""
-    try:
-        service = ScriptService(db)
-        execution = service.execute_script(UUID(script_id), input_data)
-        logger.info(f"執行腳本: {script_id}, 執行ID: {execution.id}")
-        return {
+    service = ScriptService(db)
+    execution = service.execute_script(script_id, input_data)
+    logger.info("執行腳本: %s, 執行ID: %s", script_id, execution.id)
+    return ORJSONResponse(
+        {
             "execution_id": str(execution.id),
             "script_id": str(execution.script_id),
             "status": execution.status,
-            "started_at": execution.started_at.isoformat()
-            if execution.started_at
-            else None,
+            "started_at": execution.started_at,
         }
-    except Exception as e:
-        logger.error(f"執行腳本失敗: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+    )
 
 
 # ==================== 檔案自動分類端點 ====================
 
 
+def _model_response(model: BaseModel) -> Response:
+    """
+    以 model_dump_json 直接輸出已驗證的 Pydantic 模型
+
+    回傳 Response 時 FastAPI 不再依 response_model 重新驗證與編碼；
+    response_model 仍保留在路由上供 OpenAPI 文件使用
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+
+def _resolve_tags(
+    db: Session, names: List[str], create_missing: bool
+) -> Tuple[Dict[str, models.Tag], List[str]]:
+    """
+    以 IN 查詢一次取得多個標籤，缺少的標籤批次建立（只 flush，不 commit）
+
+    回傳：
+    - 標籤名稱 -> Tag 的對照
+    - 本次新建的標籤名稱（依輸入順序）
+    """
+    wanted = list(dict.fromkeys(names))
+    tags_by_name: Dict[str, models.Tag] = {}
+    for batch in _chunked(wanted):
+        for tag in db.query(models.Tag).filter(models.Tag.name.in_(batch)):
+            tags_by_name[tag.name] = tag
+
+    missing = [name for name in wanted if name not in tags_by_name] if create_missing else []
+    new_tags = _insert_tags(db, missing)
+    tags_by_name.update(new_tags)
+    # 被並行請求搶先建立的標籤不會由 RETURNING 回傳，補查一次
+    raced = [name for name in missing if name not in new_tags]
+    for batch in _chunked(raced):
+        for tag in db.query(models.Tag).filter(models.Tag.name.in_(batch)):
+            tags_by_name[tag.name] = tag
+
+    created = [name for name in missing if name in new_tags]
+    if created:
+        logger.info("批次創建 %d 個新標籤", len(created))
+    return tags_by_name, created
+
+
+def _file_tag_pairs(db: Session, file_ids: List[int]) -> Set[Tuple[int, int]]:
+    """
+    以 IN 查詢取得檔案既有的 (file_id, tag_id) 關聯
+
+    只讀關聯表的兩個欄位，不需載入 Tag 物件即可判斷標籤是否已存在
+    """
+    pairs: Set[Tuple[int, int]] = set()
+    for batch in _chunked(file_ids):
+        pairs.update(
+            db.execute(
+                select(file_tags.c.file_id, file_tags.c.tag_id).where(
+                    file_tags.c.file_id.in_(batch)
+                )
+            ).tuples()
+        )
+    return pairs
+
+
 @app.post(
     "/files/{file_id}/classify",
     response_model=schemas.FileClassificationResponse,
@@ -2003,35 +2621,37 @@ def classify_file(
 
         # 進行分類
         classification_result = classification_service.classify_file(db_file.filename)
+        # 延遲格式化：INFO 未啟用時不組字串
         logger.info(
-            f"檔案分類完成: {db_file.filename} -> {classification_result.file_type} "
-            f"(confidence: {classification_result.confidence:.2f})"
+            "檔案分類完成: %s -> %s (confidence: %.2f)",
+            db_file.filename,
+            classification_result.file_type,
+            classification_result.confidence,
         )
 
         tags_created = []
         tags_added = []
 
-        # 自動添加標籤
+        # 自動添加標籤：一次 IN 查詢取得所有建議標籤，缺少的批次建立
         if auto_tag and classification_result.suggested_tags:
-            for tag_name in classification_result.suggested_tags:
-                # 查找或創建標籤
-                tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-                if not tag and auto_create_tags:
-                    tag = models.Tag(name=tag_name)
-                    db.add(tag)
-                    db.commit()
-                    db.refresh(tag)
-                    tags_created.append(tag_name)
-                    logger.info(f"創建新標籤: {tag_name}")
-
-                # 添加標籤到檔案（避免重複）
-                if tag and tag not in db_file.tags:
-                    db_file.tags.append(tag)
+            tags_by_name, tags_created = _resolve_tags(
+                db, classification_result.suggested_tags, auto_create_tags
+            )
+            existing_pairs = _file_tag_pairs(db, [file_id])
+            new_links = []
+            for tag_name in dict.fromkeys(classification_result.suggested_tags):
+                tag = tags_by_name.get(tag_name)
+
+                # 添加標籤到檔案（以集合判斷，避免重複）
+                if tag and (file_id, tag.id) not in existing_pairs:
+                    existing_pairs.add((file_id, tag.id))
+                    new_links.append({"file_id": file_id, "tag_id": tag.id})
                     tags_added.append(tag_name)
 
-            db.commit()
-            db.refresh(db_file)
-            logger.info(f"已自動添加 {len(tags_added)} 個標籤")
+            if new_links:
+                db.execute(file_tags.insert(), new_links)
+
+            logger.info("已自動添加 %d 個標籤", len(tags_added))
 
         # 更新或創建分類註解
         annotation = (
@@ -2040,6 +2660,7 @@ def classify_file(
                 models.Annotation.file_id == file_id,
                 models.Annotation.source == "auto_classification",
             )
+            .order_by(models.Annotation.id)
             .first()
         )
 
@@ -2059,15 +2680,21 @@ def classify_file(
             )
             db.add(annotation)
 
+        # 標籤與註解在同一個交易中一次提交
+        filename = db_file.filename
         db.commit()
         logger.info("已更新分類註解")
 
-        return schemas.FileClassificationResponse(
-            file_id=file_id,
-            filename=db_file.filename,
-            classification=classification_result,
-            tags_created=tags_created,
-            tags_added=tags_added,
+        return _model_response(
+            schemas.FileClassificationResponse(
+                file_id=file_id,
+                filename=filename,
+                classification=schemas.ClassificationResult.model_validate(
+                    classification_result, from_attributes=True
+                ),
+                tags_created=tags_created,
+                tags_added=tags_added,
+            )
         )
 
     except HTTPException:
@@ -2080,90 +2707,108 @@ def classify_file(
         )
 
 
-@app.post(
-    "/files/classify/batch",
-    response_model=schemas.BatchClassificationResponse,
-    tags=["檔案管理"],
-)
-def batch_classify_files(
-    request: schemas.BatchClassificationRequest, db: Session = Depends(get_db)
-):
+# 串流批量分類每批處理的檔案數（每批一次 commit 並輸出該批結果，記憶體用量以此為上限）
+CLASSIFY_STREAM_BATCH_SIZE = int(os.getenv("CLASSIFY_STREAM_BATCH_SIZE", "200"))
+
+
+def _classify_file_batch(
+    db: Session,
+    file_ids: List[int],
+    auto_tag: bool,
+    auto_create_tags: bool,
+    pending_created: Set[str],
+) -> Tuple[List[schemas.FileClassificationResponse], List[Dict[str, Any]]]:
     """
-    批量分類檔案
+    分類一批檔案並寫入標籤與分類註解（不 commit）
 
-    功能：
-    - 對多個檔案進行批量分類
-    - 自動添加標籤
-    - 返回統計信息
+    以 IN 查詢一次載入檔案、既有標籤關聯與分類註解，所有建議標籤以單一 IN 查詢處理；
+    每個檔案一個 SAVEPOINT，失敗只回滾該檔案。
 
-    參數：
-    - request: 批量分類請求（包含檔案ID列表和選項）
+    Args:
+        pending_created: 已新建但尚未回報的標籤名稱（跨批次共用），
+            新建標籤只在第一個成功使用它的檔案回報
 
-    回傳：
-    - 200: 批量分類完成
-    - 400: 請求格式錯誤
-    - 500: 分類失敗
+    Returns:
+        (成功的分類結果, 失敗的 {"file_id", "error"})
     """
-    try:
-        results = []
-        errors = []
-        successful = 0
-        failed = 0
+    results: List[schemas.FileClassificationResponse] = []
+    errors: List[Dict[str, Any]] = []
+
+    unique_ids = sorted(set(file_ids))
+    files_by_id: Dict[int, models.File] = {}
+    annotations_by_file: Dict[int, models.Annotation] = {}
+    existing_pairs = _file_tag_pairs(db, unique_ids) if auto_tag else set()
+    for batch in _chunked(unique_ids):
+        for db_file in db.query(models.File).filter(models.File.id.in_(batch)):
+            files_by_id[db_file.id] = db_file
+        for annotation in (
+            db.query(models.Annotation)
+            .filter(
+                models.Annotation.file_id.in_(batch),
+                models.Annotation.source == "auto_classification",
+            )
+            .order_by(models.Annotation.id)
+        ):
+            annotations_by_file.setdefault(annotation.file_id, annotation)
 
-        for file_id in request.file_ids:
-            try:
-                # 查詢檔案
-                db_file = (
-                    db.query(models.File).filter(models.File.id == file_id).first()
-                )
-                if not db_file:
-                    errors.append(
-                        {"file_id": file_id, "error": f"檔案 ID {file_id} 不存在"}
-                    )
-                    failed += 1
-                    continue
+    # 先分類所有檔案，再以單一 IN 查詢處理全部建議標籤
+    classified = []
+    for file_id in file_ids:
+        try:
+            db_file = files_by_id.get(file_id)
+            if not db_file:
+                errors.append({"file_id": file_id, "error": f"檔案 ID {file_id} 不存在"})
+                continue
 
-                # 進行分類
-                classification_result = classification_service.classify_file(
-                    db_file.filename
-                )
+            # 進行分類
+            classified.append(
+                (file_id, db_file, classification_service.classify_file(db_file.filename))
+            )
+        except Exception as e:
+            errors.append({"file_id": file_id, "error": str(e)})
+            logger.error("分類檔案失敗 (ID: %s): %s", file_id, e)
+
+    tags_by_name: Dict[str, models.Tag] = {}
+    if auto_tag:
+        tags_by_name, created = _resolve_tags(
+            db,
+            [
+                tag_name
+                for _, _, classification_result in classified
+                for tag_name in classification_result.suggested_tags
+            ],
+            auto_create_tags,
+        )
+        pending_created.update(created)
 
-                tags_created = []
-                tags_added = []
+    for file_id, db_file, classification_result in classified:
+        try:
+            tags_created = []
+            tags_added = []
+            new_pairs = []
 
+            # 每個檔案一個 SAVEPOINT，失敗只回滾該檔案的標籤與註解
+            with db.begin_nested():
                 # 自動添加標籤
-                if request.auto_tag and classification_result.suggested_tags:
-                    for tag_name in classification_result.suggested_tags:
-                        # 查找或創建標籤
-                        tag = (
-                            db.query(models.Tag)
-                            .filter(models.Tag.name == tag_name)
-                            .first()
-                        )
-                        if not tag and request.auto_create_tags:
-                            tag = models.Tag(name=tag_name)
-                            db.add(tag)
-                            db.commit()
-                            db.refresh(tag)
+                if auto_tag:
+                    for tag_name in dict.fromkeys(classification_result.suggested_tags):
+                        tag = tags_by_name.get(tag_name)
+                        if tag_name in pending_created:
                             tags_created.append(tag_name)
 
-                        # 添加標籤到檔案（避免重複）
-                        if tag and tag not in db_file.tags:
-                            db_file.tags.append(tag)
+                        # 添加標籤到檔案（以集合判斷，避免重複）
+                        if tag and (file_id, tag.id) not in existing_pairs:
+                            new_pairs.append((file_id, tag.id))
                             tags_added.append(tag_name)
 
-                    db.commit()
-                    db.refresh(db_file)
+                    if new_pairs:
+                        db.execute(
+                            file_tags.insert(),
+                            [{"file_id": fid, "tag_id": tid} for fid, tid in new_pairs],
+                        )
 
                 # 更新或創建分類註解
-                annotation = (
-                    db.query(models.Annotation)
-                    .filter(
-                        models.Annotation.file_id == file_id,
-                        models.Annotation.source == "auto_classification",
-                    )
-                    .first()
-                )
+                annotation = annotations_by_file.get(file_id)
 
                 annotation_data = {
                     "classification": {
@@ -2183,32 +2828,69 @@ def batch_classify_files(
                     )
                     db.add(annotation)
 
-                db.commit()
-
-                results.append(
-                    schemas.FileClassificationResponse(
-                        file_id=file_id,
-                        filename=db_file.filename,
-                        classification=classification_result,
-                        tags_created=tags_created,
-                        tags_added=tags_added,
-                    )
+            annotations_by_file[file_id] = annotation
+            existing_pairs.update(new_pairs)
+            # 新建標籤只在第一個成功使用它的檔案回報
+            pending_created.difference_update(tags_created)
+            results.append(
+                schemas.FileClassificationResponse(
+                    file_id=file_id,
+                    filename=db_file.filename,
+                    classification=schemas.ClassificationResult.model_validate(
+                        classification_result, from_attributes=True
+                    ),
+                    tags_created=tags_created,
+                    tags_added=tags_added,
                 )
+            )
 
-                successful += 1
-                logger.info(f"分類檔案成功: {db_file.filename} (ID: {file_id})")
+        except Exception as e:
+            errors.append({"file_id": file_id, "error": str(e)})
+            logger.error("分類檔案失敗 (ID: %s): %s", file_id, e)
+
+    return results, errors
 
-            except Exception as e:
-                errors.append({"file_id": file_id, "error": str(e)})
-                failed += 1
-                logger.error(f"分類檔案失敗 (ID: {file_id}): {str(e)}")
 
-        return schemas.BatchClassificationResponse(
-            total=len(request.file_ids),
-            successful=successful,
-            failed=failed,
-            results=results,
-            errors=errors,
+@app.post(
+    "/files/classify/batch",
+    response_model=schemas.BatchClassificationResponse,
+    tags=["檔案管理"],
+)
+def batch_classify_files(
+    request: schemas.BatchClassificationRequest, db: Session = Depends(get_db)
+):
+    """
+    批量分類檔案
+
+    功能：
+    - 對多個檔案進行批量分類
+    - 自動添加標籤
+    - 返回統計信息
+
+    參數：
+    - request: 批量分類請求（包含檔案ID列表和選項）
+
+    回傳：
+    - 200: 批量分類完成
+    - 400: 請求格式錯誤
+    - 500: 分類失敗
+    """
+    try:
+        results, errors = _classify_file_batch(
+            db, request.file_ids, request.auto_tag, request.auto_create_tags, set()
+        )
+        db.commit()
+        # 逐檔成功不再各記一行，整批只記一筆摘要
+        logger.info("批量分類完成: %d 成功, %d 失敗", len(results), len(errors))
+
+        return _model_response(
+            schemas.BatchClassificationResponse(
+                total=len(request.file_ids),
+                successful=len(results),
+                failed=len(errors),
+                results=results,
+                errors=errors,
+            )
         )
 
     except HTTPException:
@@ -2221,11 +2903,89 @@ def batch_classify_files(
         )
 
 
+def _stream_batch_classification(
+    request: schemas.BatchClassificationRequest,
+    session_factory: Callable[[], Session],
+) -> Iterator[bytes]:
+    """
+    逐批分類並輸出 NDJSON（每行一個 JSON 物件）
+
+    每批 CLASSIFY_STREAM_BATCH_SIZE 個檔案：分類、commit、輸出該批各行後才處理下一批，
+    記憶體只保留一批的結果。請求 session 在回應開始前即關閉，因此以工廠開啟自己的 session。
+    - {"type": "result", ...FileClassificationResponse}
+    - {"type": "error", "file_id": ..., "error": ...}
+    - 最後一行 {"type": "summary", "total", "successful", "failed"}
+    """
+    db = session_factory()
+    successful = 0
+    failed = 0
+    pending_created: Set[str] = set()
+    try:
+        for batch in _chunked(request.file_ids, CLASSIFY_STREAM_BATCH_SIZE):
+            try:
+                results, errors = _classify_file_batch(
+                    db, batch, request.auto_tag, request.auto_create_tags, pending_created
+                )
+                db.commit()
+            except Exception as e:
+                # 回應已開始傳送，無法改回錯誤狀態碼；整批記為失敗後繼續下一批
+                db.rollback()
+                logger.error(f"批量分類失敗: {str(e)}")
+                results = []
+                errors = [{"file_id": file_id, "error": str(e)} for file_id in batch]
+
+            successful += len(results)
+            failed += len(errors)
+            lines = [
+                orjson.dumps({"type": "result", **result.model_dump(mode="json")})
+                for result in results
+            ]
+            lines.extend(orjson.dumps({"type": "error", **error}) for error in errors)
+            yield b"\n".join(lines) + b"\n"
+
+        logger.info("批量分類完成: %d 成功, %d 失敗", successful, failed)
+        yield orjson.dumps(
+            {
+                "type": "summary",
+                "total": len(request.file_ids),
+                "successful": successful,
+                "failed": failed,
+            }
+        ) + b"\n"
+    finally:
+        db.close()
+
+
+@app.post(
+    "/files/classify/batch/stream",
+    response_class=StreamingResponse,
+    tags=["檔案管理"],
+)
+def stream_batch_classify_files(
+    request: schemas.BatchClassificationRequest,
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
+):
+    """
+    批量分類檔案（NDJSON 串流）
+
+    與 /files/classify/batch 相同的分類與自動標籤，但逐批 commit 並逐行輸出結果，
+    大批次的記憶體用量不隨檔案數成長，客戶端也能在第一批完成時就開始處理。
+
+    回傳：
+    - 200: application/x-ndjson，每行一個 result/error，最後一行為 summary
+    """
+    return StreamingResponse(
+        _stream_batch_classification(request, session_factory),
+        media_type="application/x-ndjson",
+    )
+
+
 @app.get(
     "/classification/stats",
     response_model=schemas.ClassificationStatsResponse,
     tags=["檔案管理"],
 )
+@cached_response(ttl=30, stale_ttl=300)
 def get_classification_stats(db: Session = Depends(get_db)):
     """
     獲取檔案分類統計信息
@@ -2239,49 +2999,39 @@ def get_classification_stats(db: Session = Depends(get_db)):
     - 200: 統計信息
     """
     try:
-        # 查詢所有包含分類註解的檔案
-        annotations = (
-            db.query(models.Annotation)
+        # 在資料庫端依類型分組聚合，避免把每筆 JSON 載入 Python 逐一解析
+        file_type = func.coalesce(
+            models.Annotation.data[("classification", "file_type")].as_string(),
+            "Unknown",
+        )
+        confidence = func.coalesce(
+            models.Annotation.data[("classification", "confidence")].as_float(),
+            0.0,
+        )
+        rows = (
+            db.query(
+                file_type.label("file_type"),
+                func.count().label("count"),
+                func.sum(confidence).label("confidence_sum"),
+            )
             .filter(models.Annotation.source == "auto_classification")
+            .group_by(file_type)
             .all()
         )
 
-        if not annotations:
-            return schemas.ClassificationStatsResponse(
-                total=0,
-                by_type={},
-                avg_confidence=0.0,
-                unknown_count=0,
-                unknown_rate=0.0,
+        type_counts = {row.file_type: row.count for row in rows}
+        total = sum(type_counts.values())
+        total_confidence = sum(float(row.confidence_sum or 0.0) for row in rows)
+        unknown_count = type_counts.get("Unknown", 0)
+
+        return _model_response(
+            schemas.ClassificationStatsResponse(
+                total=total,
+                by_type=type_counts,
+                avg_confidence=total_confidence / total if total > 0 else 0.0,
+                unknown_count=unknown_count,
+                unknown_rate=unknown_count / total if total > 0 else 0.0,
             )
-
-        type_counts = {}
-        total_confidence = 0.0
-        unknown_count = 0
-
-        for annotation in annotations:
-            classification_data = annotation.data.get("classification", {})
-            file_type = classification_data.get("file_type", "Unknown")
-            confidence = classification_data.get("confidence", 0.0)
-
-            # 統計類型分佈
-            type_counts[file_type] = type_counts.get(file_type, 0) + 1
-
-            # 累計置信度
-            total_confidence += confidence
-
-            # 統計未知類型
-            if file_type == "Unknown":
-                unknown_count += 1
-
-        total = len(annotations)
-
-        return schemas.ClassificationStatsResponse(
-            total=total,
-            by_type=type_counts,
-            avg_confidence=total_confidence / total if total > 0 else 0.0,
-            unknown_count=unknown_count,
-            unknown_rate=unknown_count / total if total > 0 else 0.0,
         )
 
     except Exception as e:
@@ -2293,6 +3043,7 @@ def get_classification_stats(db: Session = Depends(get_db)):
 
 
 @app.get("/classification/supported-types", tags=["檔案管理"])
+@cached_response(ttl=3600)
 def get_supported_file_types():
     """
     獲取支援的檔案類型
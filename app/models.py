@@ -35,14 +35,96 @@
 =============================================================================
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, JSON, CheckConstraint, Enum, Index, Float
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, Table, JSON, CheckConstraint, Enum, Index, Float, event, func, insert, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship, validates
+from sqlalchemy.schema import PrimaryKeyConstraint
+from sqlalchemy.sql.expression import FunctionElement
 from datetime import datetime, timezone
 from .database import Base
 import enum
 from sqlalchemy_utils import UUIDType
 import uuid
 
+# PostgreSQL 上改用 JSONB（二進位格式，讀取免重新解析，可建 GIN 索引）；
+# SQLite 等其他方言仍使用一般 JSON
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _compile_partitioned_primary_key(constraint, compiler, **kw):
+    """
+    PostgreSQL 分區表的主鍵必須包含分區鍵
+
+    模型主鍵維持 (id)，其他資料庫上 id 仍唯一；只在 PostgreSQL DDL 附加表格
+    info["partition_key"] 指定的欄位，與遷移 c9d0e1f2a3b4 建出的 (id, started_at) 一致
+    """
+    ddl = compiler.visit_primary_key_constraint(constraint, **kw)
+    partition_key = constraint.table.info.get("partition_key")
+    if not ddl or not partition_key or partition_key in constraint.columns:
+        return ddl
+    return f"{ddl[:-1]}, {compiler.preparer.quote(partition_key)})"
+
+
+class server_now(FunctionElement):
+    """
+    插入時間戳記的 server_default：資料庫端目前時間
+
+    SQLite 的 CURRENT_TIMESTAMP 只到秒，同一秒插入的資料依時間排序時順序不定，
+    SQLite 上改以 strftime('%f') 取到毫秒；其他資料庫同 func.now()
+    """
+
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(server_now)
+def _compile_server_now(element, compiler, **kw):
+    return compiler.process(func.now(), **kw)
+
+
+@compiles(server_now, "sqlite")
+def _compile_server_now_sqlite(element, compiler, **kw):
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _require_text(value, label, max_length=None):
+    """去除前後空白並檢查非空與長度上限（只 strip 一次）"""
+    stripped = value.strip() if value else ""
+    if not stripped:
+        raise ValueError(f"{label}不能為空")
+    if max_length is not None and len(stripped) > max_length:
+        raise ValueError(f"{label}長度不能超過 {max_length} 字元")
+    return stripped
+
+
+def _jsonb_gin_index(name, column, where=None):
+    """JSONB 欄位的 GIN 索引（jsonb_path_ops，支援 @> 包含查詢）；僅在 PostgreSQL 建立"""
+    return Index(
+        name, column,
+        postgresql_using='gin',
+        postgresql_ops={column: 'jsonb_path_ops'},
+        postgresql_where=where,
+    ).ddl_if(dialect='postgresql')
+
+
+# 執行狀態允許值：模組層級 frozenset，驗證時不必每次重建集合
+REASONING_EXECUTION_STATUSES = frozenset({'pending', 'running', 'completed', 'failed'})
+SCRIPT_EXECUTION_STATUSES = frozenset({'running', 'completed', 'failed'})
+
+
+def _status_check(name, allowed):
+    """status 欄位的 CHECK 約束：COPY/executemany 等繞過 @validates 的批次寫入也受資料庫把關"""
+    values = ", ".join(f"'{value}'" for value in sorted(allowed))
+    return CheckConstraint(f"status IN ({values})", name=name)
+
+
+def _validate_status(value, allowed):
+    if value not in allowed:
+        raise ValueError(f"執行狀態必須為 {set(allowed)} 之一")
+    return value
+
 # =============================================================================
 # 角色枚舉 (Role Enum)
 # =============================================================================
@@ -111,11 +193,10 @@ class File(Base):
     @validates('filename')
     def validate_filename(self, key, value):
         """驗證檔案名稱"""
-        if not value or not value.strip():
-            raise ValueError("檔案名稱不能為空")
+        stripped = _require_text(value, "檔案名稱")
         if len(value) > 255:
             raise ValueError("檔案名稱長度不能超過 255 字元")
-        return value.strip()
+        return stripped
     
     @validates('file_hash')
     def validate_file_hash(self, key, value):
@@ -151,11 +232,7 @@ class Tag(Base):
 
     @validates('name')
     def validate_name(self, key, value):
-      if not value or not value.strip():
-        raise ValueError("標籤名稱不能為空")
-      if len(value.strip()) > 100:
-        raise ValueError("標籤名稱長度不能超過 100 字元")
-      return value.strip()
+      return _require_text(value, "標籤名稱", 100)
 
 # =============================================================================
 # 結論表 (Conclusion)
@@ -188,9 +265,7 @@ class Conclusion(Base):
 
     @validates('content')
     def validate_content(self, key, value):
-      if not value or not value.strip():
-        raise ValueError("結論內容不能為空")
-      return value.strip()
+      return _require_text(value, "結論內容")
 
 # =============================================================================
 # 標註表 (Annotation)
@@ -212,6 +287,7 @@ class Annotation(Base):
       - "manual": 手動標註
       - "ai_model_v1": AI 模型自動標註
       - "label_studio": 外部標註工具匯入
+      - "auto_classification": 檔案自動分類結果
     """
     __tablename__ = "annotations"
 
@@ -233,11 +309,17 @@ class Annotation(Base):
     __table_args__ = (
         Index('idx_annotation_file_source', 'file_id', 'source'),
         Index('idx_annotation_created', 'created_at'),
+        # 部分索引：只涵蓋自動分類註解，供分類端點依 file_id 查找
+        Index(
+            'idx_annotation_autoclass', 'file_id',
+            sqlite_where=text("source = 'auto_classification'"),
+            postgresql_where=text("source = 'auto_classification'"),
+        ),
     )
 
     @validates('source')
     def validate_source(self, key, value):
-      allowed = {"manual", "ai_model_v1", "label_studio", "auto", "imported"}
+      allowed = {"manual", "ai_model_v1", "label_studio", "auto", "imported", "auto_classification"}
       v = (value or "manual").strip()
       if v not in allowed:
         raise ValueError(f"標註來源必須為 {allowed} 之一")
@@ -383,11 +465,7 @@ class ReasoningChain(Base):
     
     @validates('name')
     def validate_name(self, key, value):
-        if not value or not value.strip():
-            raise ValueError("推理鏈名稱不能為空")
-        if len(value.strip()) > 255:
-            raise ValueError("推理鏈名稱長度不能超過 255 字元")
-        return value.strip()
+        return _require_text(value, "推理鏈名稱", 255)
     
     @validates('nodes')
     def validate_nodes(self, key, value):
@@ -429,18 +507,20 @@ class ReasoningNode(Base):
       - chain: 指向 ReasoningChain 表
     """
     __tablename__ = "reasoning_nodes"
+    # 時間戳由資料庫產生（server_default），INSERT 時以 RETURNING 一併取回
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
     chain_id = Column(UUIDType(binary=False), ForeignKey("reasoning_chains.id"), nullable=False, index=True)
     node_id = Column(String(128), nullable=False, index=True)
     node_type = Column(String(50), nullable=False, index=True)
     name = Column(String(255), nullable=False)
-    config = Column(JSON, nullable=True)
-    inputs = Column(JSON, nullable=True)
-    outputs = Column(JSON, nullable=True)
+    config = Column(JSONDocument, nullable=True)
+    inputs = Column(JSONDocument, nullable=True)
+    outputs = Column(JSONDocument, nullable=True)
     position = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=server_now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=server_now(), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     
     # 關聯
     chain = relationship("ReasoningChain", back_populates="node_items")
@@ -453,27 +533,35 @@ class ReasoningNode(Base):
     
     @validates('node_id')
     def validate_node_id(self, key, value):
-      if not value or not value.strip():
-        raise ValueError("節點 ID 不能為空")
-      if len(value.strip()) > 128:
-        raise ValueError("節點 ID 長度不能超過 128 字元")
-      return value.strip()
+      return _require_text(value, "節點 ID ", 128)
     
     @validates('node_type')
     def validate_node_type(self, key, value):
-      if not value or not value.strip():
-        raise ValueError("節點類型不能為空")
-      if len(value.strip()) > 50:
-        raise ValueError("節點類型長度不能超過 50 字元")
-      return value.strip()
+      return _require_text(value, "節點類型", 50)
     
     @validates('name')
     def validate_name(self, key, value):
-      if not value or not value.strip():
-        raise ValueError("節點名稱不能為空")
-      if len(value.strip()) > 255:
-        raise ValueError("節點名稱長度不能超過 255 字元")
-      return value.strip()
+      return _require_text(value, "節點名稱", 255)
+    
+    @classmethod
+    def bulk_insert(cls, session, rows):
+      """
+      批量新增節點
+
+      逐列以與 @validates 相同的規則檢查並正規化後，以單一 INSERT（executemany）寫入，
+      不建立 ORM 物件、也不經過屬性事件。rows 為欄位字典列表；未提供 id 時自動產生。
+      """
+      prepared = []
+      for row in rows:
+        item = dict(row)
+        item.setdefault("id", uuid.uuid4())
+        item["node_id"] = _require_text(item.get("node_id"), "節點 ID ", 128)
+        item["node_type"] = _require_text(item.get("node_type"), "節點類型", 50)
+        item["name"] = _require_text(item.get("name"), "節點名稱", 255)
+        prepared.append(item)
+      if prepared:
+        session.execute(insert(cls), prepared)
+      return [item["id"] for item in prepared]
     
     def __repr__(self):
       return f"<ReasoningNode(id={self.id}, chain_id={self.chain_id}, node_id={self.node_id}, type={self.node_type})>"
@@ -496,7 +584,7 @@ class ReasoningExecution(Base):
       - user_id: 執行者用戶 ID
       - model_name: 使用的模型名稱（可選）
       - tool_name: 使用的工具名稱（可選）
-      - status: 執行狀態（running/completed/failed）
+      - status: 執行狀態（pending/running/completed/failed）
       - input_data: JSONB 格式的輸入參數
       - results: JSONB 格式的執行結果
         格式範例：
@@ -520,13 +608,17 @@ class ReasoningExecution(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     model_name = Column(String(100), nullable=True, index=True)
     tool_name = Column(String(100), nullable=True, index=True)
-    status = Column(String(50), default="running", nullable=False, index=True)  # running/completed/failed
-    input_data = Column(JSON, nullable=True)
-    results = Column(JSON, nullable=True)
+    status = Column(String(50), default="running", nullable=False, index=True)  # pending/running/completed/failed
+    input_data = Column(JSONDocument, nullable=True)
+    results = Column(JSONDocument, nullable=True)
     error_log = Column(Text, nullable=True)
-    started_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # PostgreSQL 依 started_at 按月分區（分區鍵只在 PostgreSQL DDL 併入主鍵）
+    started_at = Column(DateTime(timezone=True), server_default=server_now(), nullable=False)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     execution_time_ms = Column(Float, nullable=True)  # 執行耗時（毫秒）
+
+    # 時間戳由資料庫產生（server_default），INSERT 時以 RETURNING 一併取回
+    __mapper_args__ = {"eager_defaults": True}
     
     # 關聯
     chain = relationship("ReasoningChain", back_populates="executions")
@@ -538,14 +630,16 @@ class ReasoningExecution(Base):
         Index('idx_execution_started', 'started_at'),
         Index('idx_execution_status', 'status'),
       Index('idx_execution_user_started', 'user_id', 'started_at'),
+        # 只有完成的執行會依結果指標查詢，部分索引讓 GIN 索引維持精簡
+        _jsonb_gin_index('idx_exec_results_gin', 'results', where=text("status = 'completed'")),
+        _jsonb_gin_index('idx_exec_input_data_gin', 'input_data'),
+        _status_check('ck_reasoning_execution_status', REASONING_EXECUTION_STATUSES),
+        {'postgresql_partition_by': 'RANGE (started_at)', 'info': {'partition_key': 'started_at'}},
     )
     
     @validates('status')
     def validate_status(self, key, value):
-        allowed = {'running', 'completed', 'failed'}
-        if value not in allowed:
-            raise ValueError(f"執行狀態必須為 {allowed} 之一")
-        return value
+        return _validate_status(value, REASONING_EXECUTION_STATUSES)
     
     def __repr__(self):
         return f"<ReasoningExecution(id={self.id}, chain_id={self.chain_id}, status={self.status})>"
@@ -585,16 +679,18 @@ class Script(Base):
       - created_by: 指向 User 表的建立者
     """
     __tablename__ = "scripts"
+    # 時間戳由資料庫產生（server_default），INSERT 時以 RETURNING 一併取回
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False, index=True)
     content = Column(Text, nullable=False)
-    parameters = Column(JSON, nullable=True)
+    parameters = Column(JSONDocument, nullable=True)
     category = Column(String(50), default="custom", nullable=False, index=True)
     version = Column(String(20), default="1.0.0", nullable=False)
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=server_now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=server_now(), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     
     # 關聯
     executions = relationship("ScriptExecution", back_populates="script", cascade="all, delete-orphan")
@@ -605,15 +701,12 @@ class Script(Base):
         Index('idx_script_name', 'name'),
         Index('idx_script_category', 'category'),
         Index('idx_script_created', 'created_at'),
+        _jsonb_gin_index('idx_script_parameters_gin', 'parameters'),
     )
     
     @validates('name')
     def validate_name(self, key, value):
-        if not value or not value.strip():
-            raise ValueError("腳本名稱不能為空")
-        if len(value.strip()) > 255:
-            raise ValueError("腳本名稱長度不能超過 255 字元")
-        return value.strip()
+        return _require_text(value, "腳本名稱", 255)
     
     def __repr__(self):
         return f"<Script(id={self.id}, name={self.name}, version={self.version})>"
@@ -648,12 +741,16 @@ class ScriptExecution(Base):
     id = Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
     script_id = Column(UUIDType(binary=False), ForeignKey("scripts.id"), nullable=False, index=True)
     status = Column(String(50), default="running", nullable=False, index=True)
-    input_params = Column(JSON, nullable=True)
-    result = Column(JSON, nullable=True)
+    input_params = Column(JSONDocument, nullable=True)
+    result = Column(JSONDocument, nullable=True)
     error = Column(Text, nullable=True)
-    started_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # PostgreSQL 依 started_at 按月分區（分區鍵只在 PostgreSQL DDL 併入主鍵）
+    started_at = Column(DateTime(timezone=True), server_default=server_now(), nullable=False)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     execution_time_ms = Column(Float, nullable=True)
+
+    # 時間戳由資料庫產生（server_default），INSERT 時以 RETURNING 一併取回
+    __mapper_args__ = {"eager_defaults": True}
     
     # 關聯
     script = relationship("Script", back_populates="executions")
@@ -662,15 +759,123 @@ class ScriptExecution(Base):
     __table_args__ = (
         Index('idx_script_exec_script_status', 'script_id', 'status'),
         Index('idx_script_exec_started', 'started_at'),
+        _jsonb_gin_index('idx_script_exec_input_params_gin', 'input_params'),
+        _jsonb_gin_index('idx_script_exec_result_gin', 'result'),
+        _status_check('ck_script_execution_status', SCRIPT_EXECUTION_STATUSES),
+        {'postgresql_partition_by': 'RANGE (started_at)', 'info': {'partition_key': 'started_at'}},
     )
     
     @validates('status')
     def validate_status(self, key, value):
-        allowed = {'running', 'completed', 'failed'}
-        if value not in allowed:
-            raise ValueError(f"執行狀態必須為 {allowed} 之一")
-        return value
+        return _validate_status(value, SCRIPT_EXECUTION_STATUSES)
     
     def __repr__(self):
         return f"<ScriptExecution(id={self.id}, script_id={self.script_id}, status={self.status})>"
 
+
+# =============================================================================
+# 執行記錄分區 (PostgreSQL)
+# =============================================================================
+PARTITIONED_EXECUTION_TABLES = ("reasoning_executions", "script_executions")
+
+
+def create_monthly_partitions(connection, table_name, first_month, months_ahead=2):
+    """
+    為按月分區的執行記錄表建立分區（PostgreSQL）
+
+    從 first_month 所在月份建立到目前月份之後 months_ahead 個月，另建一個 DEFAULT
+    分區承接範圍外的資料；已存在的分區會略過。可由排程（cron）定期呼叫預建下個月分區。
+    """
+    def month_start(year, month):
+        return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1, tzinfo=timezone.utc)
+
+    now = datetime.now(timezone.utc)
+    year, month = first_month.year, first_month.month
+    last = month_start(now.year, now.month + months_ahead)
+    while month_start(year, month) <= last:
+        start, end = month_start(year, month), month_start(year, month + 1)
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table_name}_{start:%Y_%m} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        year, month = end.year, end.month
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"
+    ))
+
+
+def _create_initial_partitions(target, connection, **kw):
+    """create_all 建立分區父表後立即建立當月起的分區，否則無法寫入"""
+    if connection.dialect.name == "postgresql":
+        create_monthly_partitions(connection, target.name, datetime.now(timezone.utc))
+
+
+for _model in (ReasoningExecution, ScriptExecution):
+    event.listen(_model.__table__, "after_create", _create_initial_partitions)
+
+
+# =============================================================================
+# 檔案數量統計 (file_stats)
+# =============================================================================
+# 單列計數表：files 的 AFTER INSERT/DELETE 觸發器維護 total，
+# 列表總筆數改為主鍵查詢，不必每次 COUNT(*) 掃描整張 files
+FILE_STATS_ROW_ID = 1
+
+file_stats = Table(
+    "file_stats",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("total", BigInteger, nullable=False, server_default=text("0")),
+)
+
+_FILE_STATS_TRIGGERS = {
+    "postgresql": (
+        """
+        CREATE OR REPLACE FUNCTION bump_file_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE file_stats SET total = total + 1 WHERE id = 1;
+            ELSE
+                UPDATE file_stats SET total = total - 1 WHERE id = 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_file_stats ON files",
+        "CREATE TRIGGER trg_file_stats AFTER INSERT OR DELETE ON files "
+        "FOR EACH ROW EXECUTE FUNCTION bump_file_stats()",
+    ),
+    "sqlite": (
+        "CREATE TRIGGER IF NOT EXISTS trg_file_stats_insert AFTER INSERT ON files "
+        "BEGIN UPDATE file_stats SET total = total + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_file_stats_delete AFTER DELETE ON files "
+        "BEGIN UPDATE file_stats SET total = total - 1 WHERE id = 1; END",
+    ),
+}
+
+
+def install_file_stats_triggers(connection):
+    """
+    建立 file_stats 觸發器並以目前檔案數初始化計數列（可重複呼叫）
+
+    僅支援 PostgreSQL 與 SQLite；其他方言不建立計數列，讀取端退回 COUNT(*)
+    """
+    statements = _FILE_STATS_TRIGGERS.get(connection.dialect.name)
+    if statements is None:
+        return
+    for statement in statements:
+        # exec_driver_sql：PL/pgSQL 內容不經過綁定參數解析
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(
+        "INSERT INTO file_stats (id, total) SELECT 1, (SELECT COUNT(*) FROM files) "
+        "WHERE NOT EXISTS (SELECT 1 FROM file_stats WHERE id = 1)"
+    )
+
+
+def _create_file_stats_triggers(target, connection, **kw):
+    """create_all 完成後（files 與 file_stats 皆已存在）安裝計數觸發器"""
+    install_file_stats_triggers(connection)
+
+
+event.listen(Base.metadata, "after_create", _create_file_stats_triggers)
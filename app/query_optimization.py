@@ -6,20 +6,66 @@
 
 【工具】
 - PaginationParams: 分頁參數模型
-- optimize_file_query: 最佳化檔案查詢
-- paginate: 分頁查詢工具
+- optimize_file_query: 最佳化檔案查詢（同一請求內重用已建好的語句）
+- reset_request_query_cache: 於請求開始時建立請求範圍的語句快取
+- optimize_file_query_json: 在資料庫端組出含關聯的 JSON 檔案列
+- load_file_children: 以單一 UNION ALL 查詢載入多個檔案的標籤、結論與標註
+- file_count: 由 file_stats 計數表讀取檔案總數
+- paginate: 分頁查詢工具（接受 select()，COUNT 結果短暫快取）
+- stream_all: 以伺服器端游標分塊串流整個查詢（匯出用）
+- encode_cursor / decode_cursor: keyset 分頁游標
+- count_queries: 統計區塊內送出的 SQL 語句（鎖定端點查詢數上限）
+
+查詢一律以 SQLAlchemy 2.0 的 select() 組成、db.execute(stmt).scalars() 取值；
+select() 建構的語句可由引擎的編譯快取（query_cache_size）重用，
+舊式 Query 每次都得重新組裝與編譯。
 """
 
+import base64
+import binascii
+import hashlib
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from cachetools import TTLCache
 from pydantic import BaseModel, Field, ConfigDict
-from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import desc, func
-from typing import List, Tuple, Optional, Any, TypeVar
+from sqlalchemy.orm import Query, Session, joinedload, load_only, selectinload
+from sqlalchemy import (
+    ARRAY,
+    JSON,
+    DateTime,
+    Integer,
+    bindparam,
+    desc,
+    event,
+    func,
+    literal,
+    literal_column,
+    null,
+    select,
+    tuple_,
+    type_coerce,
+)
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple, Optional, Any, TypeVar
 import logging
+from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# paginate() 的 COUNT 結果快取：翻頁時篩選條件不變，30 秒內重用同一查詢的總筆數
+_count_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+
+# 請求範圍的 select() 語句快取：由中介層在每個請求開始時重設；
+# 未設定（例如背景工作或測試直接呼叫）時不快取
+_request_query_cache: ContextVar[Optional[Dict[Any, Any]]] = ContextVar(
+    "_request_query_cache", default=None
+)
+
 
 class PaginationParams(BaseModel):
     """分頁參數"""
@@ -27,6 +73,9 @@ class PaginationParams(BaseModel):
     page_size: int = Field(default=20, ge=1, le=100, description="每頁筆數")
     sort_by: Optional[str] = Field(default=None, description="排序欄位")
     order: Optional[str] = Field(default="desc", pattern="^(asc|desc)$", description="排序順序")
+    cursor: Optional[str] = Field(default=None, description="keyset 游標（上一頁回傳的 next_cursor），提供時忽略 page")
+
+    model_config = ConfigDict(extra="forbid")
     
     def get_offset(self) -> int:
         """取得查詢偏移量"""
@@ -37,15 +86,55 @@ class PaginationParams(BaseModel):
         return self.page_size
 
 
-class PaginationResult(BaseModel):
-    """分頁結果"""
+@dataclass(frozen=True)
+class PaginationResult:
+    """分頁結果（內部產生的資料，不需 Pydantic 驗證）"""
     data: List[Any]
     total: int
     page: int
     page_size: int
     total_pages: int
-    
-    model_config = ConfigDict(arbitrary_types_allowed=True)
+    next_cursor: Optional[str] = None
+    has_next: bool = False
+
+
+def _as_statement(query, db: Optional[Session] = None) -> Tuple[Session, Any]:
+    """將舊式 Query 轉為 (Session, Select)；select() 語句原樣回傳並搭配傳入的 db"""
+    if isinstance(query, Query):
+        return query.session, query.statement
+    if db is None:
+        raise ValueError("傳入 select() 語句時必須提供 db")
+    return db, query
+
+
+def count_rows(db: Session, stmt) -> int:
+    """以 SELECT count(*) FROM (stmt) 取得總筆數（排序對計數無意義，先移除）"""
+    count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+    return db.execute(count_stmt).scalar_one()
+
+
+def _count_cache_key(db: Session, stmt) -> str:
+    """以資料庫 URL、編譯後 SQL 與綁定參數組成 COUNT 快取鍵"""
+    bind = db.get_bind()
+    compiled = stmt.compile(dialect=bind.dialect)
+    raw = f"{bind.url}|{compiled}|{sorted(compiled.params.items(), key=lambda item: item[0])!r}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def cached_count(db: Session, stmt) -> int:
+    """取得查詢總筆數，30 秒內相同查詢直接回傳快取值"""
+    key = _count_cache_key(db, stmt)
+    total = _count_cache.get(key)
+    if total is None:
+        total = count_rows(db, stmt)
+        _count_cache[key] = total
+    return total
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_count_cache(session) -> None:
+    """任何寫入交易提交後清空 COUNT 快取，避免新增/刪除後回傳過期總數"""
+    _count_cache.clear()
 
 
 def paginate(
@@ -53,72 +142,298 @@ def paginate(
     page: int = 1,
     page_size: int = 20,
     sort_by: Optional[str] = None,
-    order: str = "desc"
+    order: str = "desc",
+    sortable_columns: Optional[Dict[str, Any]] = None,
+    db: Optional[Session] = None,
 ) -> Tuple[List[T], int]:
     """
     分頁查詢
     
     參數：
-        query: SQLAlchemy 查詢對象
+        query: select() 語句（需同時提供 db）；舊式 Query 仍可傳入，會轉為 select()
         page: 頁碼（從 1 開始）
         page_size: 每頁筆數
         sort_by: 排序欄位名稱
         order: 排序順序 (asc/desc)
+        sortable_columns: 可排序欄位對照表 {名稱: 欄位}；提供時直接查表，
+            否則從查詢的 FROM 子句反查欄位
+        db: 執行 select() 語句的 Session
     
     返回：
         (資料列表, 總筆數)
     """
-    # 取得總筆數
-    total = query.count()
+    db, stmt = _as_statement(query, db)
+
+    # 取得總筆數（翻頁時重用快取）
+    total = cached_count(db, stmt)
     
     # 排序
+    sort_column = None
     if sort_by:
-        froms = query.statement.get_final_froms()
-        if froms and hasattr(froms[0].c, sort_by):
-            sort_column = getattr(froms[0].c, sort_by)
+        if sortable_columns is not None:
+            sort_column = sortable_columns.get(sort_by)
         else:
-            sort_column = None
-    else:
-        sort_column = None
+            froms = stmt.get_final_froms()
+            if froms:
+                sort_column = froms[0].c.get(sort_by)
     if sort_column is not None:
         if order == "desc":
-            query = query.order_by(desc(sort_column))
+            stmt = stmt.order_by(desc(sort_column))
         else:
-            query = query.order_by(sort_column)
+            stmt = stmt.order_by(sort_column)
     
     # 分頁
     offset = (page - 1) * page_size
-    data = query.limit(page_size).offset(offset).all()
+    result = db.execute(stmt.limit(page_size).offset(offset))
+    # 單一實體（select(File)）取 ORM 物件，多欄位查詢保留 Row
+    data = result.scalars().all() if len(result.keys()) == 1 else result.all()
     
     return data, total
 
 
-def optimize_file_query(db: Session, with_relations: bool = True):
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """將 (created_at, id) 編碼為 URL 安全的 keyset 游標"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    解碼 keyset 游標
+
+    游標格式錯誤時拋出 ValueError
+    """
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError(f"無效的分頁游標: {cursor!r}") from exc
+
+
+def stream_all(db: Session, stmt, chunk_size: int = 1000) -> Iterator[Any]:
+    """
+    分塊串流查詢的所有結果
+
+    匯出整張表時使用，取代逐頁呼叫 get_files_with_pagination：OFFSET 分頁每頁
+    都會重新掃過先前的資料列（總成本 O(N²)），這裡則以伺服器端游標
+    （PostgreSQL 的具名游標）一次掃描，記憶體中最多只保留一個 chunk。
+
+    用法：
+        for file in stream_all(db, optimize_file_query(db)):
+            writer.writerow([file.id, file.filename])
+    """
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+    yield from result.scalars()
+
+
+def reset_request_query_cache():
+    """
+    為目前請求建立新的語句快取，回傳可交給 _request_query_cache.reset() 的 token
+
+    select() 語句不可變且不綁定 Session，同一請求內多次呼叫
+    optimize_file_query 時可直接重用，省去重新套用 selectinload/load_only 選項
+    """
+    return _request_query_cache.set({})
+
+
+def optimize_file_query(
+    db: Session,
+    with_relations: bool = True,
+    columns_only: Optional[Tuple[Any, ...]] = None,
+):
     """
     最佳化檔案查詢
     
-    使用關聯預加載 (joinedload/selectinload) 減少資料庫往返
+    使用關聯預加載 (joinedload/selectinload) 減少資料庫往返；
+    指定 columns_only 時只載入這些欄位（load_only），其餘欄位延遲到存取時才查詢，
+    且不預加載關聯，適合只顯示檔名與時間的列表
+
+    回傳 select() 語句，以 db.execute(stmt).scalars() 取得 File 物件；
+    請求範圍內（見 reset_request_query_cache）相同參數回傳同一個語句物件
     """
+    cache = _request_query_cache.get()
+    if cache is None:
+        return _build_file_query(with_relations, columns_only)
+    # 欄位屬性覆寫了 ==，以欄位名稱組成快取鍵
+    key = (with_relations, tuple(column.key for column in columns_only or ()))
+    stmt = cache.get(key)
+    if stmt is None:
+        stmt = cache[key] = _build_file_query(with_relations, columns_only)
+    return stmt
+
+
+def _build_file_query(with_relations: bool, columns_only: Optional[Tuple[Any, ...]]):
+    """組出 optimize_file_query 的 select() 語句"""
     from .models import File
     
-    query = db.query(File)
+    stmt = select(File)
+
+    if columns_only:
+        return stmt.options(load_only(*columns_only))
     
     if with_relations:
         # 使用 selectinload 預加載關聯
         # selectinload 更適合一對多和多對多關係
-        query = query.options(
+        stmt = stmt.options(
             selectinload(File.tags),
             selectinload(File.conclusions),
             selectinload(File.annotations)
         )
     
-    return query
+    return stmt
+
+
+def optimize_file_query_json(db: Session):
+    """
+    在資料庫端把檔案與其 tags/conclusions/annotations 組成 JSON
+
+    每個關聯以相關子查詢聚合為 JSON 陣列（PostgreSQL: json_agg/json_build_object；
+    SQLite: json_group_array/json_object），整頁只需一次查詢，
+    也不必為數千筆子資料建立 ORM 物件。回傳 Core select，以 db.execute(...).mappings() 取值。
+    """
+    from .models import Annotation, Conclusion, File, Tag, file_tags
+
+    if db.get_bind().dialect.name == "postgresql":
+        json_agg, json_object, as_json = func.json_agg, func.json_build_object, lambda column: column
+    else:
+        # SQLite 的 JSON 欄位存為文字，需以 json() 轉回 JSON 值才不會被當成字串嵌入
+        json_agg, json_object, as_json = func.json_group_array, func.json_object, func.json
+
+    def row(**columns):
+        # 鍵名以 SQL 字面值輸出，避免伺服器端綁定時無法推斷參數型別
+        args = []
+        for key, column in columns.items():
+            args.extend((literal_column(f"'{key}'"), column))
+        return json_object(*args)
+
+    def aggregate(element):
+        return select(func.coalesce(json_agg(element), literal_column("'[]'")))
+
+    tags = aggregate(row(id=Tag.id, name=Tag.name)).select_from(
+        file_tags.join(Tag, Tag.id == file_tags.c.tag_id)
+    ).where(file_tags.c.file_id == File.id)
+    conclusions = aggregate(
+        row(
+            id=Conclusion.id, file_id=Conclusion.file_id,
+            content=Conclusion.content, created_at=Conclusion.created_at,
+        )
+    ).where(Conclusion.file_id == File.id)
+    annotations = aggregate(
+        row(
+            id=Annotation.id, file_id=Annotation.file_id, data=as_json(Annotation.data),
+            source=Annotation.source, created_at=Annotation.created_at,
+        )
+    ).where(Annotation.file_id == File.id)
+
+    return select(
+        File.id,
+        File.filename,
+        File.storage_key,
+        File.file_hash,
+        File.created_at,
+        type_coerce(tags.scalar_subquery(), JSON).label("tags"),
+        type_coerce(conclusions.scalar_subquery(), JSON).label("conclusions"),
+        type_coerce(annotations.scalar_subquery(), JSON).label("annotations"),
+    )
+
+
+def load_file_children(
+    db: Session, file_ids: List[int]
+) -> Tuple[Dict[int, List[dict]], Dict[int, List[dict]], Dict[int, List[dict]]]:
+    """
+    以單一 UNION ALL 查詢載入多個檔案的 tags/conclusions/annotations
+
+    取代三個 selectinload 的三次往返：三種子資料補齊成相同欄位
+    (kind, file_id, id, text, data, created_at) 後合併，再依 kind 分桶。
+
+    返回：
+        (tags, conclusions, annotations)，皆為 {file_id: [dict, ...]}
+    """
+    from .models import Annotation, Conclusion, Tag, file_tags
+
+    tags: Dict[int, List[dict]] = defaultdict(list)
+    conclusions: Dict[int, List[dict]] = defaultdict(list)
+    annotations: Dict[int, List[dict]] = defaultdict(list)
+    if not file_ids:
+        return tags, conclusions, annotations
+
+    # 合併結果的欄位型別取自第一個 SELECT，因此由欄位最完整的 annotations 開頭
+    stmt = select(
+        literal("a").label("kind"),
+        Annotation.file_id.label("file_id"),
+        Annotation.id.label("id"),
+        Annotation.source.label("text"),
+        Annotation.data.label("data"),
+        Annotation.created_at.label("created_at"),
+    ).where(Annotation.file_id.in_(file_ids)).union_all(
+        select(
+            literal("c"),
+            Conclusion.file_id,
+            Conclusion.id,
+            Conclusion.content,
+            type_coerce(null(), JSON),
+            Conclusion.created_at,
+        ).where(Conclusion.file_id.in_(file_ids)),
+        select(
+            literal("t"),
+            file_tags.c.file_id,
+            Tag.id,
+            Tag.name,
+            type_coerce(null(), JSON),
+            type_coerce(null(), DateTime(timezone=True)),
+        )
+        .select_from(file_tags.join(Tag, Tag.id == file_tags.c.tag_id))
+        .where(file_tags.c.file_id.in_(file_ids)),
+    ).order_by(literal_column("id"))
+
+    for kind, file_id, row_id, text_value, data, created_at in db.execute(stmt):
+        if kind == "t":
+            tags[file_id].append({"id": row_id, "name": text_value})
+        elif kind == "c":
+            conclusions[file_id].append(
+                {"id": row_id, "file_id": file_id, "content": text_value, "created_at": created_at}
+            )
+        else:
+            annotations[file_id].append(
+                {
+                    "id": row_id,
+                    "file_id": file_id,
+                    "data": data,
+                    "source": text_value,
+                    "created_at": created_at,
+                }
+            )
+    return tags, conclusions, annotations
 
 
 def optimize_user_query(db: Session):
-    """最佳化使用者查詢"""
+    """最佳化使用者查詢（回傳 select() 語句）"""
     from .models import User
-    return db.query(User)
+    return select(User)
+
+
+def file_count(db: Session) -> int:
+    """
+    檔案總數
+
+    讀取觸發器維護的 file_stats 計數列（主鍵查詢）；
+    計數列不存在時（不支援觸發器的方言）退回 COUNT(*)
+    """
+    from .models import FILE_STATS_ROW_ID, File, file_stats
+
+    total = db.execute(
+        select(file_stats.c.total).where(file_stats.c.id == FILE_STATS_ROW_ID)
+    ).scalar()
+    if total is None:
+        return count_rows(db, select(File))
+    return int(total)
+
+
+@lru_cache(maxsize=None)
+def file_sort_columns() -> Dict[str, Any]:
+    """檔案列表可排序欄位（首次呼叫時建立，避免模組載入時循環匯入 models）"""
+    from .models import File
+    return {"created_at": File.created_at, "filename": File.filename, "id": File.id}
 
 
 def get_files_with_pagination(
@@ -126,37 +441,81 @@ def get_files_with_pagination(
     page: int = 1,
     page_size: int = 20,
     sort_by: str = "created_at",
-    order: str = "desc"
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    response_format: str = "orm",
+    detail: bool = False,
 ) -> PaginationResult:
     """
     取得檔案列表（含分頁）
-    
+
+    依 created_at 排序時以 (created_at, id) 做 keyset 分頁：回傳 next_cursor，
+    下一頁帶入 cursor 直接走索引定位，不再 OFFSET 掃過前面的資料列；
+    多取一筆判斷 has_next。page（OFFSET）分頁僅為相容保留。
+    兩種分頁的總筆數都由 file_count 讀取 file_stats 計數列，不掃描 files。
+
+    response_format="json" 時 data 為 optimize_file_query_json 的字典列
+    （關聯已在資料庫端組好），不建立 ORM 物件。
+
+    ORM 列表預設只載入 id/filename/created_at（其餘欄位延遲載入）；
+    detail=True 時載入完整欄位並預加載關聯。
+
     使用範例：
     ```python
-    result = get_files_with_pagination(db, page=1, page_size=10)
-    for file in result.data:
-        print(file.filename)
+    result = get_files_with_pagination(db, page_size=10)
+    while result.has_next:
+        result = get_files_with_pagination(db, page_size=10, cursor=result.next_cursor)
     ```
     """
-    query = optimize_file_query(db)
-    
-    # 應用排序
     from .models import File
-    if sort_by == "created_at":
+    as_json = response_format == "json"
+    if as_json:
+        query = optimize_file_query_json(db)
+    elif detail:
+        query = optimize_file_query(db)
+    else:
+        query = optimize_file_query(db, columns_only=(File.id, File.filename, File.created_at))
+
+    # 應用排序：未知欄位退回 created_at；id 作為同值時的次序
+    if cursor is not None:
+        sort_column = File.created_at
+    else:
+        sort_column = file_sort_columns().get(sort_by, File.created_at)
+    keyset = sort_column is File.created_at
+    if order == "desc":
+        query = query.order_by(desc(sort_column), desc(File.id))
+    else:
+        query = query.order_by(sort_column, File.id)
+
+    if cursor is not None:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        position = tuple_(File.created_at, File.id)
         if order == "desc":
-            query = query.order_by(desc(File.created_at))
+            page_query = query.where(position < tuple_(cursor_ts, cursor_id))
         else:
-            query = query.order_by(File.created_at)
-    elif sort_by == "filename":
-        if order == "desc":
-            query = query.order_by(desc(File.filename))
+            page_query = query.where(position > tuple_(cursor_ts, cursor_id))
+    else:
+        if page > 1:
+            logger.warning("OFFSET 分頁已過時（page=%d），請改用 cursor", page)
+        page_query = query.offset((page - 1) * page_size)
+    total = file_count(db)
+
+    # 多取一筆作為哨兵，判斷是否還有下一頁
+    page_query = page_query.limit(page_size + 1)
+    if as_json:
+        rows = [dict(row) for row in db.execute(page_query).mappings()]
+    else:
+        rows = db.execute(page_query).scalars().all()
+    has_next = len(rows) > page_size
+    data = rows[:page_size]
+
+    next_cursor = None
+    if keyset and has_next:
+        last = data[-1]
+        if as_json:
+            next_cursor = encode_cursor(last["created_at"], last["id"])
         else:
-            query = query.order_by(File.filename)
-    
-    # 應用分頁
-    total = query.count()
-    offset = (page - 1) * page_size
-    data = query.limit(page_size).offset(offset).all()
+            next_cursor = encode_cursor(last.created_at, last.id)
     
     total_pages = (total + page_size - 1) // page_size
     
@@ -165,7 +524,9 @@ def get_files_with_pagination(
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor,
+        has_next=has_next,
     )
 
 
@@ -176,17 +537,27 @@ def get_file_by_id(db: Session, file_id: int):
     預加載：tags, conclusions, annotations
     """
     from .models import File
-    return optimize_file_query(db).filter(File.id == file_id).first()
+    stmt = optimize_file_query(db).where(File.id == file_id)
+    return db.execute(stmt).scalars().first()
 
 
 def bulk_get_files(db: Session, file_ids: List[int]):
     """
     批量取得檔案
     
-    避免 N+1 查詢問題
+    避免 N+1 查詢問題；重複的 id 只查一次
     """
     from .models import File
-    return optimize_file_query(db).filter(File.id.in_(file_ids)).all()
+
+    ids = list(dict.fromkeys(file_ids))
+    if db.get_bind().dialect.name != "postgresql":
+        return db.execute(optimize_file_query(db).where(File.id.in_(ids))).scalars().all()
+
+    # PostgreSQL：以 JOIN unnest(:ids) 取代 IN 清單，SQL 不隨 id 數量變動，
+    # 可重用同一個查詢計畫，大量 id 時也不會產生超長 IN 清單
+    id_list = func.unnest(bindparam("ids", ids, type_=ARRAY(Integer))).table_valued("id")
+    stmt = optimize_file_query(db).join(id_list, File.id == id_list.c.id)
+    return db.execute(stmt).scalars().all()
 
 
 class QueryStats:
@@ -208,3 +579,28 @@ class QueryStats:
             "total_time": cls._total_time,
             "avg_time": cls._total_time / cls._query_count if cls._query_count > 0 else 0
         }
+
+
+@contextmanager
+def count_queries(bind: Any) -> Iterator[List[str]]:
+    """
+    統計區塊內送出的 SQL 語句
+
+    以 before_cursor_execute 事件收集語句，用於在測試中鎖定端點的查詢數上限，
+    避免日後改動重新引入逐筆查詢（N+1）
+
+    用法：
+        with count_queries(db.get_bind()) as statements:
+            client.post("/files/batch-delete", json=ids)
+        assert len(statements) <= 5
+    """
+    statements: List[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
@@ -9,6 +9,7 @@
 
 架構：
   ReasoningEngine
+    ├── _build_and_sort(): 單次走訪完成 DAG 驗證與拓撲排序
     ├── _topological_sort(): 拓撲排序
     ├── _validate_dag(): 驗證有向無環圖
     ├── _get_node_handler(): 獲取節點處理器
@@ -19,13 +20,23 @@
 日期：2026-02-14
 """
 
-from typing import List, Dict, Any, Optional, Tuple
-from collections import defaultdict, deque
-from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+import heapq
+import json
+from datetime import datetime, timedelta
 import logging
 import os
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from cachetools import LRUCache
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    wait,
+)
 from .node_types import (
     NodeConfig,
     NodeInput,
@@ -48,12 +59,24 @@ from .handlers import (
     OutputHandler,
     HANDLER_REGISTRY,
 )
+from sqlalchemy.orm import Session
 from app import models
 
 
 logger = logging.getLogger(__name__)
 
 
+# NodeExecutor 已驗證配置快取的上限（超過時整批清除）
+PREPARED_CONFIG_LIMIT = 1024
+
+# 節點結果快取（cache_key）預設上限，超過時淘汰最久未使用的項目
+NODE_CACHE_MAXSIZE = 1024
+_CACHE_MISS = object()
+
+# 背景寫入佇列上限：寫入跟不上時 execute_chain 會在送出前等待，避免待寫記錄無限累積
+PERSIST_QUEUE_LIMIT = 100
+
+
 class ReasoningEngineException(Exception):
     """推理引擎異常基類"""
     pass
@@ -69,6 +92,16 @@ class NodeExecutionError(ReasoningEngineException):
     pass
 
 
+# 節點類型 -> (配置類別, 處理器屬性名)，模組載入時建立一次
+_DISPATCH: Dict[str, Tuple[type, str]] = {
+    NodeType.DATA_INPUT.value: (DataInputNodeConfig, "data_input_handler"),
+    NodeType.TRANSFORM.value: (TransformNodeConfig, "transform_handler"),
+    NodeType.CALCULATE.value: (CalculateNodeConfig, "calculate_handler"),
+    NodeType.CONDITION.value: (ConditionNodeConfig, "condition_handler"),
+    NodeType.OUTPUT.value: (OutputNodeConfig, "output_handler"),
+}
+
+
 class NodeExecutor:
     """節點執行器：負責單節點執行與錯誤封裝"""
 
@@ -80,46 +113,71 @@ class NodeExecutor:
         self.calculate_handler = CalculateHandler()
         self.condition_handler = ConditionHandler()
         self.output_handler = OutputHandler()
+        # 並行 worker 各自綁定的 Session（見 ReasoningEngine._execute_in_session）
+        self._local = threading.local()
+        # id(node_config) -> (node_config, 配置物件, 處理器)
+        self._prepared: Dict[int, Tuple[Dict[str, Any], Any, Callable]] = {}
+        # 預先綁定各類型的 execute 方法，每個節點只需一次字典查找
+        self._dispatch = {
+            node_type: (config_cls, getattr(self, handler_attr).execute)
+            for node_type, (config_cls, handler_attr) in _DISPATCH.items()
+        }
+
+    def bind_session(self, session: Optional[Session]) -> None:
+        """為目前執行緒綁定 Session（None 解除綁定）"""
+        self._local.db = session
+
+    def current_session(self) -> Optional[Session]:
+        """目前執行緒綁定的 Session，未綁定時為建構時傳入的 db_session"""
+        session = getattr(self._local, "db", None)
+        return session if session is not None else self.db
+
+    def prepare(self, node_config: Dict[str, Any]) -> Tuple[Any, Callable]:
+        """
+        驗證節點配置並建立對應的配置物件與處理器
 
-    def execute(self, node_config: Dict[str, Any], inputs: Dict[str, Any], global_input: Optional[Dict[str, Any]] = None) -> NodeResult:
-        node_id = node_config.get("node_id")
+        同一個 node_config 物件只驗證與建構一次（重試、重複執行同一份節點列表時重用）；
+        以 id() 為鍵並保留原物件比對身分，避免 id 回收後誤用。執行期間節點配置視為不可變。
+        """
+        cached = self._prepared.get(id(node_config))
+        if cached is not None and cached[0] is node_config:
+            return cached[1], cached[2]
+
+        validate_node_config(node_config)
         node_type = node_config.get("node_type")
-        if isinstance(node_type, NodeType):
-            node_type = node_type.value
-        else:
-            node_type = str(node_type).lower() if node_type is not None else None
+        # NodeType 繼承 str，列舉成員可直接查表；其他寫法（大小寫不同等）才正規化
+        entry = self._dispatch.get(node_type)
+        if entry is None and node_type is not None:
+            node_type = str(node_type).lower()
+            entry = self._dispatch.get(node_type)
+        if entry is None:
+            raise NodeExecutionError(f"不支持的節點類型: {node_type}")
+        config_cls, handler = entry
+        config = config_cls(**node_config)
 
-        start_time = datetime.now()
+        if len(self._prepared) >= PREPARED_CONFIG_LIMIT:
+            self._prepared.clear()
+        self._prepared[id(node_config)] = (node_config, config, handler)
+        return config, handler
 
-        try:
-            validate_node_config(node_config)
-            if node_type == NodeType.DATA_INPUT.value:
-                config = DataInputNodeConfig(**node_config)
-                return self.data_input_handler.execute(config, global_input or {}, inputs, self.db, self.storage)
-            if node_type == NodeType.TRANSFORM.value:
-                config = TransformNodeConfig(**node_config)
-                return self.transform_handler.execute(config, global_input or {}, inputs, self.db, self.storage)
-            if node_type == NodeType.CALCULATE.value:
-                config = CalculateNodeConfig(**node_config)
-                return self.calculate_handler.execute(config, global_input or {}, inputs, self.db, self.storage)
-            if node_type == NodeType.CONDITION.value:
-                config = ConditionNodeConfig(**node_config)
-                return self.condition_handler.execute(config, global_input or {}, inputs, self.db, self.storage)
-            if node_type == NodeType.OUTPUT.value:
-                config = OutputNodeConfig(**node_config)
-                return self.output_handler.execute(config, global_input or {}, inputs, self.db, self.storage)
+    def execute(self, node_config: Dict[str, Any], inputs: Dict[str, Any], global_input: Optional[Dict[str, Any]] = None) -> NodeResult:
+        node_id = node_config.get("node_id")
+        # 計時用單調時鐘；牆上時間只在需要自行組 NodeResult（失敗）時取一次
+        start_ns = time.monotonic_ns()
 
-            raise NodeExecutionError(f"不支持的節點類型: {node_type}")
+        try:
+            config, handler = self.prepare(node_config)
+            return handler(config, global_input or {}, inputs, self.current_session(), self.storage)
         except Exception as e:
             logger.exception(f"節點 {node_id} 執行失敗")
+            execution_time_ms = (time.monotonic_ns() - start_ns) / 1e6
             completed_time = datetime.now()
-            execution_time_ms = (completed_time - start_time).total_seconds() * 1000
 
             return NodeResult(
                 node_id=node_id,
                 status=NodeStatus.FAILED,
                 error=str(e),
-                started_at=start_time,
+                started_at=completed_time - timedelta(milliseconds=execution_time_ms),
                 completed_at=completed_time,
                 execution_time_ms=execution_time_ms,
             )
@@ -141,6 +199,8 @@ class ReasoningEngine:
           chain_id="chain-123",
           input_data={"file_id": "file-456"}
       )
+
+    節點超時以共用的執行緒池實作；不再使用時呼叫 close()（或以 with 區塊使用）釋放
     """
     
     def __init__(
@@ -150,6 +210,9 @@ class ReasoningEngine:
         persist_execution: bool = True,
         enable_parallel: bool = False,
         max_workers: Optional[int] = None,
+        async_persist: bool = False,
+        session_factory: Optional[Callable[[], Session]] = None,
+        cache_max: int = NODE_CACHE_MAXSIZE,
     ):
         """
         初始化推理引擎
@@ -157,14 +220,89 @@ class ReasoningEngine:
         參數：
           db_session: SQLAlchemy 資料庫會話（可選）
           storage: 檔案儲存物件 (可選)
+          async_persist: 執行記錄改由背景執行緒以獨立 Session 寫入，
+            execute_chain 不等待 commit；close() 時等待佇列寫完
+          session_factory: 建立 Session 的工廠（如 sessionmaker）；提供時並行模式的
+            每個節點在 worker 執行緒上使用自己的 Session，不再因 db_session 而停用並行
+          cache_max: 節點結果快取（cache_key）的項目上限（LRU 淘汰）
         """
         self.db = db_session
         self.storage = storage
         self.executor = NodeExecutor(db_session=db_session, storage=storage)
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        # 節點結果快取；並行模式下由多個 worker 存取，讀寫都需持有 _cache_lock
+        self.cache: LRUCache = LRUCache(maxsize=cache_max)
+        self._cache_lock = threading.Lock()
         self.persist_execution = persist_execution
         self.enable_parallel = enable_parallel
         self.max_workers = max_workers
+        self.session_factory = session_factory
+        # 節點超時用的共用執行緒池（首次需要時建立），取代每個節點各開一個執行緒
+        self._timeout_pool: Optional[ThreadPoolExecutor] = None
+        self._timeout_pool_busy = 0  # 共用池中已送出但尚未結束的節點數（含超時後仍在跑的節點）
+        self._pool_lock = threading.Lock()  # 保護兩個延遲建立的執行緒池
+        # 執行記錄背景寫入（單一執行緒，依提交順序寫入）
+        self.async_persist = async_persist
+        self._persist_pool: Optional[ThreadPoolExecutor] = None
+        self._persist_slots = threading.BoundedSemaphore(PERSIST_QUEUE_LIMIT)
+
+    def __enter__(self) -> "ReasoningEngine":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        釋放執行緒池
+
+        節點超時池不等待仍在執行的超時節點；背景寫入池會等待佇列中的執行記錄寫完
+        """
+        with self._pool_lock:
+            pool, self._timeout_pool = self._timeout_pool, None
+            self._timeout_pool_busy = 0
+            persist_pool, self._persist_pool = self._persist_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+        if persist_pool is not None:
+            persist_pool.shutdown(wait=True)
+
+    def _submit_timed_task(self, task: Callable[[], NodeResult]) -> Future:
+        """
+        送出設有超時的節點
+
+        共用池有空閒 worker 時送入共用池（任務立即開始）；池已被佔滿時（例如超時節點仍佔著
+        執行緒，或 execute_chain 的 max_workers 大於池大小）改用專屬執行緒，節點不必排隊，
+        排隊時間也不會計入節點超時
+        """
+        pool_size = self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+        with self._pool_lock:
+            if self._timeout_pool is None:
+                self._timeout_pool = ThreadPoolExecutor(
+                    max_workers=pool_size,
+                    thread_name_prefix="node-timeout",
+                )
+            pool = self._timeout_pool
+            use_pool = self._timeout_pool_busy < pool_size
+            if use_pool:
+                self._timeout_pool_busy += 1
+
+        if not use_pool:
+            dedicated = ThreadPoolExecutor(max_workers=1, thread_name_prefix="node-timeout")
+            try:
+                return dedicated.submit(task)
+            finally:
+                dedicated.shutdown(wait=False)
+
+        def pooled_task() -> NodeResult:
+            try:
+                return task()
+            finally:
+                with self._pool_lock:
+                    # close() 之後換了新池，舊池的任務不再影響計數
+                    if self._timeout_pool is pool:
+                        self._timeout_pool_busy -= 1
+
+        return pool.submit(pooled_task)
     
     def execute_chain(
         self,
@@ -205,23 +343,23 @@ class ReasoningEngine:
         use_parallel = self.enable_parallel if enable_parallel is None else enable_parallel
         effective_max_workers = max_workers or self.max_workers
 
-        if use_parallel and self.db is not None:
-            logger.warning("Parallel execution disabled due to shared db_session; use per-thread sessions.")
+        if use_parallel and self.db is not None and self.session_factory is None:
+            logger.warning("Parallel execution disabled due to shared db_session; pass session_factory for per-thread sessions.")
             use_parallel = False
         
         try:
-            # 1. 驗證 DAG 結構
-            logger.info(f"驗證推理鏈結構 ({len(nodes)} 個節點)")
-            self._validate_dag(nodes)
-            
-            # 2. 拓撲排序
-            logger.info("執行拓撲排序")
-            execution_order = self._topological_sort(nodes)
+            # 1-2. 驗證 DAG 結構並拓撲排序（單次走訪，圖結構供並行執行重用）
+            logger.info(f"驗證推理鏈結構並排序 ({len(nodes)} 個節點)")
+            execution_order, graph, in_degree, nodes_by_id, inputs_by_id = self._build_and_sort(nodes)
 
             # 3. 執行節點
             if use_parallel:
                 results, errors, chain_timed_out = self._execute_chain_parallel(
-                    nodes=nodes,
+                    nodes_by_id=nodes_by_id,
+                    inputs_by_id=inputs_by_id,
+                    execution_order=execution_order,
+                    graph=graph,
+                    in_degree=in_degree,
                     input_data=input_data,
                     timeout=timeout,
                     chain_start=chain_start,
@@ -229,11 +367,13 @@ class ReasoningEngine:
                 )
             else:
                 results, errors, chain_timed_out = self._execute_chain_sequential(
-                    nodes=nodes,
+                    nodes_by_id=nodes_by_id,
+                    inputs_by_id=inputs_by_id,
                     input_data=input_data,
                     timeout=timeout,
                     chain_start=chain_start,
                     execution_order=execution_order,
+                    graph=graph,
                 )
             
             # 計算執行耗時
@@ -293,16 +433,17 @@ class ReasoningEngine:
 
     def _execute_chain_sequential(
         self,
-        nodes: List[Dict[str, Any]],
+        nodes_by_id: Dict[str, Dict[str, Any]],
+        inputs_by_id: Dict[str, Tuple[str, ...]],
         input_data: Optional[Dict[str, Any]],
         timeout: int,
         chain_start: float,
         execution_order: List[str],
+        graph: Dict[str, List[str]],
     ) -> Tuple[Dict[str, NodeResult], List[Dict[str, Any]], bool]:
         results: Dict[str, NodeResult] = {}
         errors: List[Dict[str, Any]] = []
         chain_timed_out = False
-        node_dict = {n["node_id"]: n for n in nodes}
 
         for node_id in execution_order:
             if self._is_chain_timed_out(chain_start, timeout):
@@ -310,12 +451,19 @@ class ReasoningEngine:
                 errors.append({"error": f"Chain execution timeout after {timeout} seconds"})
                 break
 
+            # 上游失敗的節點已記錄為 SKIPPED，不再收集輸入或重試
+            if node_id in results:
+                continue
+
             try:
-                node_config = node_dict[node_id]
+                node_config = nodes_by_id[node_id]
                 logger.info(f"執行節點: {node_id} (類型: {node_config['node_type']})")
 
-                node_inputs = self._collect_inputs(node_config, results)
-                node_result = self._execute_with_retry(node_config, node_inputs, input_data)
+                # 快取命中的節點不必收集輸入，也不經過重試／超時包裝
+                node_result = self._try_cache(node_config)
+                if node_result is None:
+                    node_inputs = self._collect_inputs(node_config, results, inputs_by_id[node_id])
+                    node_result = self._execute_with_retry(node_config, node_inputs, input_data)
                 results[node_id] = node_result
 
                 if node_result.status == NodeStatus.FAILED:
@@ -324,18 +472,24 @@ class ReasoningEngine:
                         "node_id": node_id,
                         "error": node_result.error,
                     })
+                    self._skip_descendants(node_id, graph, results)
             except Exception as e:
                 logger.exception(f"執行節點 {node_id} 時發生異常")
                 errors.append({
                     "node_id": node_id,
                     "error": str(e),
                 })
+                self._skip_descendants(node_id, graph, results)
 
         return results, errors, chain_timed_out
 
     def _execute_chain_parallel(
         self,
-        nodes: List[Dict[str, Any]],
+        nodes_by_id: Dict[str, Dict[str, Any]],
+        inputs_by_id: Dict[str, Tuple[str, ...]],
+        execution_order: List[str],
+        graph: Dict[str, List[str]],
+        in_degree: Dict[str, int],
         input_data: Optional[Dict[str, Any]],
         timeout: int,
         chain_start: float,
@@ -345,74 +499,144 @@ class ReasoningEngine:
         errors: List[Dict[str, Any]] = []
         chain_timed_out = False
 
-        normalized_nodes = self._normalize_nodes(nodes)
-        node_dict = {n["node_id"]: n for n in nodes}
-        in_degree = {n.get("node_id"): 0 for n in normalized_nodes}
-        graph = defaultdict(list)
-
-        for node in normalized_nodes:
-            node_id = node.get("node_id")
-            inputs = node.get("inputs", [])
-            for input_id in inputs:
-                graph[input_id].append(node_id)
-                in_degree[node_id] += 1
-
-        ready = deque([n_id for n_id in in_degree if in_degree[n_id] == 0])
+        # 有 session_factory 時每個節點在 worker 上開自己的 Session，共用的 db_session 不跨執行緒
+        run_node = self._execute_in_session if self.session_factory is not None else self._execute_with_retry
+
+        # _build_and_sort 回傳的是初始入度，這裡遞減前先複製
+        in_degree = dict(in_degree)
+        # 就緒佇列依關鍵路徑長度排序：下游鏈越長的節點越先送出，減少最後只剩長鏈時閒置的 worker；
+        # 同長度時依加入順序（序號）
+        bottom_level = self._critical_path_lengths(execution_order, graph)
+        sequence = 0
+        ready: List[Tuple[int, int, str]] = []
+        for n_id in execution_order:
+            if in_degree[n_id] == 0:
+                ready.append((-bottom_level[n_id], sequence, n_id))
+                sequence += 1
+        heapq.heapify(ready)
         worker_count = max_workers or min(32, (os.cpu_count() or 1) + 4)
 
-        with ThreadPoolExecutor(max_workers=worker_count) as executor:
-            while ready:
+        def release_children(node_id: str) -> None:
+            """節點完成後遞減下游入度，入度歸零的下游加入就緒佇列"""
+            nonlocal sequence
+            for neighbor in graph[node_id]:
+                in_degree[neighbor] -= 1
+                # 已標記 SKIPPED 的下游不入佇列；其後代同樣已標記，不需再遞減入度
+                if in_degree[neighbor] == 0 and neighbor not in results:
+                    heapq.heappush(ready, (-bottom_level[neighbor], sequence, neighbor))
+                    sequence += 1
+
+        # 事件驅動排程：任一節點完成就立即送出新就緒的下游節點，不等待同一批的其他節點；
+        # 執行中節點數上限為 worker 數，讓優先序在每次送出時都生效
+        # 不用 with 區塊：其結束時會等待所有執行中的節點，鏈超時便無法及時返回
+        executor = ThreadPoolExecutor(max_workers=worker_count)
+        try:
+            pending: Dict[Any, str] = {}
+            while ready or pending:
                 if self._is_chain_timed_out(chain_start, timeout):
                     chain_timed_out = True
-                    errors.append({"error": f"Chain execution timeout after {timeout} seconds"})
                     break
 
-                futures = {}
-                while ready:
-                    node_id = ready.popleft()
-                    node_config = node_dict[node_id]
-                    node_inputs = self._collect_inputs(node_config, results)
-                    futures[executor.submit(self._execute_with_retry, node_config, node_inputs, input_data)] = node_id
-
-                remaining = self._remaining_chain_time(chain_start, timeout)
-                try:
-                    for future in as_completed(futures, timeout=remaining if remaining is not None else None):
-                        node_id = futures[future]
-                        try:
-                            node_result = future.result()
-                        except Exception as exc:
-                            logger.exception(f"執行節點 {node_id} 時發生異常")
-                            node_result = NodeResult(
-                                node_id=node_id,
-                                status=NodeStatus.FAILED,
-                                output=None,
-                                error=str(exc),
-                                started_at=datetime.now(),
-                                completed_at=datetime.now(),
-                            )
-
-                        results[node_id] = node_result
-
-                        if node_result.status == NodeStatus.FAILED:
-                            logger.error(f"節點 {node_id} 執行失敗: {node_result.error}")
-                            errors.append({
-                                "node_id": node_id,
-                                "error": node_result.error,
-                            })
-
-                        for neighbor in graph.get(node_id, []):
-                            in_degree[neighbor] -= 1
-                            if in_degree[neighbor] == 0:
-                                ready.append(neighbor)
-                except FutureTimeoutError:
+                while ready and len(pending) < worker_count:
+                    node_id = heapq.heappop(ready)[2]
+                    node_config = nodes_by_id[node_id]
+                    # 快取命中在排程執行緒上直接完成並釋放下游，不佔用 worker
+                    cached = self._try_cache(node_config)
+                    if cached is not None:
+                        results[node_id] = cached
+                        release_children(node_id)
+                        continue
+                    node_inputs = self._collect_inputs(node_config, results, inputs_by_id[node_id])
+                    pending[executor.submit(run_node, node_config, node_inputs, input_data)] = node_id
+
+                if not pending:
+                    # 本輪全部由快取完成；下游已加入就緒佇列或整條鏈已完成
+                    continue
+
+                done, _ = wait(
+                    pending,
+                    timeout=self._remaining_chain_time(chain_start, timeout),
+                    return_when=FIRST_COMPLETED,
+                )
+                if not done:
                     chain_timed_out = True
-                    errors.append({"error": f"Chain execution timeout after {timeout} seconds"})
-                    for future in futures:
-                        future.cancel()
                     break
 
+                for future in done:
+                    node_id = pending.pop(future)
+                    try:
+                        node_result = future.result()
+                    except Exception as exc:
+                        logger.exception(f"執行節點 {node_id} 時發生異常")
+                        node_result = NodeResult(
+                            node_id=node_id,
+                            status=NodeStatus.FAILED,
+                            output=None,
+                            error=str(exc),
+                            started_at=datetime.now(),
+                            completed_at=datetime.now(),
+                        )
+
+                    results[node_id] = node_result
+
+                    if node_result.status == NodeStatus.FAILED:
+                        logger.error(f"節點 {node_id} 執行失敗: {node_result.error}")
+                        errors.append({
+                            "node_id": node_id,
+                            "error": node_result.error,
+                        })
+                        self._skip_descendants(node_id, graph, results)
+
+                    release_children(node_id)
+
+            if chain_timed_out:
+                errors.append({"error": f"Chain execution timeout after {timeout} seconds"})
+        finally:
+            # 超時時不等待仍在執行的節點（在背景跑完後執行緒自行結束，結果不再納入）
+            executor.shutdown(wait=not chain_timed_out, cancel_futures=True)
+
         return results, errors, chain_timed_out
 
+    def _skip_descendants(
+        self, node_id: str, graph: Dict[str, List[str]], results: Dict[str, NodeResult]
+    ) -> None:
+        """
+        將失敗節點的所有後代標記為 SKIPPED
+
+        後代的輸入必然不完整，直接記錄結果，避免再收集輸入、執行與重試等待
+        """
+        now = datetime.now()
+        error = f"上游節點 {node_id} 執行失敗，已跳過"
+        stack = list(graph[node_id])
+        while stack:
+            child = stack.pop()
+            if child in results:
+                continue
+            results[child] = NodeResult(
+                node_id=child,
+                status=NodeStatus.SKIPPED,
+                output=None,
+                error=error,
+                started_at=now,
+                completed_at=now,
+            )
+            stack.extend(graph[child])
+
+    def _critical_path_lengths(
+        self, execution_order: List[str], graph: Dict[str, List[str]]
+    ) -> Dict[str, int]:
+        """
+        各節點到葉節點的最長路徑長度（bottom level，葉節點為 1）
+
+        以拓撲順序的反向走訪，每個節點只需看一次其下游節點
+        """
+        bottom_level: Dict[str, int] = {}
+        for node_id in reversed(execution_order):
+            bottom_level[node_id] = 1 + max(
+                (bottom_level[child] for child in graph[node_id]), default=0
+            )
+        return bottom_level
+
     def _is_chain_timed_out(self, chain_start: float, timeout: int) -> bool:
         if timeout is None or timeout <= 0:
             return False
@@ -424,6 +648,63 @@ class ReasoningEngine:
         remaining = timeout - (time.monotonic() - chain_start)
         return max(0.0, remaining)
     
+    def _build_and_sort(
+        self, nodes: List[Any]
+    ) -> Tuple[List[str], Dict[str, List[str]], Dict[str, int], Dict[str, Any], Dict[str, Tuple[str, ...]]]:
+        """
+        單次走訪完成 DAG 驗證與拓撲排序（Kahn 算法）
+
+        正規化節點的同時檢查 ID 唯一並建立鄰接表與入度，再以 Kahn 算法排序；
+        排序結果少於節點數即代表存在循環依賴（不需另做遞迴 DFS）。
+
+        返回：
+          (執行順序, 鄰接表 {來源: [下游]}, 初始入度, {node_id: 原始節點},
+           {node_id: 依賴節點 ID}) — 後兩者供執行階段直接取用，不必再次正規化；
+          鄰接表包含所有節點（葉節點對應空列表）
+
+        異常：
+          - DAGValidationError: 節點為空、ID 重複、引用不存在的節點或存在循環
+        """
+        if not nodes:
+            raise DAGValidationError("推理鏈必須至少有一個節點")
+
+        nodes_by_id: Dict[str, Any] = {}
+        inputs_by_id: Dict[str, Tuple[str, ...]] = {}
+        for node in nodes:
+            node_id, inputs = self._node_id_and_inputs(node)
+            if node_id in nodes_by_id:
+                raise DAGValidationError("存在重複的節點 ID")
+            nodes_by_id[node_id] = node
+            inputs_by_id[node_id] = tuple(inputs)
+
+        # 鄰接表預先為每個節點建好空列表（含葉節點），加邊時直接索引，不必每條邊 setdefault
+        graph: Dict[str, List[str]] = {node_id: [] for node_id in nodes_by_id}
+        in_degree = dict.fromkeys(nodes_by_id, 0)
+        for node_id, inputs in inputs_by_id.items():
+            for input_id in inputs:
+                if input_id not in nodes_by_id:
+                    raise DAGValidationError(
+                        f"節點 {node_id} 引用了不存在的節點 {input_id}"
+                    )
+                graph[input_id].append(node_id)
+                in_degree[node_id] += 1
+
+        remaining = dict(in_degree)
+        queue = deque([n for n in remaining if remaining[n] == 0])
+        order = []
+        while queue:
+            node_id = queue.popleft()
+            order.append(node_id)
+            for neighbor in graph[node_id]:
+                remaining[neighbor] -= 1
+                if remaining[neighbor] == 0:
+                    queue.append(neighbor)
+
+        if len(order) != len(nodes_by_id):
+            raise DAGValidationError("推理鏈中存在循環依賴")
+
+        return order, graph, in_degree, nodes_by_id, inputs_by_id
+
     def _validate_dag(self, nodes: List[Dict[str, Any]]) -> None:
         """
         驗證節點配置是否構成有向無環圖 (DAG)
@@ -436,64 +717,7 @@ class ReasoningEngine:
         異常：
           - DAGValidationError: 驗證失敗
         """
-        if not nodes:
-            raise DAGValidationError("推理鏈必須至少有一個節點")
-        
-        normalized_nodes = self._normalize_nodes(nodes)
-
-        # 構建節點 ID 集合
-        node_ids = set(n.get("node_id") for n in normalized_nodes)
-        if len(node_ids) != len(normalized_nodes):
-            raise DAGValidationError("存在重複的節點 ID")
-        
-        # 檢查輸入參考
-        for node in normalized_nodes:
-            inputs = node.get("inputs", [])
-            for input_node_id in inputs:
-                if input_node_id not in node_ids:
-                    raise DAGValidationError(
-                        f"節點 {node.get('node_id')} 引用了不存在的節點 {input_node_id}"
-                    )
-        
-        # 檢查循環依賴
-        if self._has_cycle(normalized_nodes):
-            raise DAGValidationError("推理鏈中存在循環依賴")
-    
-    def _has_cycle(self, nodes: List[Dict[str, Any]]) -> bool:
-        """檢查是否存在循環依賴（DFS）"""
-        # 構建鄰接表
-        graph = defaultdict(list)
-        for node in nodes:
-            node_id = node.get("node_id")
-            inputs = node.get("inputs", [])
-            for input_id in inputs:
-                graph[input_id].append(node_id)  # 反向邊（依賴關係）
-        
-        # DFS 檢查循環
-        visited = set()
-        rec_stack = set()
-        
-        def dfs(node_id):
-            visited.add(node_id)
-            rec_stack.add(node_id)
-            
-            for neighbor in graph[node_id]:
-                if neighbor not in visited:
-                    if dfs(neighbor):
-                        return True
-                elif neighbor in rec_stack:
-                    return True
-            
-            rec_stack.remove(node_id)
-            return False
-        
-        for node in nodes:
-            node_id = node.get("node_id")
-            if node_id not in visited:
-                if dfs(node_id):
-                    return True
-        
-        return False
+        self._build_and_sort(nodes)
     
     def _topological_sort(self, nodes: List[Dict[str, Any]]) -> List[str]:
         """
@@ -502,51 +726,20 @@ class ReasoningEngine:
         返回：
           節點 ID 的排序列表（執行順序）
         """
-        normalized_nodes = self._normalize_nodes(nodes)
+        return self._build_and_sort(nodes)[0]
 
-        # 計算入度
-        in_degree = {n.get("node_id"): 0 for n in normalized_nodes}
-        graph = defaultdict(list)
-        
-        for node in normalized_nodes:
-            node_id = node.get("node_id")
-            inputs = node.get("inputs", [])
-            for input_id in inputs:
-                graph[input_id].append(node_id)
-                in_degree[node_id] += 1
-        
-        # 入度為 0 的節點入隊
-        queue = deque([n for n in in_degree if in_degree[n] == 0])
-        result = []
-        
-        while queue:
-            node_id = queue.popleft()
-            result.append(node_id)
-            
-            for neighbor in graph[node_id]:
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
-        
-        if len(result) != len(normalized_nodes):
-            raise DAGValidationError("拓撲排序失敗（可能存在循環或不連通的分量）")
-        
-        return result
+    def _node_id_and_inputs(self, node: Any) -> Tuple[str, List[str]]:
+        """取得節點 ID 與依賴節點 ID（支援 ReasoningNode、NodeConfig 與 dict）。"""
+        if isinstance(node, (ReasoningNode, NodeConfig)):
+            return node.node_id, self._extract_input_ids(node.inputs)
+        return node.get("node_id"), self._extract_input_ids(node.get("inputs", []))
 
     def _normalize_nodes(self, nodes: List[Any]) -> List[Dict[str, Any]]:
         """將節點轉成最小結構（node_id + inputs）。"""
         normalized = []
         for node in nodes:
-            if isinstance(node, ReasoningNode):
-                inputs = self._extract_input_ids(node.inputs)
-                normalized.append({"node_id": node.node_id, "inputs": inputs})
-            elif isinstance(node, NodeConfig):
-                inputs = self._extract_input_ids(node.inputs)
-                normalized.append({"node_id": node.node_id, "inputs": inputs})
-            else:
-                node_id = node.get("node_id")
-                inputs = self._extract_input_ids(node.get("inputs", []))
-                normalized.append({"node_id": node_id, "inputs": inputs})
+            node_id, inputs = self._node_id_and_inputs(node)
+            normalized.append({"node_id": node_id, "inputs": inputs})
         return normalized
 
     def _extract_input_ids(self, inputs: Any) -> List[str]:
@@ -568,7 +761,8 @@ class ReasoningEngine:
     def _collect_inputs(
         self,
         node_config: Dict[str, Any],
-        results: Dict[str, NodeResult]
+        results: Dict[str, NodeResult],
+        input_ids: Optional[Sequence[str]] = None,
     ) -> Dict[str, Any]:
         """
         收集節點的輸入數據
@@ -576,20 +770,20 @@ class ReasoningEngine:
         參數：
           node_config: 節點配置
           results: 之前節點的執行結果
+          input_ids: 已正規化的依賴節點 ID（execute_chain 由 _build_and_sort 帶入）；
+            未提供時從 node_config 解析
         
         返回：
           合併的輸入數據
         """
-        inputs = node_config.get("inputs", [])
-        collected = {}
-        
-        for input_node_id in inputs:
-            if input_node_id in results:
-                node_result = results[input_node_id]
-                # 使用節點 ID 作為鍵
-                collected[input_node_id] = node_result.output
-        
-        return collected
+        if input_ids is None:
+            input_ids = self._extract_input_ids(node_config.get("inputs", []))
+        # 使用節點 ID 作為鍵；尚未產生結果的上游節點略過
+        return {
+            input_node_id: results[input_node_id].output
+            for input_node_id in input_ids
+            if input_node_id in results
+        }
     
     def _execute_node(
         self,
@@ -609,23 +803,47 @@ class ReasoningEngine:
           NodeResult: 執行結果
         """
         logger.info(f"執行節點 {node_config.get('node_id')} ({node_config.get('node_type')})")
-        cache_key = node_config.get("cache_key")
-        if cache_key and cache_key in self.cache:
-            cached = self.cache[cache_key]
-            return NodeResult(
-                node_id=node_config.get("node_id"),
-                status=NodeStatus.COMPLETED,
-                output=cached,
-                error=None,
-                started_at=datetime.now(),
-                completed_at=datetime.now(),
-            )
+        cached = self._try_cache(node_config)
+        if cached is not None:
+            return cached
 
         result = self.executor.execute(node_config, inputs, global_input)
+        cache_key = self._hashable_cache_key(node_config.get("cache_key"))
         if cache_key and result.status == NodeStatus.COMPLETED:
-            self.cache[cache_key] = result.output
+            with self._cache_lock:
+                self.cache[cache_key] = result.output
         return result
 
+    def _try_cache(self, node_config: Dict[str, Any]) -> Optional[NodeResult]:
+        """cache_key 命中時直接組出 COMPLETED 結果；未設定 cache_key 或未命中返回 None"""
+        cache_key = self._hashable_cache_key(node_config.get("cache_key"))
+        if not cache_key:
+            return None
+        with self._cache_lock:
+            cached = self.cache.get(cache_key, _CACHE_MISS)
+        if cached is _CACHE_MISS:
+            return None
+        now = datetime.now()
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output=cached,
+            error=None,
+            started_at=now,
+            completed_at=now,
+        )
+
+    @staticmethod
+    def _hashable_cache_key(cache_key: Any) -> Any:
+        """cache_key 來自節點 JSON，可能是列表或字典；不可雜湊時轉為排序後的 JSON 字串"""
+        if not cache_key or isinstance(cache_key, str):
+            return cache_key
+        try:
+            hash(cache_key)
+        except TypeError:
+            return json.dumps(cache_key, sort_keys=True, default=str)
+        return cache_key
+
     def _execute_with_retry(
         self,
         node_config: Dict[str, Any],
@@ -656,13 +874,28 @@ class ReasoningEngine:
             completed_at=datetime.now(),
         )
 
+    def _execute_in_session(
+        self,
+        node_config: Dict[str, Any],
+        inputs: Dict[str, Any],
+        global_input: Optional[Dict[str, Any]] = None,
+    ) -> NodeResult:
+        """以 session_factory 建立的獨立 Session 執行節點（在並行 worker 執行緒上呼叫）"""
+        session = self.session_factory()
+        self.executor.bind_session(session)
+        try:
+            return self._execute_with_retry(node_config, inputs, global_input)
+        finally:
+            self.executor.bind_session(None)
+            session.close()
+
     def _execute_with_timeout(
         self,
         node_config: Dict[str, Any],
         inputs: Dict[str, Any],
         global_input: Optional[Dict[str, Any]] = None,
     ) -> NodeResult:
-        if self.db is not None:
+        if self.executor.current_session() is not None:
             # Avoid moving ORM sessions across threads.
             return self._execute_node(node_config, inputs, global_input)
 
@@ -678,23 +911,30 @@ class ReasoningEngine:
             return self._execute_node(node_config, inputs, global_input)
 
         start_time = datetime.now()
-        executor = ThreadPoolExecutor(max_workers=1)
+        # 超時從節點實際開始執行時起算，不含送出到開始之間的時間
+        started_at: List[float] = []
+        started = threading.Event()
+
+        def task() -> NodeResult:
+            started_at.append(time.monotonic())
+            started.set()
+            return self._execute_node(node_config, inputs, global_input)
+
+        future = self._submit_timed_task(task)
+        started.wait()
         try:
-            future = executor.submit(self._execute_node, node_config, inputs, global_input)
-            try:
-                return future.result(timeout=timeout_seconds)
-            except FutureTimeoutError:
-                future.cancel()
-                return NodeResult(
-                    node_id=node_config.get("node_id"),
-                    status=NodeStatus.FAILED,
-                    output=None,
-                    error=f"Node execution timeout after {timeout_seconds} seconds",
-                    started_at=start_time,
-                    completed_at=datetime.now(),
-                )
-        finally:
-            executor.shutdown(wait=False)
+            remaining = timeout_seconds - (time.monotonic() - started_at[0])
+            return future.result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            future.cancel()
+            return NodeResult(
+                node_id=node_config.get("node_id"),
+                status=NodeStatus.FAILED,
+                output=None,
+                error=f"Node execution timeout after {timeout_seconds} seconds",
+                started_at=start_time,
+                completed_at=datetime.now(),
+            )
 
     def _store_execution(
         self,
@@ -712,17 +952,37 @@ class ReasoningEngine:
         if errors:
             error_log = str(errors)
 
-        execution = models.ReasoningExecution(
-            chain_id=chain_id,
-            status=status,
-            input_data=input_data,
-            results=results,
-            error_log=error_log,
-            completed_at=datetime.now(),
-            execution_time_ms=response.get("execution_time_ms"),
-        )
-        self.db.add(execution)
-        self.db.commit()
+        values = {
+            "chain_id": chain_id,
+            "status": status,
+            "input_data": input_data,
+            "results": results,
+            "error_log": error_log,
+            "completed_at": datetime.now(),
+            "execution_time_ms": response.get("execution_time_ms"),
+        }
+        if not self.async_persist:
+            self.db.add(models.ReasoningExecution(**values))
+            self.db.commit()
+            return
+
+        # 呼叫端的 Session 不能跨執行緒使用，背景寫入改用同一個 bind 的獨立 Session
+        bind = self.db.get_bind()
+        self._persist_slots.acquire()
+        with self._pool_lock:
+            if self._persist_pool is None:
+                self._persist_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist")
+            future = self._persist_pool.submit(self._write_execution, bind, values)
+        future.add_done_callback(lambda _future: self._persist_slots.release())
+
+    @staticmethod
+    def _write_execution(bind: Any, values: Dict[str, Any]) -> None:
+        try:
+            with Session(bind=bind) as session:
+                session.add(models.ReasoningExecution(**values))
+                session.commit()
+        except Exception:
+            logger.exception(f"寫入推理鏈 {values.get('chain_id')} 的執行記錄失敗")
 
     # ========================================================================
     # 節點處理已移至 handlers.py 模塊
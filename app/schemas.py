@@ -227,6 +227,58 @@ class ReasoningChainHistory(BaseModel):
     success_rate: float
     avg_execution_time_ms: float
 
+# ==================== Script（腳本）====================
+class ScriptCreate(BaseModel):
+    """建立腳本請求"""
+    name: str = Field(..., description="腳本名稱")
+    content: str = Field(..., description="腳本內容")
+    category: str = Field(default="general", description="腳本分類")
+    parameters: Dict[str, Any] = Field(default_factory=dict, description="參數定義")
+    version: str = Field(default="1.0.0", description="版本號")
+
+    model_config = {
+        "extra": "forbid"
+    }
+
+class ScriptUpdate(BaseModel):
+    """更新腳本請求（未提供的欄位維持原值）"""
+    name: Optional[str] = None
+    content: Optional[str] = None
+    category: Optional[str] = None
+    parameters: Optional[Dict[str, Any]] = None
+    version: Optional[str] = None
+
+    model_config = {
+        "extra": "forbid"
+    }
+
+class ScriptSummary(BaseModel):
+    """腳本列表項目 / 建立腳本回傳"""
+    id: str
+    name: str
+    category: str
+    created_at: Optional[str] = Field(None, description="ISO 8601 時間")
+
+class ScriptDetail(ScriptSummary):
+    """腳本詳細資訊"""
+    content: str
+    version: str
+    parameters: Optional[Dict[str, Any]] = None
+    updated_at: Optional[str] = Field(None, description="ISO 8601 時間")
+
+class ScriptUpdateResult(BaseModel):
+    """更新腳本回傳"""
+    id: str
+    name: str
+    updated_at: Optional[str] = Field(None, description="ISO 8601 時間")
+
+class ScriptExecutionStarted(BaseModel):
+    """執行腳本回傳"""
+    execution_id: str
+    script_id: str
+    status: str
+    started_at: Optional[str] = Field(None, description="ISO 8601 時間")
+
 # ==================== File Classification（檔案自動分類）====================
 class ClassificationResult(BaseModel):
     """檔案分類結果"""
@@ -60,7 +60,7 @@ except ImportError:
         return calculated_hash == hash_value
 
 
-from fastapi import Header, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from pydantic import BaseModel
 
 # JWT 配置
@@ -339,3 +339,25 @@ def get_current_user_optional(
 def is_offline_user(current_user: Dict[str, Any]) -> bool:
     """檢查是否為離線用戶"""
     return current_user.get("is_offline", False)
+
+
+def require_online_user(
+    current_user: Dict[str, Any] = Depends(get_current_user_optional),
+) -> Dict[str, Any]:
+    """
+    依賴注入：要求非離線用戶（寫入操作專用）
+
+    FastAPI 會在同一請求內快取依賴結果，因此多個依賴共用同一個
+    get_current_user_optional 時只會解析一次；離線用戶在進入路由前即被拒絕。
+
+    用法：
+        @app.post("/tags/")
+        def create_tag(current_user = Depends(require_online_user)):
+            ...
+    """
+    if is_offline_user(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="離線模式下不允許執行寫入操作。請登錄後執行此操作。",
+        )
+    return current_user
@@ -20,25 +20,46 @@ class AnalysisServiceError(Exception):
     pass
 
 
+def _serialize_specs() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": spec.id,
+            "name": spec.name,
+            "version": spec.version,
+            "description": spec.description,
+            "input_types": spec.input_types,
+            "parameters": [p.__dict__ for p in spec.parameters],
+            "outputs": spec.outputs,
+        }
+        for spec in list_specs()
+    ]
+
+
+class AnalysisToolRegistry:
+    """Snapshot of the registered tool specs, built once and shared across requests."""
+
+    def __init__(self) -> None:
+        self._tools = _serialize_specs()
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        return list(self._tools)
+
+
 class AnalysisService:
-    def __init__(self, db: Session, storage: Optional[LocalStorage] = None):
+    def __init__(
+        self,
+        db: Session,
+        storage: Optional[LocalStorage] = None,
+        registry: Optional[AnalysisToolRegistry] = None,
+    ):
         self.db = db
         self.storage = storage or LocalStorage()
+        self.registry = registry
 
     def list_tools(self) -> List[Dict[str, Any]]:
-        specs = list_specs()
-        return [
-            {
-                "id": spec.id,
-                "name": spec.name,
-                "version": spec.version,
-                "description": spec.description,
-                "input_types": spec.input_types,
-                "parameters": [p.__dict__ for p in spec.parameters],
-                "outputs": spec.outputs,
-            }
-            for spec in specs
-        ]
+        if self.registry is not None:
+            return self.registry.list_tools()
+        return _serialize_specs()
 
     def run_tool(
         self,
@@ -28,7 +28,8 @@ from __future__ import annotations
 import re
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
 import logging
 
@@ -84,9 +85,16 @@ class FileClassificationService:
         r"(\d{4})(\d{2})(\d{2})",            # YYYYMMDD 連續
     ]
     
+    # 依檔名快取分類結果的筆數上限
+    CLASSIFY_CACHE_SIZE = 4096
+
     def __init__(self):
         """初始化分類服務"""
         self.logger = logging.getLogger(__name__)
+        # 分類僅取決於檔名（純函式），批次中重複的檔名不必重新解析
+        self._classify_cached = lru_cache(maxsize=self.CLASSIFY_CACHE_SIZE)(
+            self._classify_filename
+        )
     
     def classify_file(self, filename: str, content: Optional[bytes] = None) -> ClassificationResult:
         """
@@ -99,6 +107,21 @@ class FileClassificationService:
         Returns:
             ClassificationResult: 分類結果
         """
+        # 如果有內容，可以進一步分析（未來擴展）
+        if content:
+            # TODO: 分析檔案內容進行更精確的分類
+            return self._classify_filename(filename)
+
+        cached = self._classify_cached(filename)
+        # 回傳副本，避免呼叫端修改到快取中的標籤與元數據
+        return replace(
+            cached,
+            suggested_tags=list(cached.suggested_tags),
+            metadata=dict(cached.metadata),
+        )
+
+    def _classify_filename(self, filename: str) -> ClassificationResult:
+        """依檔名進行分類（不使用快取）"""
         path = Path(filename)
         extension = path.suffix.lower()
         basename = path.stem
@@ -120,16 +143,11 @@ class FileClassificationService:
             file_type = file_type_by_ext
             confidence = confidence_ext
         
-        # 5. 如果有內容，可以進一步分析（未來擴展）
-        if content:
-            # TODO: 分析檔案內容進行更精確的分類
-            pass
-        
-        # 6. 生成建議標籤
+        # 5. 生成建議標籤
         suggested_tags = self._generate_tags(file_type, metadata, basename)
         
         self.logger.info(
-            f"檔案分類完成: {filename} -> {file_type} (confidence: {confidence:.2f})"
+            "檔案分類完成: %s -> %s (confidence: %.2f)", filename, file_type, confidence
         )
         
         return ClassificationResult(
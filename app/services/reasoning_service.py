@@ -4,13 +4,15 @@ Reasoning Chain Service
 Handles CRUD operations and business logic for reasoning chains and executions.
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta, timezone
+import io
+import json
 import logging
 
-from sqlalchemy import select, desc, and_
-from sqlalchemy.orm import Session
+from sqlalchemy import select, desc, and_, case, insert, update
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models import (
@@ -50,11 +52,31 @@ class InvalidChainError(ReasoningServiceError):
 class ReasoningService:
     """Service for managing reasoning chains and executions"""
     
-    def __init__(self, db: Session, storage: Optional[LocalStorage] = None):
-        """Initialize service with database session"""
+    def __init__(
+        self,
+        db: Session,
+        storage: Optional[LocalStorage] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        """
+        Initialize service with database session
+        
+        Chains run in the engine's parallel mode. Each worker thread opens its
+        own session from session_factory, which defaults to a sessionmaker
+        bound to the engine of db, so the request session is never shared
+        across threads.
+        """
         self.db = db
         self.storage = storage
-        self.engine = ReasoningEngine(db_session=db, storage=storage, persist_execution=False)
+        if session_factory is None:
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+        self.engine = ReasoningEngine(
+            db_session=db,
+            storage=storage,
+            persist_execution=False,
+            enable_parallel=True,
+            session_factory=session_factory,
+        )
         self.cache_ttl = 3600  # 1 hour default cache TTL
         self.cache = CacheManager()
     
@@ -286,89 +308,357 @@ class ReasoningService:
           ReasoningServiceError: If execution fails
         """
         try:
-            # Get the chain
             chain = self.get_chain(chain_id)
             if not chain:
                 raise ChainNotFoundError(f"Chain not found: {chain_id}")
 
-            normalized_input = self._normalize_json_value(input_data) or {}
-            
-            # Create execution record
-            execution = ReasoningExecution(
-                id=uuid4(),
-                chain_id=chain_id,
+            execution = self._create_execution(
+                chain_id,
+                input_data,
+                user_id,
+                model_name=model_name,
+                tool_name=tool_name,
                 status="running",
-                user_id=user_id,
+            )
+            return self._run_execution(execution, chain, timeout)
+        
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.error(f"Database error executing chain: {e}")
+            raise ReasoningServiceError(f"Failed to execute chain: {e}")
+
+    def enqueue_execution(
+        self,
+        chain_id: UUID,
+        input_data: Dict[str, Any],
+        user_id: int,
+        model_name: Optional[str] = None,
+        tool_name: Optional[str] = None,
+    ) -> ReasoningExecution:
+        """
+        Record a pending execution without running it
+        
+        The caller is expected to hand the returned execution id to
+        run_execution (typically from a background task) and let clients
+        poll the execution for its final status.
+        
+        Raises:
+          ChainNotFoundError: If chain not found
+          ReasoningServiceError: If the record cannot be stored
+        """
+        try:
+            chain = self.get_chain(chain_id)
+            if not chain:
+                raise ChainNotFoundError(f"Chain not found: {chain_id}")
+
+            return self._create_execution(
+                chain_id,
+                input_data,
+                user_id,
                 model_name=model_name,
                 tool_name=tool_name,
-                input_data=normalized_input,
-                results={},
-                error_log=None,
-                started_at=datetime.now(timezone.utc),
-                completed_at=None,
-                execution_time_ms=0,
+                status="pending",
             )
-            
-            self.db.add(execution)
-            self.db.commit()
-            
-            try:
-                # Parse chain nodes
-                nodes = self._normalize_nodes(chain.nodes)
-                
-                # Execute chain using reasoning engine
-                result = self.engine.execute_chain(
-                    nodes=nodes,
-                    input_data=normalized_input,
-                    timeout=timeout,
-                )
-                
-                # Update execution record
-                execution.status = result.get("status", "completed")
-                execution.results = self._normalize_json_value(result.get("results", {}))
-                errors = result.get("errors")
-                if errors:
-                    execution.error_log = self._stringify_errors(errors)
-                execution.completed_at = datetime.now(timezone.utc)
-                
-                # Calculate execution time
-                if execution.completed_at and execution.started_at:
-                    execution.execution_time_ms = self._safe_duration_ms(
-                        execution.started_at,
-                        execution.completed_at,
-                    )
-                
-                logger.info(
-                    f"Chain execution completed: {execution.id} "
-                    f"(chain={chain_id}, status={execution.status})"
+
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.error(f"Database error queueing chain execution: {e}")
+            raise ReasoningServiceError(f"Failed to queue chain execution: {e}")
+
+    def run_execution(self, execution_id: UUID, timeout: int = 300) -> ReasoningExecution:
+        """
+        Run a previously enqueued execution to completion
+        
+        Moves the execution through running -> completed/failed. Only a
+        pending execution is claimed (with a conditional UPDATE); a repeated
+        or late task finds it already claimed and returns it unchanged.
+        
+        Raises:
+          ExecutionNotFoundError: If execution not found
+          ChainNotFoundError: If the execution's chain no longer exists
+          ReasoningServiceError: If execution fails
+        """
+        try:
+            execution = self.db.get(ReasoningExecution, execution_id)
+            if not execution:
+                raise ExecutionNotFoundError(f"Execution not found: {execution_id}")
+            if execution.status != "pending":
+                logger.warning(
+                    f"Execution {execution_id} is already {execution.status}; not running it again"
                 )
-            
-            except Exception as e:
-                # Update execution with error
+                return execution
+
+            chain = self.get_chain(execution.chain_id)
+            if not chain:
                 execution.status = "failed"
-                execution.error_log = self._stringify_errors({"error": str(e)})
+                execution.error_log = self._stringify_errors(
+                    {"error": f"Chain not found: {execution.chain_id}"}
+                )
                 execution.completed_at = datetime.now(timezone.utc)
-                
-                if execution.completed_at and execution.started_at:
-                    execution.execution_time_ms = self._safe_duration_ms(
-                        execution.started_at,
-                        execution.completed_at,
+                self.db.commit()
+                self._invalidate_execution_cache(execution.chain_id)
+                raise ChainNotFoundError(f"Chain not found: {execution.chain_id}")
+
+            claimed = self.db.execute(
+                update(ReasoningExecution)
+                .where(
+                    ReasoningExecution.id == execution_id,
+                    ReasoningExecution.status == "pending",
+                )
+                .values(status="running", started_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.db.commit()
+            if not claimed:
+                logger.warning(f"Execution {execution_id} was claimed by another task")
+                return execution
+            self._invalidate_execution_cache(execution.chain_id)
+
+            return self._run_execution(execution, chain, timeout)
+
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.error(f"Database error running execution: {e}")
+            raise ReasoningServiceError(f"Failed to run execution: {e}")
+
+    def fail_stale_executions(self, max_age_seconds: int = 300) -> List[UUID]:
+        """
+        Mark executions stuck in pending/running as failed
+        
+        Background runs that die with their worker never reach a terminal
+        status. Executions started more than max_age_seconds ago are
+        finalized with a single UPDATE; the per-row execution_time_ms is
+        supplied through a CASE on the execution id.
+        
+        Returns:
+          IDs of the executions that were marked failed
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=max_age_seconds)
+        unfinished = ReasoningExecution.status.in_(("pending", "running"))
+        try:
+            rows = self.db.execute(
+                select(ReasoningExecution.id, ReasoningExecution.started_at).where(
+                    unfinished,
+                    ReasoningExecution.started_at < cutoff,
+                )
+            ).all()
+            if not rows:
+                return []
+
+            durations = {
+                row.id: self._safe_duration_ms(row.started_at, now) for row in rows
+            }
+            self.db.execute(
+                update(ReasoningExecution)
+                .where(ReasoningExecution.id.in_(list(durations)), unfinished)
+                .values(
+                    status="failed",
+                    error_log=self._stringify_errors(
+                        {"error": "Execution interrupted before completion"}
+                    ),
+                    completed_at=now,
+                    execution_time_ms=case(durations, value=ReasoningExecution.id),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            self.cache.delete_pattern("execution:*")
+            self.cache.delete_pattern("executions:*")
+
+            logger.info(f"Marked {len(durations)} stale executions as failed")
+            return list(durations)
+
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.error(f"Database error failing stale executions: {e}")
+            raise ReasoningServiceError(f"Failed to finalize stale executions: {e}")
+
+    EXECUTION_LOG_COLUMNS = (
+        "id",
+        "chain_id",
+        "user_id",
+        "status",
+        "input_data",
+        "results",
+        "error_log",
+        "started_at",
+        "completed_at",
+        "execution_time_ms",
+    )
+
+    def bulk_log_executions(
+        self, records: List[Dict[str, Any]], chunk_size: int = 5000
+    ) -> int:
+        """
+        Append many execution records in batches
+        
+        Rows are validated here instead of through the ORM validators. On
+        PostgreSQL with psycopg2 each chunk is streamed with COPY FROM STDIN,
+        which skips per-row parse/plan; other databases use one executemany
+        INSERT per chunk.
+        
+        Returns:
+          Number of rows written
+        """
+        allowed_status = {"pending", "running", "completed", "failed"}
+        rows = []
+        for record in records:
+            status = record.get("status", "completed")
+            if status not in allowed_status:
+                raise ReasoningServiceError(f"Invalid execution status: {status}")
+            row = {column: record.get(column) for column in self.EXECUTION_LOG_COLUMNS}
+            row["id"] = row["id"] or uuid4()
+            row["status"] = status
+            row["input_data"] = self._normalize_json_value(row["input_data"])
+            row["results"] = self._normalize_json_value(row["results"])
+            row["started_at"] = row["started_at"] or datetime.now(timezone.utc)
+            rows.append(row)
+
+        dialect = self.db.get_bind().dialect
+        use_copy = dialect.driver == "psycopg2"
+        # COPY runs on the raw DBAPI cursor, so its failures surface as driver
+        # errors (psycopg2.Error) rather than SQLAlchemyError
+        db_errors = (SQLAlchemyError, dialect.loaded_dbapi.Error) if use_copy else (SQLAlchemyError,)
+        try:
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                if use_copy:
+                    self._copy_executions(
+                        self.db.connection().connection.dbapi_connection, chunk
                     )
-                
-                logger.error(f"Chain execution failed: {execution.id} - {e}")
-            
+                else:
+                    self.db.execute(insert(ReasoningExecution), chunk)
             self.db.commit()
-            self.db.refresh(execution)
-            
-            # Invalidate execution cache
+        except db_errors as e:
+            self.db.rollback()
+            logger.error("Database error logging executions: %s", e)
+            raise ReasoningServiceError(f"Failed to log executions: {e}")
+
+        for chain_id in {row["chain_id"] for row in rows}:
             self._invalidate_execution_cache(chain_id)
+        return len(rows)
+
+    def _copy_executions(self, dbapi_connection: Any, rows: List[Dict[str, Any]]) -> None:
+        """Stream rows into reasoning_executions with COPY ... FROM STDIN (CSV)
+
+        In CSV format an unquoted empty field is NULL, so every non-NULL value
+        is quoted; an empty error_log stays an empty string.
+        """
+        buffer = io.StringIO()
+        for row in rows:
+            fields = []
+            for column in self.EXECUTION_LOG_COLUMNS:
+                value = row[column]
+                if value is None:
+                    fields.append("")
+                    continue
+                if column in ("input_data", "results"):
+                    value = json.dumps(value)
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                else:
+                    value = str(value)
+                fields.append('"' + value.replace('"', '""') + '"')
+            buffer.write(",".join(fields) + "\n")
+        buffer.seek(0)
+
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY reasoning_executions ({', '.join(self.EXECUTION_LOG_COLUMNS)}) "
+                "FROM STDIN WITH CSV",
+                buffer,
+            )
+
+    def _create_execution(
+        self,
+        chain_id: UUID,
+        input_data: Dict[str, Any],
+        user_id: int,
+        model_name: Optional[str],
+        tool_name: Optional[str],
+        status: str,
+    ) -> ReasoningExecution:
+        normalized_input = self._normalize_json_value(input_data) or {}
+
+        execution = ReasoningExecution(
+            id=uuid4(),
+            chain_id=chain_id,
+            status=status,
+            user_id=user_id,
+            model_name=model_name,
+            tool_name=tool_name,
+            input_data=normalized_input,
+            results={},
+            error_log=None,
+            started_at=datetime.now(timezone.utc),
+            completed_at=None,
+            execution_time_ms=0,
+        )
+
+        self.db.add(execution)
+        self.db.commit()
+        return execution
+
+    def _run_execution(
+        self,
+        execution: ReasoningExecution,
+        chain: ReasoningChain,
+        timeout: int,
+    ) -> ReasoningExecution:
+        chain_id = execution.chain_id
+        try:
+            # Parse chain nodes
+            nodes = self._normalize_nodes(chain.nodes)
+            
+            # Execute chain using reasoning engine
+            result = self.engine.execute_chain(
+                nodes=nodes,
+                input_data=self._normalize_json_value(execution.input_data) or {},
+                timeout=timeout,
+            )
             
-            return execution
+            # Update execution record
+            execution.status = result.get("status", "completed")
+            execution.results = self._normalize_json_value(result.get("results", {}))
+            errors = result.get("errors")
+            if errors:
+                execution.error_log = self._stringify_errors(errors)
+            execution.completed_at = datetime.now(timezone.utc)
+            
+            # Calculate execution time
+            if execution.completed_at and execution.started_at:
+                execution.execution_time_ms = self._safe_duration_ms(
+                    execution.started_at,
+                    execution.completed_at,
+                )
+            
+            logger.info(
+                f"Chain execution completed: {execution.id} "
+                f"(chain={chain_id}, status={execution.status})"
+            )
         
-        except SQLAlchemyError as e:
-            self.db.rollback()
-            logger.error(f"Database error executing chain: {e}")
-            raise ReasoningServiceError(f"Failed to execute chain: {e}")
+        except Exception as e:
+            # Update execution with error
+            execution.status = "failed"
+            execution.error_log = self._stringify_errors({"error": str(e)})
+            execution.completed_at = datetime.now(timezone.utc)
+            
+            if execution.completed_at and execution.started_at:
+                execution.execution_time_ms = self._safe_duration_ms(
+                    execution.started_at,
+                    execution.completed_at,
+                )
+            
+            logger.error(f"Chain execution failed: {execution.id} - {e}")
+        
+        self.db.commit()
+        self.db.refresh(execution)
+        
+        # Invalidate execution cache
+        self._invalidate_execution_cache(chain_id)
+        
+        return execution
 
     def _safe_duration_ms(self, start_time: datetime, end_time: datetime) -> int:
         if start_time is None or end_time is None:
@@ -465,7 +755,7 @@ class ReasoningService:
             if filters:
                 query = query.where(and_(*filters))
             
-            query = query.order_by(desc(ReasoningExecution.started_at))
+            query = query.order_by(desc(ReasoningExecution.started_at), desc(ReasoningExecution.id))
             query = query.offset(skip).limit(limit)
             
             executions = self.db.execute(query).scalars().all()
@@ -547,12 +837,6 @@ class ReasoningService:
         if not nodes:
             raise InvalidChainError("Chain must have at least one node")
         
-        # Check unique node IDs
-        node_ids = [n.get("node_id") for n in nodes]
-        if len(node_ids) != len(set(node_ids)):
-            raise InvalidChainError("Duplicate node IDs found")
-        
-        # Check valid node types
         valid_types = {
             "data_input",
             "transform",
@@ -560,7 +844,14 @@ class ReasoningService:
             "condition",
             "output",
         }
+        # Check unique node IDs and valid node types in a single pass
+        seen_ids = set()
         for node in nodes:
+            node_id = node.get("node_id")
+            if node_id in seen_ids:
+                raise InvalidChainError("Duplicate node IDs found")
+            seen_ids.add(node_id)
+
             node_type = node.get("node_type")
             normalized_type = node_type.value if hasattr(node_type, "value") else str(node_type).lower()
             if normalized_type not in valid_types:
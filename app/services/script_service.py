@@ -11,7 +11,7 @@ import json
 import logging
 
 from sqlalchemy import select, desc, and_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models import Script, ScriptExecution, User
@@ -109,6 +109,10 @@ class ScriptService:
             
             return script
         
+        except ValueError as e:
+            # Model validators (e.g. Script.name) reject bad input with ValueError
+            self.db.rollback()
+            raise InvalidScriptError(str(e))
         except SQLAlchemyError as e:
             self.db.rollback()
             logger.error(f"Database error creating script: {e}")
@@ -144,7 +148,7 @@ class ScriptService:
             stmt = (
                 select(Script)
                 .where(Script.name == name)
-                .order_by(desc(Script.created_at))
+                .order_by(desc(Script.created_at), desc(Script.id))
                 .limit(1)
             )
             script = self.db.execute(stmt).scalar_one_or_none()
@@ -172,13 +176,15 @@ class ScriptService:
           List of Script objects
         """
         try:
-            query = select(Script)
+            # List views never show the script body or parameter schema; defer
+            # them so large Text/JSON values are only read if accessed
+            query = select(Script).options(defer(Script.content), defer(Script.parameters))
             
             if category:
                 query = query.where(Script.category == category)
             
             # Group by name and get latest version of each
-            query = query.order_by(desc(Script.created_at))
+            query = query.order_by(desc(Script.created_at), desc(Script.id))
             query = query.offset(skip).limit(limit)
             
             scripts = self.db.execute(query).scalars().all()
@@ -202,7 +208,7 @@ class ScriptService:
             stmt = (
                 select(Script)
                 .where(Script.name == name)
-                .order_by(desc(Script.created_at))
+                .order_by(desc(Script.created_at), desc(Script.id))
             )
             scripts = self.db.execute(stmt).scalars().all()
             return scripts
@@ -271,6 +277,9 @@ class ScriptService:
             
             return script
         
+        except ValueError as e:
+            self.db.rollback()
+            raise InvalidScriptError(str(e))
         except SQLAlchemyError as e:
             self.db.rollback()
             logger.error(f"Database error updating script: {e}")
@@ -457,7 +466,7 @@ class ScriptService:
             if filters:
                 query = query.where(and_(*filters))
             
-            query = query.order_by(desc(ScriptExecution.started_at))
+            query = query.order_by(desc(ScriptExecution.started_at), desc(ScriptExecution.id))
             query = query.offset(skip).limit(limit)
             
             executions = self.db.execute(query).scalars().all()
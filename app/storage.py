@@ -1,10 +1,40 @@
+import asyncio
 import os
 import hashlib
 import json
 import re
+import shutil
+import threading
+import time
 import uuid
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
 from fastapi import UploadFile
+from starlette.datastructures import UploadFile as StarletteUploadFile
+
+
+# 檔案系統 IO（stat/scandir 等）共用的執行緒池；這類呼叫會釋放 GIL，可用執行緒隱藏延遲
+IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+# 單層目錄數達到此值才改用執行緒池並行掃描
+PARALLEL_SCAN_THRESHOLD = 8
+# 目錄 mtime 距掃描開始不到此時間時不快取掃描結果：mtime 精度較粗的檔案系統（FAT 為 2 秒）上，
+# 同一個時間刻度內新增的檔案不會改變 mtime，快取會漏掉它（同 Git 的 racy-clean 處理）
+SCAN_CACHE_MTIME_SLACK_NS = int(os.getenv("STORAGE_SCAN_MTIME_SLACK_MS", "2000")) * 1_000_000
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """取得（必要時建立）共用的檔案系統 IO 執行緒池"""
+    global _io_executor
+    if _io_executor is None:
+        with _io_executor_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=IO_WORKERS, thread_name_prefix="storage-io"
+                )
+    return _io_executor
 
 
 class LocalStorage:
@@ -31,6 +61,8 @@ class LocalStorage:
         self.base_dir = base_dir or os.getenv("STORAGE_PATH", "data/managed")
         # 確保目錄存在（不存在則自動建立）
         os.makedirs(self.base_dir, exist_ok=True)
+        # 目錄掃描快取：目錄路徑 -> (mtime_ns, 檔案路徑, 子目錄路徑)
+        self._scan_cache: Dict[str, Tuple[int, List[str], List[str]]] = {}
 
     async def save(self, file_or_hash, file_obj=None):
         """
@@ -50,16 +82,116 @@ class LocalStorage:
         else:
             # 雙參數模式: save(file_hash, file_obj)
             file_hash = file_or_hash
-        # 儲存檔案
-        filename = f"{file_hash}.bin"
-        file_path = os.path.join(self.base_dir, filename)
+        # 儲存檔案（依 hash 前綴分層目錄）
+        file_path = self.path_for_hash(file_hash)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
         # 確保檔案指針在開頭
         await file_obj.seek(0)
-        with open(file_path, "wb") as f:
-            f.write(await file_obj.read())
+        if isinstance(file_obj, StarletteUploadFile):
+            # 直接在工作執行緒串流複製暫存檔，不整份讀入記憶體也不阻塞事件迴圈
+            await asyncio.to_thread(_copy_stream, file_obj.file, file_path)
+        else:
+            content = await file_obj.read()
+            await asyncio.to_thread(_write_bytes, file_path, content)
         return file_path
 
+    def path_for_hash(self, file_hash: str) -> str:
+        """
+        依 hash 計算分層儲存路徑（base_dir/ab/cd/abcd....bin）
+
+        仿照 Git 物件庫以前兩層 hash 前綴分散檔案，
+        避免單一目錄項目過多導致查找與列舉變慢
+        """
+        return os.path.join(
+            self.base_dir, file_hash[:2], file_hash[2:4], f"{file_hash}.bin"
+        )
+
+    def relocate(self, key: str, file_hash: str) -> str:
+        """
+        在分層路徑建立舊版平鋪路徑檔案的副本（同檔案系統用硬連結，否則複製）
+
+        原檔保留：呼叫端先把新路徑寫入資料庫並 commit，再刪除原檔，
+        中途中斷時資料庫指向的檔案都仍存在。目標已存在時沿用。
+
+        Args:
+            key: 目前的檔案路徑
+            file_hash: 檔案 SHA-256 雜湊值
+
+        Returns:
+            str: 分層路徑（已在分層路徑或檔案不存在時回傳原值）
+        """
+        target = self.path_for_hash(file_hash)
+        if key == target or not os.path.exists(key):
+            return key
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(key, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(key, target)
+        return target
+
+    def scan_existing(self) -> Set[str]:
+        """
+        以 os.scandir 掃描整個儲存目錄（含分層子目錄）
+
+        scandir 的目錄項目自帶檔案類型，不需逐檔 stat；
+        每個目錄的掃描結果以其 mtime 為鍵快取，目錄內容未變動時
+        只需一次 stat 即可重用，適合頻繁輪詢的維護作業；
+        mtime 距今不到 SCAN_CACHE_MTIME_SLACK_NS 的目錄不快取，每次重新掃描
+
+        Returns:
+            Set[str]: 所有檔案的絕對路徑集合
+        """
+        existing: Set[str] = set()
+        # 逐層掃描；同一層的目錄數量較多時交給 IO 執行緒池並行 stat/scandir
+        level = [os.path.abspath(self.base_dir)]
+        while level:
+            if len(level) >= PARALLEL_SCAN_THRESHOLD:
+                results = list(get_io_executor().map(self._scan_directory, level))
+            else:
+                results = [self._scan_directory(directory) for directory in level]
+            level = []
+            for cached in results:
+                if cached is None:
+                    continue
+                existing.update(cached[1])
+                level.extend(cached[2])
+        return existing
+
+    def _scan_directory(self, directory: str) -> Optional[Tuple[int, List[str], List[str]]]:
+        """掃描單一目錄（mtime 未變時重用快取），目錄不存在時回傳 None"""
+        scan_started_ns = time.time_ns()
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            self._scan_cache.pop(directory, None)
+            return None
+
+        cached = self._scan_cache.get(directory)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached
+
+        files, subdirs = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+        except FileNotFoundError:
+            return None
+        cached = (mtime_ns, files, subdirs)
+        if scan_started_ns - mtime_ns >= SCAN_CACHE_MTIME_SLACK_NS:
+            self._scan_cache[directory] = cached
+        else:
+            # 目錄剛變動過，之後同一刻度內的變動可能不會反映在 mtime 上
+            self._scan_cache.pop(directory, None)
+        return cached
+
     # 兼容性方法
     async def save_with_hash(self, file_obj, file_hash):
         """使用 hash 儲存檔案 (兼容性方法)"""
@@ -89,6 +221,22 @@ class LocalStorage:
         if os.path.exists(key):
             os.remove(key)
 
+    def delete_many(self, keys: List[str]) -> Dict[str, OSError]:
+        """
+        在共用 IO 執行緒池中並行刪除多個本機檔案
+        
+        Args:
+            keys: 檔案完整路徑列表
+            
+        Returns:
+            Dict[str, OSError]: 刪除失敗的路徑與錯誤（檔案不存在不視為失敗）
+        """
+        keys = [key for key in dict.fromkeys(keys) if key]
+        if not keys:
+            return {}
+        results = get_io_executor().map(_remove_file, keys)
+        return {key: error for key, error in zip(keys, results) if error is not None}
+
 
 class Hdf5Storage:
     """
@@ -135,7 +283,44 @@ class Hdf5Storage:
             return json.dumps(value, ensure_ascii=True)
         return value
 
+def _copy_stream(stream, file_path: str) -> None:
+    """將同步檔案物件串流寫入指定路徑"""
+    stream.seek(0)
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(stream, f, HASH_CHUNK_SIZE)
+    stream.seek(0)
+
+
+def _write_bytes(file_path: str, content: bytes) -> None:
+    with open(file_path, "wb") as f:
+        f.write(content)
+
+
+def _remove_file(file_path: str) -> Optional[OSError]:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        return e
+    return None
+
+
 # --- 工具函式：計算檔案 Hash (指紋) ---
+# 每次讀取 64 KB，記憶體用量固定且減少讀取呼叫次數
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def _hash_stream(stream) -> str:
+    """以固定大小分塊計算同步檔案物件的 SHA-256，完成後將指針歸零"""
+    sha256_hash = hashlib.sha256()
+    stream.seek(0)
+    while chunk := stream.read(HASH_CHUNK_SIZE):
+        sha256_hash.update(chunk)
+    stream.seek(0)
+    return sha256_hash.hexdigest()
+
+
 async def calculate_file_hash(file: UploadFile) -> str:
     """
     計算檔案的 SHA-256 雜湊值（檔案指紋）
@@ -154,10 +339,15 @@ async def calculate_file_hash(file: UploadFile) -> str:
     Note:
         函式會自動將檔案讀取指針重置到開頭，不影響後續讀取
     """
+    # 一般上傳檔案：整段讀取與雜湊在工作執行緒完成（hashlib 會釋放 GIL），
+    # 多個檔案以 asyncio.gather 並行時可真正同時計算
+    if isinstance(file, StarletteUploadFile):
+        return await asyncio.to_thread(_hash_stream, file.file)
+
     sha256_hash = hashlib.sha256()
     
     # 分塊讀取檔案內容計算 hash（避免大檔案記憶體溢位）
-    while chunk := await file.read(4096):
+    while chunk := await file.read(HASH_CHUNK_SIZE):
         sha256_hash.update(chunk)
     
     # 計算完後，必須把讀取指針歸零，不然之後存檔會讀不到內容
@@ -85,3 +85,50 @@ def test_cache_manager_exceptions(monkeypatch):
     assert cache.CacheManager.set("k", {"x": 1}) is False
     assert cache.CacheManager.delete("k") is False
     assert cache.CacheManager.delete_pattern("*") == 0
+
+
+def test_cached_response_hits_and_serves_stale(monkeypatch):
+    class FakeRedis:
+        def __init__(self):
+            self.store = {}
+
+        def get(self, key):
+            return self.store.get(key)
+
+        def setex(self, key, ttl, value):
+            self.store[key] = value
+
+    monkeypatch.setattr(cache, "_redis_client", FakeRedis())
+    monkeypatch.setattr(cache, "REDIS_AVAILABLE", True)
+
+    calls = []
+
+    @cache.cached_response(ttl=30, stale_ttl=60)
+    def endpoint(limit: int = 10):
+        calls.append(limit)
+        if len(calls) > 2:
+            raise RuntimeError("db down")
+        return {"limit": limit}
+
+    first = endpoint(limit=5)
+    second = endpoint(limit=5)
+    assert json.loads(first.body) == {"limit": 5}
+    assert second.body == first.body
+    assert calls == [5]
+
+    endpoint(limit=7)
+    assert calls == [5, 7]
+
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: now + 45)
+    stale = endpoint(limit=5)
+    assert json.loads(stale.body) == {"limit": 5}
+    assert calls == [5, 7, 5]
+
+    monkeypatch.setattr(cache.time, "time", lambda: now + 120)
+    try:
+        endpoint(limit=5)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expired stale entry should not be served")
@@ -128,6 +128,25 @@ class TestFileClassificationService:
         assert stats["unknown_count"] == 1
         assert stats["unknown_rate"] == 0.25
     
+    def test_classify_file_caches_by_filename(self, service, monkeypatch):
+        """測試相同檔名只解析一次，且回傳結果互不影響"""
+        calls = []
+        original = service._extract_metadata
+
+        def counting_extract(filename):
+            calls.append(filename)
+            return original(filename)
+
+        monkeypatch.setattr(service, "_extract_metadata", counting_extract)
+        first = service.classify_file("Cache1_XRD_20250104.xy")
+        first.suggested_tags.append("mutated")
+        first.metadata["sample"] = "mutated"
+        second = service.classify_file("Cache1_XRD_20250104.xy")
+
+        assert calls == ["Cache1_XRD_20250104.xy"]
+        assert "mutated" not in second.suggested_tags
+        assert second.metadata["sample"] == "Cache1"
+
     def test_supported_types(self, service):
         """測試獲取支援的檔案類型"""
         supported = service.get_supported_types()
@@ -6,7 +6,8 @@ import json
 import os
 import fnmatch
 import tempfile
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 
 import pytest
 from sqlalchemy import create_engine
@@ -28,7 +29,11 @@ import app.init_db as init_db
 import app.services.analysis_service as analysis_service
 from app.integrations.base import ToolAdapter, ToolSpec, ToolParameter, ToolResult
 from app.services.script_service import ScriptService, InvalidScriptError
-from app.services.reasoning_service import ReasoningService, InvalidChainError
+from app.services.reasoning_service import (
+    ExecutionNotFoundError,
+    InvalidChainError,
+    ReasoningService,
+)
 from app.models import ReasoningChain, ReasoningExecution
 from app.storage import LocalStorage
 
@@ -266,6 +271,32 @@ def test_analysis_service_list_and_run_tool(test_db, monkeypatch):
         assert result["stored"]["annotation_ids"]
 
 
+@pytest.mark.unit
+def test_analysis_tool_registry_snapshots_specs(monkeypatch):
+    calls = {"count": 0}
+    spec = ToolSpec(
+        id="snap",
+        name="Snapshot",
+        version="1.0",
+        description="",
+        input_types=[],
+        parameters=[],
+        outputs=[],
+    )
+
+    def fake_list_specs():
+        calls["count"] += 1
+        return [spec]
+
+    monkeypatch.setattr(analysis_service, "list_specs", fake_list_specs)
+    registry = analysis_service.AnalysisToolRegistry()
+    service = analysis_service.AnalysisService(None, registry=registry)
+
+    assert service.list_tools()[0]["id"] == "snap"
+    assert registry.list_tools()[0]["id"] == "snap"
+    assert calls["count"] == 1
+
+
 @pytest.mark.unit
 def test_script_service_crud_and_execute(test_db):
     user = User(
@@ -461,6 +492,86 @@ def test_reasoning_service_execute_chain_paths(test_db):
         assert failed.error_log
 
 
+@pytest.mark.unit
+def test_reasoning_service_enqueue_then_run(test_db):
+    user = User(
+        username="queue_user",
+        email="queue_user@example.com",
+        hashed_password="hashed",
+        role=RoleEnum.ADMIN,
+        is_active=1,
+    )
+    test_db.add(user)
+    test_db.commit()
+    test_db.refresh(user)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        service = ReasoningService(test_db, storage=LocalStorage(base_dir=tmpdir))
+        chain = service.create_chain(
+            name="Queued Chain",
+            description="background path",
+            nodes=[
+                {"node_id": "n1", "node_type": "data_input", "config": {"source": "constant", "value": 1}},
+                {"node_id": "n2", "node_type": "output", "inputs": ["n1"], "config": {"format": "raw"}},
+            ],
+            created_by_id=user.id,
+        )
+
+        def ok_execute_chain(nodes, input_data, timeout):
+            return {"status": "completed", "results": {"n1": {"value": 1}}, "errors": []}
+
+        service.engine.execute_chain = ok_execute_chain
+        pending = service.enqueue_execution(chain.id, {"input": "value"}, user.id)
+        assert pending.status == "pending"
+
+        finished = service.run_execution(pending.id, timeout=1)
+        assert finished.id == pending.id
+        assert finished.status == "completed"
+        assert finished.completed_at is not None
+
+        # A repeated or late task must not run a finished execution again
+        def rerun(nodes, input_data, timeout):
+            raise AssertionError("completed execution was re-run")
+
+        service.engine.execute_chain = rerun
+        again = service.run_execution(pending.id, timeout=1)
+        assert again.status == "completed"
+
+        with pytest.raises(ExecutionNotFoundError):
+            service.run_execution(uuid4())
+
+
+@pytest.mark.unit
+def test_reasoning_service_fail_stale_executions(test_db):
+    chain = ReasoningChain(
+        name="Stale Chain",
+        description="stale",
+        nodes=[{"node_id": "n1", "node_type": "data_input", "config": {"source": "constant", "value": 1}}],
+        created_by_id=None,
+    )
+    test_db.add(chain)
+    test_db.commit()
+
+    an_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+    stale_pending = ReasoningExecution(chain_id=chain.id, status="pending", started_at=an_hour_ago)
+    stale_running = ReasoningExecution(chain_id=chain.id, status="running", started_at=an_hour_ago)
+    fresh_running = ReasoningExecution(chain_id=chain.id, status="running")
+    finished = ReasoningExecution(chain_id=chain.id, status="completed", started_at=an_hour_ago)
+    test_db.add_all([stale_pending, stale_running, fresh_running, finished])
+    test_db.commit()
+
+    service = ReasoningService(test_db)
+    failed_ids = service.fail_stale_executions(max_age_seconds=300)
+    assert set(failed_ids) == {stale_pending.id, stale_running.id}
+
+    test_db.expire_all()
+    assert stale_pending.status == "failed"
+    assert stale_running.execution_time_ms >= 3600 * 1000
+    assert fresh_running.status == "running"
+    assert finished.status == "completed"
+    assert service.fail_stale_executions(max_age_seconds=300) == []
+
+
 @pytest.mark.unit
 def test_reasoning_service_history_stats(test_db):
     chain = ReasoningChain(
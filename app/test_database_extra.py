@@ -2,6 +2,12 @@
 Extra tests for database helpers.
 """
 
+import math
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
 from app import database
 
 
@@ -20,3 +26,74 @@ def test_get_db_closes_session(monkeypatch):
     gen.close()
 
     assert closed["value"] is True
+
+
+def test_sqlite_pragmas_applied_on_connect():
+    if not database.SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+        pytest.skip("SQLite PRAGMA listener is only registered for SQLite URLs")
+
+    with database.engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+
+    if make_url(database.SQLALCHEMY_DATABASE_URL).database not in (None, "", ":memory:"):
+        assert journal_mode.lower() == "wal"
+    assert synchronous == 1  # NORMAL
+
+
+def test_file_database_pool_is_tuned():
+    if "pool_size" not in database.engine_kwargs:
+        pytest.skip("in-memory SQLite uses SingletonThreadPool without pool sizing")
+
+    pool = database.engine.pool
+    assert pool._pre_ping is True
+    assert pool._recycle == database.engine_kwargs["pool_recycle"]
+    assert database.DB_MAX_CONNECTIONS == pool.size() + database.engine_kwargs["max_overflow"]
+
+
+def test_pool_options_skip_in_memory_sqlite():
+    for url in ("sqlite://", "sqlite:///:memory:"):
+        assert database.pool_options(url) == {}
+        # SingletonThreadPool rejects pool_size/max_overflow
+        create_engine(url, **database.pool_options(url)).dispose()
+
+    file_options = database.pool_options("sqlite:///./labflow.db")
+    assert file_options["pool_pre_ping"] is True
+    assert {"pool_size", "max_overflow", "pool_recycle"} <= set(file_options)
+    assert "pool_size" in database.pool_options("postgresql://u:p@db/labflow")
+
+
+def test_postgres_driver_options():
+    assert database.postgres_driver_options("postgresql://u:p@db/labflow") == (
+        {"executemany_mode": "values_plus_batch"},
+        {},
+    )
+    assert database.postgres_driver_options("postgresql+psycopg://u:p@db/labflow") == (
+        {},
+        {"prepare_threshold": 5},
+    )
+    assert database.postgres_driver_options("sqlite:///./labflow.db") == ({}, {})
+    assert database.engine_kwargs["query_cache_size"] == 1000
+
+
+def test_json_serializer_uses_orjson_with_fallbacks():
+    assert database.engine_kwargs["json_serializer"] is database.json_serializer
+    assert database.json_serializer({"a": [1, 2.5, None], 3: "x"}) == '{"a":[1,2.5,null],"3":"x"}'
+    # Values orjson rejects fall back to the standard encoder
+    assert database.json_serializer({"big": 2**70}) == '{"big": 1180591620717411303424}'
+    assert database.json_deserializer('{"a":[1,2.5,null]}') == {"a": [1, 2.5, None]}
+    assert math.isnan(database.json_deserializer('{"v": NaN}')["v"])
+
+
+def test_json_serializer_keeps_non_finite_floats():
+    # orjson would write these as null; they must round-trip as before
+    text = database.json_serializer({"x": float("nan"), "y": [float("inf"), -float("inf")], "z": None})
+    assert text == '{"x": NaN, "y": [Infinity, -Infinity], "z": null}'
+    restored = database.json_deserializer(text)
+    assert math.isnan(restored["x"])
+    assert restored["y"] == [math.inf, -math.inf]
+    assert restored["z"] is None
+
+    np = pytest.importorskip("numpy")
+    assert database.json_serializer({"arr": np.array([1.0, np.nan])}) == '{"arr": [1.0, NaN]}'
+    assert database.json_serializer({"arr": np.array([1.0, 2.0])}) == '{"arr":[1.0,2.0]}'
@@ -4,6 +4,7 @@ Tests for logging_config utilities.
 
 import json
 import logging
+import sys
 
 from app import logging_config
 
@@ -75,3 +76,37 @@ def test_configure_logging_file_handler_failure(monkeypatch):
 
 def test_setup_module_loggers():
     logging_config.setup_module_loggers()
+
+
+def test_configure_logging_routes_through_queue():
+    logging_config.configure_logging(level="INFO", log_format="json", log_file=None)
+    root_handlers = logging.getLogger().handlers
+    assert len(root_handlers) == 1
+    assert isinstance(root_handlers[0], logging_config.RecordQueueHandler)
+    assert logging_config._queue_listener is not None
+
+
+def test_record_queue_handler_keeps_exception_text():
+    handler = logging_config.RecordQueueHandler(None)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord(
+            name="queue",
+            level=logging.ERROR,
+            pathname=__file__,
+            lineno=30,
+            msg="failed %s",
+            args=("upload",),
+            exc_info=sys.exc_info(),
+        )
+    record.custom_fields = {"request_id": "abc"}
+
+    prepared = handler.prepare(record)
+    assert prepared.msg == "failed upload"
+    assert prepared.exc_info is None
+
+    parsed = json.loads(logging_config.StructuredFormatter().format(prepared))
+    assert parsed["message"] == "failed upload"
+    assert "ValueError: boom" in parsed["exception"]
+    assert parsed["request_id"] == "abc"
@@ -4,6 +4,8 @@ Error-path tests for main.py endpoints.
 
 import os
 import tempfile
+import time
+from types import SimpleNamespace
 from uuid import uuid4
 
 import pytest
@@ -60,6 +62,104 @@ def test_custom_openapi_cached():
     assert schema_first is schema_second
 
 
+@pytest.mark.integration
+def test_openapi_json_served_from_cached_bytes():
+    client = TestClient(app)
+    resp = client.get("/openapi.json")
+    assert resp.status_code == 200
+    assert resp.json()["info"]["title"] == "LabFlow API"
+    assert main.get_openapi_bytes() is main.get_openapi_bytes()
+    assert resp.content == main.get_openapi_bytes()
+
+
+@pytest.mark.integration
+def test_cors_preflight_is_cacheable():
+    client = TestClient(app)
+    resp = client.options(
+        "/files/",
+        headers={
+            "Origin": "http://localhost:5173",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "Authorization",
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.headers["access-control-max-age"] == "86400"
+    assert "Authorization" in resp.headers["access-control-allow-headers"]
+
+    rejected = client.options(
+        "/files/",
+        headers={
+            "Origin": "http://localhost:5173",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "X-Unknown",
+        },
+    )
+    assert rejected.status_code == 400
+
+
+@pytest.mark.integration
+def test_request_middleware_skips_health_checks(monkeypatch):
+    logged = []
+    monkeypatch.setattr(main, "_log_request_info", lambda *args, **kwargs: logged.append(kwargs))
+    client = TestClient(app)
+    health = client.get("/health", headers={"X-Request-Id": "probe-1"})
+    assert health.status_code == 200
+    # Not logged, but the correlation header is still returned
+    assert health.headers["x-request-id"] == "probe-1"
+    assert logged == []
+
+    locales = client.get("/i18n/locales", headers={"X-Request-Id": "req-123"})
+    assert locales.headers["x-request-id"] == "req-123"
+    assert [entry["extra"]["custom_fields"]["request_id"] for entry in logged] == ["req-123"]
+
+
+def test_get_cached_user_queries_db_once():
+    calls = {"count": 0}
+    user = SimpleNamespace(
+        id=4242,
+        username="cached_user",
+        email=None,
+        role="viewer",
+        is_active=1,
+        created_at=None,
+    )
+
+    class FakeQuery:
+        def filter(self, *args):
+            return self
+
+        def first(self):
+            calls["count"] += 1
+            return user
+
+    class FakeDB:
+        def query(self, model):
+            return FakeQuery()
+
+    main.invalidate_cached_user(user.id)
+    try:
+        first = main.get_cached_user(FakeDB(), user.id)
+        second = main.get_cached_user(FakeDB(), user.id)
+        assert first["username"] == "cached_user"
+        assert first["is_active"] is True
+        assert second is first
+        assert calls["count"] == 1
+
+        main.invalidate_cached_user(user.id)
+        main.get_cached_user(FakeDB(), user.id)
+        assert calls["count"] == 2
+
+        # fresh=True always reads the row and refreshes the cached snapshot
+        user.is_active = 0
+        refreshed = main.get_cached_user(FakeDB(), user.id, fresh=True)
+        assert calls["count"] == 3
+        assert refreshed["is_active"] is False
+        assert main.get_cached_user(FakeDB(), user.id) is refreshed
+    finally:
+        main.invalidate_cached_user(user.id)
+
+
 @pytest.mark.integration
 def test_login_inactive_user(test_client: TestClient, test_db):
     user = models.User(
@@ -448,6 +548,25 @@ def test_batch_delete_partial(test_client: TestClient, test_db):
     assert 9999 in payload["failed_ids"]
 
 
+@pytest.mark.integration
+def test_batch_delete_dedupes_and_sorts_ids(test_client: TestClient, test_db):
+    records = [
+        models.File(filename=f"dedupe{i}.bin", storage_key=f"/tmp/dedupe{i}", file_hash=str(i) * 64)
+        for i in range(2)
+    ]
+    test_db.add_all(records)
+    test_db.commit()
+    first, second = (record.id for record in records)
+
+    resp = test_client.post(
+        "/files/batch-delete", json=[second, 9999, first, second, 9998, 9999]
+    )
+    assert resp.status_code == 200
+    payload = resp.json()
+    assert payload["deleted_count"] == 2
+    assert payload["failed_ids"] == [9998, 9999]
+
+
 @pytest.mark.integration
 def test_batch_delete_error(test_client: TestClient, test_db, monkeypatch):
     def fail_commit():
@@ -500,6 +619,102 @@ def test_batch_upload_outer_error(test_client: TestClient, test_db, monkeypatch)
     assert resp.json()["status"] == "error"
 
 
+@pytest.mark.integration
+def test_batch_upload_keeps_survivors_on_conflict(
+    test_client: TestClient, test_db, monkeypatch, tmp_path
+):
+    import hashlib
+
+    from app.storage import LocalStorage
+
+    storage = LocalStorage(base_dir=str(tmp_path))
+    monkeypatch.setattr(main, "storage", storage)
+    squatter = models.File(
+        filename="squatter.bin",
+        storage_key=storage.path_for_hash(hashlib.sha256(b"first").hexdigest()),
+        file_hash="f" * 64,
+    )
+    test_db.add(squatter)
+    test_db.commit()
+
+    resp = test_client.post(
+        "/files/batch-upload",
+        files=[
+            ("files", ("first.bin", b"first", "application/octet-stream")),
+            ("files", ("second.bin", b"second", "application/octet-stream")),
+        ],
+    )
+    assert resp.status_code == 201
+    payload = resp.json()
+    assert payload["status"] == "partial"
+    assert [item["filename"] for item in payload["uploaded_files"]] == ["second.bin"]
+    assert [item["filename"] for item in payload["errors"]] == ["first.bin"]
+    # The blob path is still referenced by the squatter row, so it is kept
+    assert os.path.exists(squatter.storage_key)
+
+
+@pytest.mark.integration
+def test_batch_upload_reports_concurrent_insert_losers_as_duplicates(
+    test_client: TestClient, test_db, monkeypatch, tmp_path
+):
+    import hashlib
+
+    from app.storage import LocalStorage
+
+    storage = LocalStorage(base_dir=str(tmp_path))
+    monkeypatch.setattr(main, "storage", storage)
+    first_hash = hashlib.sha256(b"first").hexdigest()
+    winner = models.File(
+        filename="winner.bin", storage_key=storage.path_for_hash(first_hash), file_hash=first_hash
+    )
+    test_db.add(winner)
+    test_db.commit()
+
+    # Simulate the race: the row appears after the initial duplicate lookup
+    load_files_by_hash = main._load_files_by_hash
+    calls = []
+
+    def racing_lookup(db, file_hashes):
+        calls.append(file_hashes)
+        return {} if len(calls) == 1 else load_files_by_hash(db, file_hashes)
+
+    monkeypatch.setattr(main, "_load_files_by_hash", racing_lookup)
+
+    resp = test_client.post(
+        "/files/batch-upload",
+        files=[
+            ("files", ("first.bin", b"first", "application/octet-stream")),
+            ("files", ("second.bin", b"second", "application/octet-stream")),
+        ],
+    )
+    payload = resp.json()
+    assert payload["status"] == "success"
+    assert payload["errors"] == []
+    assert [item["filename"] for item in payload["uploaded_files"]] == ["second.bin"]
+    assert [item["id"] for item in payload["duplicated_files"]] == [winner.id]
+    assert os.path.exists(winner.storage_key)
+
+
+def test_triage_failed_files_lists_unreferenced_blobs(test_db):
+    kept = models.File(filename="kept.bin", storage_key="/blobs/shared.bin", file_hash="a" * 64)
+    test_db.add(kept)
+    test_db.commit()
+
+    shared = models.File(filename="shared.bin", storage_key="/blobs/shared.bin", file_hash="b" * 64)
+    orphan = models.File(filename="orphan.bin", storage_key="/blobs/orphan.bin", file_hash="c" * 64)
+    racer = models.File(filename="racer.bin", storage_key="/blobs/other.bin", file_hash="a" * 64)
+
+    duplicates, errors, orphan_keys = main._triage_failed_files(
+        test_db, [(shared, "conflict"), (orphan, "boom"), (racer, "conflict")]
+    )
+    assert [record.id for record in duplicates] == [kept.id]
+    assert [(record.filename, error) for record, error in errors] == [
+        ("shared.bin", "conflict"),
+        ("orphan.bin", "boom"),
+    ]
+    assert orphan_keys == ["/blobs/orphan.bin"]
+
+
 @pytest.mark.integration
 def test_reasoning_chain_invalid_uuid(test_client: TestClient):
     app.dependency_overrides[security.get_current_user] = lambda: {
@@ -568,6 +783,78 @@ def test_execution_result_normalization(test_client: TestClient, test_db):
     app.dependency_overrides.clear()
 
 
+@pytest.mark.integration
+def test_execute_reasoning_chain_runs_in_background(test_client: TestClient, test_db):
+    user = models.User(
+        username="background_user",
+        email="background_user@example.com",
+        hashed_password=security.hash_password("password123"),
+        role=models.RoleEnum.VIEWER,
+        is_active=1,
+    )
+    test_db.add(user)
+    test_db.commit()
+
+    chain = models.ReasoningChain(
+        id=uuid4(),
+        name="background chain",
+        description="",
+        nodes=[
+            {
+                "node_id": "n1",
+                "node_type": "data_input",
+                "name": "Constant",
+                "config": {"source_type": "constant", "value": 1},
+            },
+            {
+                "node_id": "n2",
+                "node_type": "output",
+                "name": "Result",
+                "inputs": ["n1"],
+                "config": {"output_format": "selected", "fields": ["n1"]},
+            },
+        ],
+        is_template=False,
+        created_by_id=user.id,
+    )
+    test_db.add(chain)
+    test_db.commit()
+
+    app.dependency_overrides[security.get_current_user] = lambda: {
+        "id": user.id,
+        "role": "viewer",
+    }
+    try:
+        accepted = test_client.post(f"/reasoning-chains/{chain.id}/execute", json={"input_data": {}})
+        assert accepted.status_code == 202
+        assert accepted.json()["status"] == "pending"
+        execution_id = accepted.json()["execution_id"]
+
+        # The background task runs against the overridden test database
+        for _ in range(50):
+            result = test_client.get(f"/executions/{execution_id}")
+            assert result.status_code == 200
+            if result.json()["status"] not in ("pending", "running"):
+                break
+            time.sleep(0.05)
+        assert result.json()["status"] == "completed"
+    finally:
+        app.dependency_overrides.pop(security.get_current_user, None)
+
+
+def test_execution_json_helpers_return_independent_values():
+    first = main._normalize_json('{"x": {"y": 1}}')
+    first["x"]["y"] = 2
+    # A caller mutating its result must not affect later callers
+    assert main._normalize_json('{"x": {"y": 1}}') == {"x": {"y": 1}}
+
+    assert main._normalize_json("not json") == {}
+    assert main._normalize_json(None) == {}
+    assert main._normalize_error("plain failure") == "plain failure"
+    assert main._normalize_error('{"err": "x"}') == {"err": "x"}
+    assert main._normalize_error(None) is None
+
+
 @pytest.mark.integration
 def test_execution_result_not_found(test_client: TestClient):
     app.dependency_overrides[security.get_current_user] = lambda: {
@@ -589,5 +876,75 @@ def test_script_endpoints_not_found(test_client: TestClient):
     assert missing.status_code == 404
 
     bad = test_client.post("/scripts/not-a-uuid/execute", json={"x": 1})
-    assert bad.status_code == 400
+    assert bad.status_code == 422
     app.dependency_overrides.clear()
+
+
+@pytest.mark.integration
+def test_script_bodies_are_validated(test_client: TestClient):
+    app.dependency_overrides[security.get_current_user] = lambda: {
+        "id": 1,
+        "role": "admin",
+    }
+    missing_content = test_client.post("/scripts", json={"name": "s"})
+    assert missing_content.status_code == 422
+
+    unknown_field = test_client.post(
+        "/scripts", json={"name": "s", "content": "print(1)", "owner": "x"}
+    )
+    assert unknown_field.status_code == 422
+
+    bad_update = test_client.put(
+        "/scripts/00000000-0000-0000-0000-000000000000", json={"parameters": "nope"}
+    )
+    assert bad_update.status_code == 422
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.integration
+def test_script_service_errors_map_to_status_codes(test_client: TestClient):
+    app.dependency_overrides[security.get_current_user] = lambda: {
+        "id": 1,
+        "role": "admin",
+    }
+    invalid = test_client.post("/scripts", json={"name": "s", "content": "   "})
+    assert invalid.status_code == 400
+    assert "empty" in invalid.json()["detail"]
+
+    blank_name = test_client.post("/scripts", json={"name": "  ", "content": "print(1)"})
+    assert blank_name.status_code == 400
+
+    missing_update = test_client.put(
+        "/scripts/00000000-0000-0000-0000-000000000000", json={"name": "x"}
+    )
+    assert missing_update.status_code == 404
+
+    missing_execute = test_client.post(
+        "/scripts/00000000-0000-0000-0000-000000000000/execute", json={"x": 1}
+    )
+    assert missing_execute.status_code == 404
+    app.dependency_overrides.clear()
+
+
+def test_lifespan_sizes_threadpool():
+    import anyio.to_thread
+
+    with TestClient(app) as client:
+        limiter = client.portal.call(anyio.to_thread.current_default_thread_limiter)
+        assert limiter.total_tokens == main.THREADPOOL_SIZE
+    assert main.THREADPOOL_SIZE >= main.database.DB_MAX_CONNECTIONS
+
+
+def test_script_endpoints_document_response_models():
+    paths = app.openapi()["paths"]
+
+    def schema_ref(path, method, code):
+        return paths[path][method]["responses"][code]["content"]["application/json"]["schema"]
+
+    assert schema_ref("/scripts", "post", "201")["$ref"].endswith("/ScriptSummary")
+    assert schema_ref("/scripts", "get", "200")["items"]["$ref"].endswith("/ScriptSummary")
+    assert schema_ref("/scripts/{script_id}", "get", "200")["$ref"].endswith("/ScriptDetail")
+    assert schema_ref("/scripts/{script_id}", "put", "200")["$ref"].endswith("/ScriptUpdateResult")
+    assert schema_ref("/scripts/{script_id}/execute", "post", "200")["$ref"].endswith(
+        "/ScriptExecutionStarted"
+    )
@@ -2,14 +2,21 @@
 Additional endpoint tests to increase main.py coverage.
 """
 
+import json
+import logging
 import os
 import tempfile
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, sessionmaker
 
-from app import models, security
-from app.main import app
+import app.main as main
+from app import models, schemas, security
+from app.models import file_tags
+from app.main import _insert_tags, app
+from app.query_optimization import count_queries
 
 
 def make_auth_header(user_id: int, role: str = "admin", username: str = "user") -> dict:
@@ -234,6 +241,14 @@ def test_download_and_remove_tag_and_conclusion(
                 f"/files/{file_record.id}/download", headers=auth_headers
             )
             assert download.status_code == 200
+            assert download.headers["etag"] == f'"{"a" * 64}"'
+
+            cached = test_client.get(
+                f"/files/{file_record.id}/download",
+                headers={**auth_headers, "If-None-Match": download.headers["etag"]},
+            )
+            assert cached.status_code == 304
+            assert cached.content == b""
 
             remove = test_client.delete(
                 f"/files/{file_record.id}/tags/{tag.id}", headers=auth_headers
@@ -445,6 +460,9 @@ def test_script_endpoints(test_client: TestClient, test_db, monkeypatch):
 
     listed = test_client.get("/scripts", headers=headers)
     assert listed.status_code == 200
+    stored = test_db.query(models.Script).one()
+    assert listed.json()[0]["created_at"] == stored.created_at.isoformat()
+    assert set(listed.json()[0]) == {"id", "name", "category", "created_at"}
 
     detail = test_client.get(f"/scripts/{script_id}", headers=headers)
     assert detail.status_code == 200
@@ -466,3 +484,337 @@ def test_script_endpoints(test_client: TestClient, test_db, monkeypatch):
     deleted = test_client.delete(f"/scripts/{script_id}", headers=headers)
     assert deleted.status_code == 204
     app.dependency_overrides.pop(security.get_current_user, None)
+
+
+@pytest.mark.integration
+def test_list_files_eager_loads_relations(test_client: TestClient, test_db):
+    from sqlalchemy import event
+
+    for index in range(5):
+        record = models.File(
+            filename=f"eager_{index}.bin",
+            storage_key=f"/tmp/eager_{index}",
+            file_hash=f"{index:064d}",
+        )
+        record.tags.append(models.Tag(name=f"eager_tag_{index}"))
+        record.conclusions.append(models.Conclusion(content="note"))
+        test_db.add(record)
+    test_db.commit()
+
+    statements = []
+
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    engine = test_db.get_bind()
+    event.listen(engine, "before_cursor_execute", count_selects)
+    try:
+        resp = test_client.get("/files/")
+    finally:
+        event.remove(engine, "before_cursor_execute", count_selects)
+
+    assert resp.status_code == 200
+    assert len(resp.json()) == 5
+    # files + 一次 UNION ALL 載入三種關聯，與檔案數量無關
+    assert len(statements) <= 2
+    assert all(len(item["tags"]) == 1 and len(item["conclusions"]) == 1 for item in resp.json())
+
+
+def _seed_files_with_relations(test_db, prefix: str, count: int):
+    records = []
+    for index in range(count):
+        record = models.File(
+            filename=f"{prefix}_{index}.bin",
+            storage_key=f"/tmp/{prefix}_missing_{index}",
+            file_hash=f"{prefix}{index:06d}".ljust(64, "0"),
+        )
+        record.tags.append(models.Tag(name=f"{prefix}_tag_{index}"))
+        record.conclusions.append(models.Conclusion(content="note"))
+        record.annotations.append(models.Annotation(data={"i": index}, source="manual"))
+        records.append(record)
+    test_db.add_all(records)
+    test_db.commit()
+    return records
+
+
+@pytest.mark.integration
+def test_batch_delete_query_count_is_constant(test_client: TestClient, test_db):
+    file_ids = [record.id for record in _seed_files_with_relations(test_db, "qcdel", 20)]
+
+    with count_queries(test_db.get_bind()) as statements:
+        resp = test_client.post("/files/batch-delete", json=file_ids)
+
+    assert resp.json()["deleted_count"] == 20
+    # SELECT + file_tags/annotations/conclusions/files 各一個 DELETE
+    assert len(statements) <= 5
+
+
+@pytest.mark.integration
+def test_batch_create_tags_query_count_is_constant(test_client: TestClient, test_db):
+    test_db.add_all([models.Tag(name="qc_existing_a"), models.Tag(name="qc_existing_b")])
+    test_db.commit()
+    names = ["qc_existing_a", "qc_existing_b"] + [f"qc_new_{i}" for i in range(20)]
+
+    with count_queries(test_db.get_bind()) as statements:
+        resp = test_client.post("/tags/batch-create", json=names)
+
+    assert resp.status_code == 201
+    payload = resp.json()
+    assert payload["created_count"] == 20
+    assert all(tag["id"] is not None for tag in payload["created_tags"])
+    # 既有標籤 SELECT + 單一 INSERT ... RETURNING
+    assert len(statements) <= 2
+
+
+@pytest.mark.integration
+def test_admin_file_endpoints_query_count_is_constant(test_client: TestClient, test_db):
+    _seed_files_with_relations(test_db, "qcsync", 20)
+
+    with count_queries(test_db.get_bind()) as statements:
+        status_resp = test_client.get("/admin/file-status/")
+    assert status_resp.json()["orphaned_files"] == 20
+    assert len(statements) <= 1
+
+    with count_queries(test_db.get_bind()) as statements:
+        sync_resp = test_client.post("/admin/sync-files/")
+    assert sync_resp.json()["deleted_files"] == 20
+    # 暫存表建立/寫入/反連接/刪除 + 四個批次 DELETE，與記錄數無關
+    assert len(statements) <= 10
+
+
+@pytest.mark.integration
+def test_list_annotations_query_count_is_constant(test_client: TestClient, test_db):
+    file_id = _seed_files_with_relations(test_db, "qcann", 1)[0].id
+    test_db.add_all(
+        [models.Annotation(file_id=file_id, data={"n": n}, source="manual") for n in range(10)]
+    )
+    test_db.commit()
+
+    with count_queries(test_db.get_bind()) as statements:
+        resp = test_client.get(f"/files/{file_id}/annotations/")
+
+    assert len(resp.json()) == 11
+    # EXISTS 探測 + 欄位查詢
+    assert len(statements) <= 2
+
+
+@pytest.mark.integration
+def test_batch_classify_resolves_tags_in_one_query(test_client: TestClient, test_db):
+    names = ["sampleA_XRD_20240101.csv", "sampleB_SEM_20240102.tif", "sampleA_XRD_20240103.csv"]
+    file_ids = []
+    for index, name in enumerate(names):
+        record = models.File(
+            filename=name, storage_key=f"/tmp/classify_{index}", file_hash=f"c{index}".ljust(64, "0")
+        )
+        test_db.add(record)
+        test_db.commit()
+        file_ids.append(record.id)
+
+    with count_queries(test_db.get_bind()) as statements:
+        resp = test_client.post("/files/classify/batch", json={"file_ids": file_ids + [999999]})
+
+    assert resp.status_code == 200
+    payload = resp.json()
+    assert payload["successful"] == 3
+    assert payload["failed"] == 1
+    created = [tag for result in payload["results"] for tag in result["tags_created"]]
+    assert len(created) == len(set(created))
+    assert "XRD" in created and "SEM" in created
+
+    tag_lookups = [
+        sql for sql in statements if sql.lstrip().startswith("SELECT") and "FROM tags" in sql and " IN (" in sql
+    ]
+    assert len(tag_lookups) == 1
+    tag_inserts = [sql for sql in statements if sql.lstrip().startswith("INSERT INTO tags")]
+    assert len(tag_inserts) == 1
+
+
+def test_classification_stats_aggregates_in_one_query(test_client: TestClient, test_db):
+    record = models.File(filename="stats.csv", storage_key="/tmp/stats_csv", file_hash="s".ljust(64, "0"))
+    test_db.add(record)
+    test_db.commit()
+    for data in (
+        {"classification": {"file_type": "XRD", "confidence": 0.9}},
+        {"classification": {"file_type": "XRD", "confidence": 0.7}},
+        {"classification": {"file_type": "Unknown", "confidence": 0.2}},
+        {"classification": {}},
+    ):
+        test_db.add(models.Annotation(file_id=record.id, data=data, source="auto_classification"))
+    test_db.add(models.Annotation(file_id=record.id, data={"note": "x"}, source="manual"))
+    test_db.commit()
+
+    with count_queries(test_db.get_bind()) as statements:
+        resp = test_client.get("/classification/stats")
+
+    assert resp.status_code == 200
+    payload = resp.json()
+    assert payload["total"] == 4
+    assert payload["by_type"] == {"XRD": 2, "Unknown": 2}
+    assert payload["unknown_count"] == 2
+    assert payload["unknown_rate"] == 0.5
+    assert abs(payload["avg_confidence"] - 0.45) < 1e-9
+    assert len(statements) == 1
+
+
+def test_classify_file_commits_once(test_client: TestClient, test_db):
+    record = models.File(
+        filename="sampleC_XRD_20240105.csv", storage_key="/tmp/classify_once", file_hash="o".ljust(64, "0")
+    )
+    test_db.add(record)
+    test_db.commit()
+    file_id = record.id
+
+    commits = []
+
+    def on_commit(session):
+        commits.append(session)
+
+    event.listen(Session, "after_commit", on_commit)
+    try:
+        resp = test_client.post(f"/files/{file_id}/classify")
+    finally:
+        event.remove(Session, "after_commit", on_commit)
+
+    assert resp.status_code == 200
+    payload = resp.json()
+    assert payload["filename"] == "sampleC_XRD_20240105.csv"
+    assert "XRD" in payload["tags_added"]
+    assert len(commits) == 1
+
+
+def test_insert_tags_skips_names_created_concurrently(test_db):
+    test_db.add(models.Tag(name="race_existing"))
+    test_db.commit()
+
+    created = _insert_tags(test_db, ["race_new", "race_existing"])
+    test_db.commit()
+
+    assert list(created) == ["race_new"]
+    assert created["race_new"].id is not None
+    with pytest.raises(ValueError):
+        _insert_tags(test_db, ["x" * 101])
+
+
+def test_insert_tags_without_executemany_returning_reselects(test_db, monkeypatch):
+    # Dialects such as MySQL cannot RETURNING from a multi-row INSERT
+    dialect = test_db.get_bind().dialect
+    monkeypatch.setattr(dialect, "name", "mysql")
+    monkeypatch.setattr(dialect, "insert_executemany_returning", False)
+
+    with count_queries(test_db.get_bind()) as statements:
+        created = _insert_tags(test_db, ["plain_a", "plain_b"])
+    test_db.commit()
+
+    assert sorted(created) == ["plain_a", "plain_b"]
+    assert all(tag.id is not None for tag in created.values())
+    assert not any("RETURNING" in sql for sql in statements)
+
+
+def test_classify_file_twice_does_not_duplicate_tag_links(test_client: TestClient, test_db):
+    record = models.File(
+        filename="sampleD_SEM_20240106.tif", storage_key="/tmp/classify_twice", file_hash="w".ljust(64, "0")
+    )
+    test_db.add(record)
+    test_db.commit()
+    file_id = record.id
+
+    first = test_client.post(f"/files/{file_id}/classify")
+    second = test_client.post(f"/files/{file_id}/classify")
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert "SEM" in first.json()["tags_added"]
+    assert second.json()["tags_added"] == []
+    links = test_db.execute(select(file_tags.c.tag_id).where(file_tags.c.file_id == file_id)).all()
+    assert len(links) == len(first.json()["tags_added"])
+
+
+def test_batch_classify_logs_one_summary_line(test_client: TestClient, test_db):
+    file_ids = []
+    for index in range(3):
+        record = models.File(
+            filename=f"sampleE{index}_XRD_20240107.csv",
+            storage_key=f"/tmp/classify_log_{index}",
+            file_hash=f"l{index}".ljust(64, "0"),
+        )
+        test_db.add(record)
+        test_db.commit()
+        file_ids.append(record.id)
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    main_logger = logging.getLogger("app.main")
+    main_logger.addHandler(handler)
+    try:
+        resp = test_client.post("/files/classify/batch", json={"file_ids": file_ids})
+    finally:
+        main_logger.removeHandler(handler)
+
+    assert resp.status_code == 200
+    summaries = [record for record in records if record.msg.startswith("批量分類完成")]
+    assert len(summaries) == 1
+    assert summaries[0].args == (3, 0)
+    assert not any("分類檔案成功" in record.getMessage() for record in records)
+
+
+def _classification_files(test_db, prefix, count):
+    file_ids = []
+    for index in range(count):
+        record = models.File(
+            filename=f"{prefix}{index}_XRD_20240108.csv",
+            storage_key=f"/tmp/{prefix}_{index}",
+            file_hash=f"{prefix}{index}".ljust(64, "0"),
+        )
+        test_db.add(record)
+        test_db.commit()
+        file_ids.append(record.id)
+    return file_ids
+
+
+@pytest.mark.integration
+def test_stream_batch_classify_returns_ndjson(test_client: TestClient, test_db, monkeypatch):
+    monkeypatch.setattr(main, "CLASSIFY_STREAM_BATCH_SIZE", 2)
+    file_ids = _classification_files(test_db, "stream", 3)
+
+    with test_client.stream(
+        "POST", "/files/classify/batch/stream", json={"file_ids": file_ids + [999999]}
+    ) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in resp.iter_lines() if line]
+
+    assert [line["file_id"] for line in lines if line["type"] == "result"] == file_ids
+    assert [line["file_id"] for line in lines if line["type"] == "error"] == [999999]
+    assert lines[-1] == {"type": "summary", "total": 4, "successful": 3, "failed": 1}
+    # The tag is created once and reported on its first use only
+    created = [tag for line in lines if line["type"] == "result" for tag in line["tags_created"]]
+    assert created.count("XRD") == 1
+
+
+@pytest.mark.integration
+def test_stream_batch_classification_commits_each_batch_before_the_next(test_db, monkeypatch):
+    monkeypatch.setattr(main, "CLASSIFY_STREAM_BATCH_SIZE", 1)
+    first_id, second_id = _classification_files(test_db, "lazy", 2)
+    session_factory = sessionmaker(bind=test_db.get_bind())
+
+    def classified_ids():
+        test_db.expire_all()
+        return set(
+            test_db.scalars(
+                select(models.Annotation.file_id).where(models.Annotation.source == "auto_classification")
+            )
+        )
+
+    stream = main._stream_batch_classification(
+        schemas.BatchClassificationRequest(file_ids=[first_id, second_id]), session_factory
+    )
+    first_chunk = next(stream)
+    assert [json.loads(line)["file_id"] for line in first_chunk.splitlines()] == [first_id]
+    # The second file is only classified once the client reads further
+    assert classified_ids() == {first_id}
+
+    rest = b"".join(stream).splitlines()
+    assert json.loads(rest[0])["file_id"] == second_id
+    assert json.loads(rest[-1])["type"] == "summary"
+    assert classified_ids() == {first_id, second_id}
@@ -0,0 +1,68 @@
+"""
+Tests for data migrations that inspect the existing schema.
+"""
+
+import importlib.util
+from pathlib import Path
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, inspect, text
+
+VERSIONS_DIR = Path(__file__).resolve().parent.parent / "infra" / "migrations" / "versions"
+
+
+def _load_migration(revision):
+    path = next(VERSIONS_DIR.glob(f"{revision}_*.py"))
+    spec = importlib.util.spec_from_file_location(f"migration_{revision}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run_upgrade(engine, revision):
+    module = _load_migration(revision)
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            module.upgrade()
+
+
+def test_file_index_migration_skips_missing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    _run_upgrade(engine, "c7d8e9f0a1b2")
+    assert not inspect(engine).has_table("files")
+
+
+def test_file_index_migration_adds_missing_indexes_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE files (id INTEGER PRIMARY KEY, storage_key VARCHAR, file_hash VARCHAR)"))
+
+    _run_upgrade(engine, "c7d8e9f0a1b2")
+    # Re-running finds the indexes through the inspector and creates nothing new
+    _run_upgrade(engine, "c7d8e9f0a1b2")
+
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("files")}
+    assert set(indexes) == {"ix_files_storage_key", "ix_files_file_hash"}
+    assert all(index["unique"] for index in indexes.values())
+
+
+def test_classification_type_index_migration_skips_missing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    _run_upgrade(engine, "d4e5f6a7b8c9")
+    assert not inspect(engine).has_table("annotations")
+
+
+def test_classification_type_index_migration_creates_partial_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE annotations (id INTEGER PRIMARY KEY, source VARCHAR, data JSON)"))
+
+    _run_upgrade(engine, "d4e5f6a7b8c9")
+
+    with engine.connect() as conn:
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'ix_annotations_classification_file_type'")
+        ).scalar()
+    assert "json_extract" in sql
+    assert "WHERE source = 'auto_classification'" in sql
@@ -52,3 +52,148 @@ def test_reasoning_execution_status_validation():
 def test_script_name_validation():
     with pytest.raises(ValueError):
         models.Script(name=" ", content="x")
+
+
+def test_annotation_autoclass_partial_index():
+    index = next(
+        index for index in models.Annotation.__table__.indexes if index.name == "idx_annotation_autoclass"
+    )
+    assert [column.name for column in index.columns] == ["file_id"]
+    assert "auto_classification" in str(index.dialect_options["sqlite"]["where"])
+    assert "auto_classification" in str(index.dialect_options["postgresql"]["where"])
+
+
+def test_payload_columns_use_jsonb_on_postgresql_only():
+    from sqlalchemy import create_engine, inspect
+    from sqlalchemy.dialects import postgresql, sqlite
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    ddl = str(CreateTable(models.ReasoningExecution.__table__).compile(dialect=postgresql.dialect()))
+    assert "results JSONB" in ddl
+    assert "results JSON," in str(
+        CreateTable(models.ReasoningExecution.__table__).compile(dialect=sqlite.dialect())
+    )
+
+    index = next(
+        index for index in models.ReasoningExecution.__table__.indexes if index.name == "idx_exec_results_gin"
+    )
+    index_ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    assert "USING gin (results jsonb_path_ops)" in index_ddl
+    assert "WHERE status = 'completed'" in index_ddl
+    # 非 PostgreSQL 方言不建立 GIN 索引
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    names = {index["name"] for index in inspect(engine).get_indexes("reasoning_executions")}
+    assert "idx_exec_results_gin" not in names
+    assert "idx_execution_status" in names
+
+
+def test_reasoning_node_bulk_insert_validates_rows(test_db):
+    chain = models.ReasoningChain(name="bulk", nodes=[{"id": "n1"}])
+    test_db.add(chain)
+    test_db.commit()
+
+    ids = models.ReasoningNode.bulk_insert(
+        test_db,
+        [
+            {"chain_id": chain.id, "node_id": f" n{i} ", "node_type": "CALCULATE", "name": f"node {i}"}
+            for i in range(3)
+        ],
+    )
+    test_db.commit()
+    assert len(ids) == 3
+    stored = test_db.query(models.ReasoningNode).order_by(models.ReasoningNode.node_id).all()
+    assert [node.node_id for node in stored] == ["n0", "n1", "n2"]
+    # 時間戳由資料庫的 server_default 產生
+    assert all(node.created_at is not None and node.updated_at is not None for node in stored)
+
+    with pytest.raises(ValueError, match="節點類型長度不能超過 50 字元"):
+        models.ReasoningNode.bulk_insert(
+            test_db, [{"chain_id": chain.id, "node_id": "x", "node_type": "t" * 51, "name": "x"}]
+        )
+
+
+def test_server_generated_timestamps_are_returned_on_insert(test_db):
+    from app.query_optimization import count_queries
+
+    script = models.Script(name="stamped", content="print(1)")
+    test_db.add(script)
+    with count_queries(test_db.get_bind()) as statements:
+        test_db.flush()
+        assert script.created_at is not None
+        assert script.updated_at is not None
+    # INSERT ... RETURNING 一併取回，不需額外 SELECT
+    assert len(statements) == 1
+
+
+def test_server_generated_timestamps_keep_sub_second_order_on_sqlite():
+    import time
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        first = models.Script(name="first", content="print(1)")
+        session.add(first)
+        session.flush()
+        time.sleep(0.01)
+        second = models.Script(name="second", content="print(2)")
+        session.add(second)
+        session.flush()
+        # CURRENT_TIMESTAMP 只到秒，同一秒內的兩筆會相同
+        assert first.created_at < second.created_at
+
+
+def test_execution_tables_are_range_partitioned_by_month():
+    from datetime import datetime, timezone
+
+    from sqlalchemy.dialects import postgresql, sqlite
+    from sqlalchemy.schema import CreateTable
+
+    for model in (models.ReasoningExecution, models.ScriptExecution):
+        ddl = str(CreateTable(model.__table__).compile(dialect=postgresql.dialect()))
+        assert "PRIMARY KEY (id, started_at)" in ddl
+        assert "PARTITION BY RANGE (started_at)" in ddl
+        # 其他資料庫維持 id 單一主鍵，與遷移鏈一致
+        sqlite_ddl = str(CreateTable(model.__table__).compile(dialect=sqlite.dialect()))
+        assert "PRIMARY KEY (id)" in sqlite_ddl
+        assert [c.name for c in model.__table__.primary_key] == ["id"]
+        assert [c.name for c in model.__mapper__.primary_key] == ["id"]
+    # 非分區表的主鍵不受影響
+    assert "PRIMARY KEY (id)" in str(CreateTable(models.Script.__table__).compile(dialect=postgresql.dialect()))
+
+    class RecordingConnection:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, statement):
+            self.statements.append(str(statement))
+
+    conn = RecordingConnection()
+    now = datetime.now(timezone.utc)
+    first = datetime(now.year - 1, 12, 15, tzinfo=timezone.utc)
+    models.create_monthly_partitions(conn, "script_executions", first, months_ahead=1)
+
+    assert f"script_executions_{now.year - 1}_12 PARTITION OF" in conn.statements[0]
+    assert f"TO ('{now.year}-01-01T00:00:00+00:00')" in conn.statements[0]
+    assert len(conn.statements) == now.month + 1 + 1 + 1  # 去年 12 月至下個月，再加 DEFAULT
+    assert conn.statements[-1].endswith("script_executions_default PARTITION OF script_executions DEFAULT")
+
+
+def test_execution_status_check_rejects_bulk_rows_bypassing_validators(test_db):
+    from sqlalchemy import insert
+    from sqlalchemy.exc import IntegrityError
+
+    script = models.Script(name="status-check", content="x")
+    test_db.add(script)
+    test_db.commit()
+
+    # Core insert 不經過 @validates，由資料庫 CHECK 約束擋下
+    with pytest.raises(IntegrityError):
+        test_db.execute(insert(models.ScriptExecution), [{"script_id": script.id, "status": "bad"}])
+    test_db.rollback()
+
+    test_db.execute(insert(models.ScriptExecution), [{"script_id": script.id, "status": "completed"}])
+    test_db.commit()
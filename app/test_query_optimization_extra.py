@@ -46,3 +46,255 @@ def test_get_files_with_pagination_filename_sort(test_db):
         order="desc",
     )
     assert result_desc.data[0].filename == "b.txt"
+
+
+def test_count_queries_collects_statements_and_detaches():
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        with query_optimization.count_queries(engine) as statements:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        conn.execute(text("SELECT 3"))
+
+    assert statements == ["SELECT 1", "SELECT 2"]
+
+
+def test_get_files_with_pagination_keyset_cursor(test_db):
+    from datetime import datetime, timedelta, timezone
+
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    test_db.add_all(
+        [
+            models.File(
+                filename=f"f{i}.txt",
+                storage_key=f"/tmp/keyset{i}",
+                file_hash=f"{i:064d}",
+                created_at=base + timedelta(minutes=i // 2),
+            )
+            for i in range(5)
+        ]
+    )
+    test_db.commit()
+
+    first = query_optimization.get_files_with_pagination(test_db, page_size=2)
+    assert [f.filename for f in first.data] == ["f4.txt", "f3.txt"]
+    assert first.has_next
+    assert first.total == 5
+
+    seen = [f.filename for f in first.data]
+    result = first
+    while result.has_next:
+        result = query_optimization.get_files_with_pagination(
+            test_db, page_size=2, cursor=result.next_cursor
+        )
+        seen.extend(f.filename for f in result.data)
+    assert seen == ["f4.txt", "f3.txt", "f2.txt", "f1.txt", "f0.txt"]
+    assert result.next_cursor is None
+
+
+def test_decode_cursor_rejects_garbage():
+    import pytest
+
+    with pytest.raises(ValueError):
+        query_optimization.decode_cursor("not-a-cursor")
+
+
+def test_get_files_with_pagination_json_rows(test_db):
+    tagged = models.File(filename="tagged.txt", storage_key="/tmp/json-a", file_hash="e" * 64)
+    tagged.tags.append(models.Tag(name="XRD"))
+    tagged.conclusions.append(models.Conclusion(content="ok"))
+    tagged.annotations.append(models.Annotation(data={"phase": "alpha"}, source="manual"))
+    bare = models.File(filename="bare.txt", storage_key="/tmp/json-b", file_hash="f" * 64)
+    test_db.add_all([tagged, bare])
+    test_db.commit()
+
+    with query_optimization.count_queries(test_db.get_bind()) as statements:
+        result = query_optimization.get_files_with_pagination(
+            test_db, page_size=10, sort_by="filename", order="asc", response_format="json"
+        )
+
+    # JSON 聚合關聯的單一頁面查詢，加上 file_stats 計數列的主鍵查詢
+    assert len(statements) == 2
+    bare_row, tagged_row = result.data
+    assert isinstance(tagged_row, dict)
+    assert bare_row["tags"] == [] and bare_row["annotations"] == []
+    assert tagged_row["tags"] == [{"id": tagged.tags[0].id, "name": "XRD"}]
+    assert tagged_row["conclusions"][0]["content"] == "ok"
+    assert tagged_row["annotations"][0]["data"] == {"phase": "alpha"}
+
+
+def test_paginate_reuses_count_until_commit(test_db):
+    test_db.add(models.File(filename="a.txt", storage_key="/tmp/count-a", file_hash="1" * 64))
+    test_db.commit()
+
+    query = test_db.query(models.File).filter(models.File.filename.like("%.txt"))
+    with query_optimization.count_queries(test_db.get_bind()) as statements:
+        _, total = query_optimization.paginate(query, page=1, page_size=1)
+        _, again = query_optimization.paginate(query, page=2, page_size=1)
+    assert total == again == 1
+    assert sum("count(" in statement.lower() for statement in statements) == 1
+
+    test_db.add(models.File(filename="b.txt", storage_key="/tmp/count-b", file_hash="2" * 64))
+    test_db.commit()
+    _, total = query_optimization.paginate(query, page=1, page_size=1)
+    assert total == 2
+
+
+def test_get_files_with_pagination_reads_total_from_file_stats(test_db):
+    test_db.add_all(
+        [
+            models.File(filename=f"w{i}.txt", storage_key=f"/tmp/window{i}", file_hash=f"{i}" * 64)
+            for i in range(3)
+        ]
+    )
+    test_db.commit()
+
+    for response_format in ("orm", "json"):
+        with query_optimization.count_queries(test_db.get_bind()) as statements:
+            result = query_optimization.get_files_with_pagination(
+                test_db, page=2, page_size=2, sort_by="filename", order="asc",
+                response_format=response_format,
+            )
+        assert result.total == 3
+        assert len(result.data) == 1
+        assert not any(s.lower().startswith("select count(") for s in statements)
+
+    beyond = query_optimization.get_files_with_pagination(test_db, page=5, page_size=2)
+    assert beyond.data == []
+
+    # 觸發器維護計數：刪除後總數隨之更新
+    test_db.delete(test_db.query(models.File).first())
+    test_db.commit()
+    assert query_optimization.file_count(test_db) == 2
+    assert beyond.total == 3
+
+
+def test_bulk_get_files_deduplicates_ids(test_db):
+    file_a = models.File(filename="a.txt", storage_key="/tmp/bulk-a", file_hash="9" * 64)
+    file_b = models.File(filename="b.txt", storage_key="/tmp/bulk-b", file_hash="8" * 64)
+    test_db.add_all([file_a, file_b])
+    test_db.commit()
+
+    files = query_optimization.bulk_get_files(test_db, [file_a.id, file_b.id, file_a.id, 999])
+    assert sorted(f.filename for f in files) == ["a.txt", "b.txt"]
+
+
+def test_pagination_result_is_plain_frozen_dataclass():
+    import dataclasses
+
+    import pytest
+    from pydantic import ValidationError
+
+    result = query_optimization.PaginationResult(data=[], total=0, page=1, page_size=10, total_pages=0)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        result.total = 1
+
+    with pytest.raises(ValidationError):
+        query_optimization.PaginationParams(page=1, offset=5)
+
+
+def test_stream_all_yields_every_row_in_chunks(test_db):
+    test_db.add_all(
+        [
+            models.File(filename=f"s{i}.txt", storage_key=f"/tmp/stream{i}", file_hash=f"{i:064x}")
+            for i in range(5)
+        ]
+    )
+    test_db.commit()
+
+    stmt = query_optimization.optimize_file_query(test_db).order_by(models.File.id)
+    streamed = query_optimization.stream_all(test_db, stmt, chunk_size=2)
+    assert [f.filename for f in streamed] == [f"s{i}.txt" for i in range(5)]
+
+
+def test_sort_columns_are_looked_up_from_mapping(test_db):
+    file_a = models.File(filename="a.txt", storage_key="/tmp/sort-a", file_hash="7" * 64)
+    file_b = models.File(filename="b.txt", storage_key="/tmp/sort-b", file_hash="6" * 64)
+    test_db.add_all([file_a, file_b])
+    test_db.commit()
+
+    data, _ = query_optimization.paginate(
+        test_db.query(models.File),
+        sort_by="filename",
+        order="desc",
+        sortable_columns=query_optimization.file_sort_columns(),
+    )
+    assert [f.filename for f in data] == ["b.txt", "a.txt"]
+
+    # 未知欄位退回 created_at 排序，仍可使用游標
+    result = query_optimization.get_files_with_pagination(test_db, page_size=1, sort_by="unknown")
+    assert result.next_cursor is not None
+
+
+def test_load_file_children_buckets_union_rows(test_db):
+    record = models.File(filename="kids.txt", storage_key="/tmp/kids", file_hash="5" * 64)
+    record.tags.append(models.Tag(name="kid-tag"))
+    record.annotations.append(models.Annotation(data={"phase": "beta"}, source="manual"))
+    test_db.add(record)
+    test_db.commit()
+    file_id = record.id
+
+    with query_optimization.count_queries(test_db.get_bind()) as statements:
+        tags, conclusions, annotations = query_optimization.load_file_children(test_db, [file_id])
+
+    assert len(statements) == 1
+    assert tags[record.id] == [{"id": record.tags[0].id, "name": "kid-tag"}]
+    assert conclusions[record.id] == []
+    assert annotations[record.id][0]["data"] == {"phase": "beta"}
+    assert annotations[record.id][0]["source"] == "manual"
+    assert query_optimization.load_file_children(test_db, []) == ({}, {}, {})
+
+
+def test_get_files_with_pagination_loads_list_columns_only(test_db):
+    from sqlalchemy import inspect as sa_inspect
+
+    test_db.add(models.File(filename="narrow.txt", storage_key="/tmp/narrow", file_hash="4" * 64))
+    test_db.commit()
+    test_db.expunge_all()
+
+    listed = query_optimization.get_files_with_pagination(test_db, page_size=10).data[0]
+    unloaded = sa_inspect(listed).unloaded
+    assert {"storage_key", "file_hash", "tags"} <= unloaded
+    assert "filename" not in unloaded
+    test_db.expunge_all()
+
+    detailed = query_optimization.get_files_with_pagination(test_db, page_size=10, detail=True).data[0]
+    assert not {"storage_key", "file_hash", "tags"} & sa_inspect(detailed).unloaded
+
+
+def test_paginate_accepts_select_statement(test_db):
+    import pytest
+
+    test_db.add_all(
+        [
+            models.File(filename=f"sel{i}.txt", storage_key=f"/tmp/sel{i}", file_hash=f"{i + 40:064x}")
+            for i in range(3)
+        ]
+    )
+    test_db.commit()
+
+    stmt = query_optimization.optimize_file_query(test_db)
+    data, total = query_optimization.paginate(stmt, page=1, page_size=2, sort_by="filename", order="asc", db=test_db)
+
+    assert total == 3
+    assert [f.filename for f in data] == ["sel0.txt", "sel1.txt"]
+    with pytest.raises(ValueError):
+        query_optimization.paginate(stmt)
+
+
+def test_optimize_file_query_reuses_statement_within_request(test_db):
+    import contextvars
+
+    def within_request():
+        query_optimization.reset_request_query_cache()
+        first = query_optimization.optimize_file_query(test_db)
+        assert query_optimization.optimize_file_query(test_db) is first
+        assert query_optimization.optimize_file_query(test_db, with_relations=False) is not first
+        return first
+
+    first = contextvars.copy_context().run(within_request)
+    # 新的請求（或請求範圍之外）重新建立語句
+    assert contextvars.copy_context().run(within_request) is not first
+    assert query_optimization.optimize_file_query(test_db) is not query_optimization.optimize_file_query(test_db)
@@ -414,6 +414,60 @@ def test_execute_with_timeout(monkeypatch):
     assert "timeout" in (result.error or "").lower()
 
 
+def test_execute_with_timeout_reuses_shared_pool():
+    """Nodes with a timeout run on one long-lived pool that close() releases."""
+    nodes = [
+        {
+            "node_id": f"input{i}",
+            "node_type": NodeType.DATA_INPUT.value,
+            "name": f"Input {i}",
+            "timeout": 5,
+            "config": {"source_type": "constant", "value": i, "data_type": "integer"},
+        }
+        for i in range(3)
+    ]
+    with ReasoningEngine(db_session=None, storage=None, max_workers=2) as engine:
+        result = engine.execute_chain(nodes=nodes)
+        pool = engine._timeout_pool
+        assert result["status"] == "completed"
+        assert pool is not None
+        assert len(pool._threads) <= 2
+    assert engine._timeout_pool is None
+
+
+def test_execute_with_timeout_does_not_queue_behind_hung_nodes(monkeypatch):
+    """Hung nodes holding every pool worker must not time out a healthy node that never started."""
+    release = threading.Event()
+
+    def fake_execute(node_config, inputs, global_input=None):
+        if node_config.get("node_id").startswith("hang"):
+            release.wait(timeout=10)
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output={"ok": True},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    def node(node_id, timeout):
+        return {"node_id": node_id, "node_type": NodeType.DATA_INPUT.value, "name": node_id, "timeout": timeout}
+
+    engine = ReasoningEngine(db_session=None, storage=None, max_workers=2)
+    monkeypatch.setattr(engine.executor, "execute", fake_execute)
+    try:
+        hung = engine.execute_chain(nodes=[node("hang1", 0.2), node("hang2", 0.2)])
+        assert [r["status"] for r in hung["results"].values()] == ["failed", "failed"]
+
+        healthy = engine.execute_chain(nodes=[node("healthy", 0.5)])
+        assert healthy["status"] == "completed"
+        assert healthy["results"]["healthy"]["status"] == NodeStatus.COMPLETED.value
+    finally:
+        release.set()
+        engine.close()
+
+
 def test_parallel_execution_overlaps(monkeypatch):
     """Parallel execution should allow concurrent node runs."""
     engine = ReasoningEngine(db_session=None, storage=None, enable_parallel=True, max_workers=2)
@@ -451,6 +505,186 @@ def test_parallel_execution_overlaps(monkeypatch):
     assert result["status"] == "completed"
 
 
+def test_parallel_execution_starts_longest_chain_first(monkeypatch):
+    """Ready nodes are submitted by critical-path length, not list order."""
+    engine = ReasoningEngine(db_session=None, storage=None, enable_parallel=True, max_workers=1)
+    started = []
+
+    def record_execute(node_config, inputs, global_input=None):
+        started.append(node_config.get("node_id"))
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output={"ok": True},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", record_execute)
+
+    nodes = [
+        {"node_id": "short", "node_type": NodeType.DATA_INPUT.value, "name": "Short"},
+        {"node_id": "head", "node_type": NodeType.DATA_INPUT.value, "name": "Head"},
+        {"node_id": "mid", "node_type": NodeType.TRANSFORM.value, "name": "Mid", "inputs": ["head"]},
+        {"node_id": "tail", "node_type": NodeType.OUTPUT.value, "name": "Tail", "inputs": ["mid"]},
+    ]
+
+    order, graph, _in_degree, _nodes_by_id, _inputs_by_id = engine._build_and_sort(nodes)
+    assert engine._critical_path_lengths(order, graph) == {"short": 1, "head": 3, "mid": 2, "tail": 1}
+
+    result = engine.execute_chain(nodes=nodes, enable_parallel=True, max_workers=1)
+    assert result["status"] == "completed"
+    # Single worker: critical-path nodes jump ahead of the short branch; equal lengths keep arrival order
+    assert started == ["head", "mid", "short", "tail"]
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_failed_node_skips_descendants(monkeypatch, parallel):
+    """Descendants of a failed node are SKIPPED without running or retrying."""
+    engine = ReasoningEngine(db_session=None, storage=None, max_workers=2)
+    started = []
+
+    def failing_execute(node_config, inputs, global_input=None):
+        node_id = node_config.get("node_id")
+        started.append(node_id)
+        return NodeResult(
+            node_id=node_id,
+            status=NodeStatus.FAILED if node_id == "broken" else NodeStatus.COMPLETED,
+            output={"ok": True},
+            error="boom" if node_id == "broken" else None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", failing_execute)
+
+    nodes = [
+        {"node_id": "source", "node_type": NodeType.DATA_INPUT.value, "name": "Source"},
+        {"node_id": "broken", "node_type": NodeType.TRANSFORM.value, "name": "Broken",
+         "inputs": ["source"], "retry_count": 2},
+        {"node_id": "child", "node_type": NodeType.TRANSFORM.value, "name": "Child",
+         "inputs": ["broken"], "retry_count": 2, "retry_delay_seconds": 5},
+        {"node_id": "grandchild", "node_type": NodeType.OUTPUT.value, "name": "Grandchild",
+         "inputs": ["child", "source"]},
+        {"node_id": "sibling", "node_type": NodeType.OUTPUT.value, "name": "Sibling", "inputs": ["source"]},
+    ]
+
+    # A skipped child never reaches its 2 x 5s retry backoff
+    result = engine.execute_chain(nodes=nodes, enable_parallel=parallel)
+
+    assert result["status"] == "failed"
+    assert sorted(set(started)) == ["broken", "sibling", "source"]
+    assert result["results"]["child"]["status"] == NodeStatus.SKIPPED.value
+    assert result["results"]["grandchild"]["status"] == NodeStatus.SKIPPED.value
+    assert result["results"]["sibling"]["status"] == NodeStatus.COMPLETED.value
+    assert [e.get("node_id") for e in result["errors"]] == ["broken"]
+
+
+def test_parallel_execution_submits_children_without_waiting_for_wave(monkeypatch):
+    """A child starts as soon as its parent finishes, while a slow sibling still runs."""
+    engine = ReasoningEngine(db_session=None, storage=None, enable_parallel=True, max_workers=2)
+    child_started = threading.Event()
+    observed = {}
+
+    def gated_execute(node_config, inputs, global_input=None):
+        node_id = node_config.get("node_id")
+        if node_id == "slow":
+            observed["child_ran_during_slow"] = child_started.wait(timeout=2)
+        elif node_id == "child":
+            child_started.set()
+        return NodeResult(
+            node_id=node_id,
+            status=NodeStatus.COMPLETED,
+            output={"ok": True},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", gated_execute)
+
+    nodes = [
+        {"node_id": "slow", "node_type": NodeType.DATA_INPUT.value, "name": "Slow"},
+        {"node_id": "fast", "node_type": NodeType.DATA_INPUT.value, "name": "Fast"},
+        {"node_id": "child", "node_type": NodeType.OUTPUT.value, "name": "Child", "inputs": ["fast"]},
+    ]
+
+    result = engine.execute_chain(nodes=nodes, enable_parallel=True, max_workers=2)
+    assert result["status"] == "completed"
+    assert observed["child_ran_during_slow"] is True
+
+
+def test_parallel_chain_timeout_returns_without_waiting_for_running_nodes(monkeypatch):
+    """A chain timeout returns promptly even while a node is still running."""
+    engine = ReasoningEngine(db_session=None, storage=None, enable_parallel=True, max_workers=2)
+    release = threading.Event()
+
+    def stuck_execute(node_config, inputs, global_input=None):
+        release.wait(timeout=10)
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output={"ok": True},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", stuck_execute)
+
+    nodes = [
+        {"node_id": "stuck", "node_type": NodeType.DATA_INPUT.value, "name": "Stuck"},
+        {"node_id": "after", "node_type": NodeType.OUTPUT.value, "name": "After", "inputs": ["stuck"]},
+    ]
+
+    started = time.monotonic()
+    try:
+        result = engine.execute_chain(nodes=nodes, timeout=1)
+    finally:
+        release.set()
+
+    assert time.monotonic() - started < 5
+    assert result["status"] == "failed"
+    assert result["results"] == {}
+    assert "timeout" in result["errors"][-1]["error"].lower()
+
+
+def test_parallel_execution_with_session_factory(monkeypatch, db_session):
+    """A session_factory keeps parallel mode on and gives each worker its own session."""
+    factory = sessionmaker(bind=db_session.get_bind())
+    engine = ReasoningEngine(
+        db_session=db_session, storage=None, enable_parallel=True, max_workers=2, session_factory=factory
+    )
+    barrier = threading.Barrier(2)
+    sessions = {}
+
+    def concurrent_execute(node_config, inputs, global_input=None):
+        barrier.wait(timeout=2)
+        sessions[node_config.get("node_id")] = engine.executor.current_session()
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output={"ok": True},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", concurrent_execute)
+
+    nodes = [
+        {"node_id": "n1", "node_type": NodeType.DATA_INPUT.value, "name": "N1"},
+        {"node_id": "n2", "node_type": NodeType.DATA_INPUT.value, "name": "N2"},
+    ]
+
+    result = engine.execute_chain(nodes=nodes)
+    assert result["status"] == "completed"
+    assert sessions["n1"] is not sessions["n2"]
+    assert db_session not in sessions.values()
+    assert engine.executor.current_session() is db_session
+
+
 def test_node_cache_hit(monkeypatch):
     """Ensure cache_key uses cached output on subsequent runs."""
     engine = ReasoningEngine(db_session=None, storage=None)
@@ -483,6 +717,86 @@ def test_node_cache_hit(monkeypatch):
     assert calls["count"] == 1
 
 
+def test_node_cache_is_bounded_lru(monkeypatch):
+    """The node cache evicts the least recently used key and accepts list keys."""
+    engine = ReasoningEngine(db_session=None, storage=None, cache_max=2)
+    calls = []
+
+    def fake_execute(node_config, inputs, global_input=None):
+        calls.append(node_config.get("node_id"))
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output={"node": node_config.get("node_id")},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", fake_execute)
+
+    def node(node_id, cache_key):
+        return {"node_id": node_id, "node_type": NodeType.DATA_INPUT.value, "cache_key": cache_key}
+
+    engine._execute_node(node("a", ["a", 1]), inputs={})
+    engine._execute_node(node("b", "b"), inputs={})
+    engine._execute_node(node("a", ["a", 1]), inputs={})  # hit; "b" is now least recent
+    engine._execute_node(node("c", "c"), inputs={})  # evicts "b"
+    engine._execute_node(node("b", "b"), inputs={})
+
+    assert calls == ["a", "b", "c", "b"]
+    assert len(engine.cache) == 2
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_cached_nodes_complete_without_worker_or_inputs(monkeypatch, parallel):
+    """Cache hits are resolved by the scheduler; only misses reach the executor."""
+    engine = ReasoningEngine(db_session=None, storage=None, max_workers=2)
+    executed = []
+
+    def fake_execute(node_config, inputs, global_input=None):
+        executed.append(node_config.get("node_id"))
+        return NodeResult(
+            node_id=node_config.get("node_id"),
+            status=NodeStatus.COMPLETED,
+            output={"from": node_config.get("node_id")},
+            error=None,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+
+    monkeypatch.setattr(engine.executor, "execute", fake_execute)
+    collected = []
+    original_collect = engine._collect_inputs
+    monkeypatch.setattr(
+        engine,
+        "_collect_inputs",
+        lambda node_config, results, input_ids=None: collected.append(node_config["node_id"])
+        or original_collect(node_config, results, input_ids),
+    )
+
+    nodes = [
+        {"node_id": "a", "node_type": NodeType.DATA_INPUT.value, "name": "A", "cache_key": "a"},
+        {"node_id": "b", "node_type": NodeType.TRANSFORM.value, "name": "B", "inputs": ["a"], "cache_key": "b"},
+        {"node_id": "c", "node_type": NodeType.OUTPUT.value, "name": "C", "inputs": ["b"]},
+    ]
+    engine.cache["a"] = {"from": "cache-a"}
+    engine.cache["b"] = {"from": "cache-b"}
+
+    result = engine.execute_chain(nodes=nodes, enable_parallel=parallel)
+
+    assert result["status"] == "completed"
+    assert result["results"]["b"]["output"] == {"from": "cache-b"}
+    assert executed == ["c"]
+    assert collected == ["c"]
+
+    # A chain made only of cache hits never submits work and does not time out
+    executed.clear()
+    result = engine.execute_chain(nodes=nodes[:2], enable_parallel=parallel)
+    assert result["status"] == "completed" and result["errors"] == []
+    assert executed == []
+
+
 def test_execution_record_persisted(db_session):
     """Ensure execution record is persisted when chain_id is provided."""
     chain = ReasoningChain(
@@ -542,6 +856,38 @@ def test_execution_record_error_log(db_session):
     assert saved[0].error_log
 
 
+def test_execution_record_persisted_in_background(tmp_path):
+    """async_persist writes the record on a writer thread and close() drains it."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'persist.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    chain = ReasoningChain(
+        name="Async Persist",
+        description="Background persistence test",
+        nodes=[{"node_id": "input", "node_type": "data_input"}],
+        is_template=0,
+    )
+    db.add(chain)
+    db.commit()
+
+    nodes = [
+        {
+            "node_id": "input",
+            "node_type": NodeType.DATA_INPUT.value,
+            "name": "Constant",
+            "config": {"source_type": "constant", "value": 7},
+        }
+    ]
+    with ReasoningEngine(db_session=db, storage=None, async_persist=True) as reasoning:
+        result = reasoning.execute_chain(nodes=nodes, chain_id=str(chain.id))
+    assert result["status"] == "completed"
+
+    saved = db.query(ReasoningExecution).filter(ReasoningExecution.chain_id == chain.id).all()
+    assert len(saved) == 1
+    db.close()
+    engine.dispose()
+
+
 def test_data_input_environment(monkeypatch):
     """Ensure environment data input works."""
     monkeypatch.setenv("LF_TEST_ENV", "hello")
@@ -828,6 +1174,60 @@ def test_node_executor_accepts_enum_type():
     assert result.status == NodeStatus.COMPLETED
 
 
+def test_node_executor_normalizes_type_case_and_times_failures():
+    """String node types are matched case-insensitively; failures carry elapsed time."""
+    executor = ReasoningEngine().executor
+    result = executor.execute(
+        {
+            "node_id": "input",
+            "node_type": "DATA_INPUT",
+            "name": "Input",
+            "config": {"source_type": "constant", "value": 1, "data_type": "integer"},
+        },
+        inputs={},
+        global_input=None,
+    )
+    assert result.status == NodeStatus.COMPLETED
+
+    failed = executor.execute({"node_id": "x", "node_type": "nope"}, inputs={}, global_input=None)
+    assert failed.status == NodeStatus.FAILED
+    assert failed.execution_time_ms >= 0
+    assert failed.started_at <= failed.completed_at
+
+
+def test_node_executor_validates_each_config_once(monkeypatch):
+    """Retries and repeated runs reuse the validated config object."""
+    from app.reasoning_engine import engine as engine_module
+
+    calls = []
+    original = engine_module.validate_node_config
+    monkeypatch.setattr(engine_module, "validate_node_config", lambda cfg: calls.append(cfg) or original(cfg))
+
+    executor = ReasoningEngine().executor
+    node_config = {
+        "node_id": "input",
+        "node_type": NodeType.DATA_INPUT.value,
+        "name": "Input",
+        "config": {"source_type": "constant", "value": 1, "data_type": "integer"},
+    }
+    first = executor.execute(node_config, inputs={}, global_input=None)
+    second = executor.execute(node_config, inputs={}, global_input=None)
+    assert first.status == second.status == NodeStatus.COMPLETED
+    assert len(calls) == 1
+
+    # An equal but distinct dict is validated on its own
+    executor.execute(dict(node_config), inputs={}, global_input=None)
+    assert len(calls) == 2
+
+
+def test_node_executor_dispatches_every_node_type():
+    """Every NodeType has a prebound handler in the dispatch table."""
+    executor = ReasoningEngine().executor
+    assert set(executor._dispatch) == {node_type.value for node_type in NodeType}
+    _config_cls, handler = executor._dispatch[NodeType.OUTPUT.value]
+    assert handler == executor.output_handler.execute
+
+
 def test_transform_map_multiply():
     """Transform map multiply operation."""
     nodes = [
@@ -2437,6 +2837,33 @@ def test_output_raw_format():
     assert result["results"]["raw"]["output"] == {"input": 10}
 
 
+def test_execute_chain_normalizes_inputs_once(monkeypatch):
+    """execute_chain parses node inputs once and reuses them when collecting inputs."""
+    nodes = [
+        {
+            "node_id": "input",
+            "node_type": NodeType.DATA_INPUT.value,
+            "name": "Input",
+            "config": {"source_type": "constant", "value": 10, "data_type": "integer"},
+        },
+        {
+            "node_id": "raw",
+            "node_type": NodeType.OUTPUT.value,
+            "name": "Raw",
+            "inputs": ["input"],
+            "config": {"output_format": "raw"},
+        },
+    ]
+    engine = ReasoningEngine(db_session=None, storage=None)
+    calls = []
+    original = engine._extract_input_ids
+    monkeypatch.setattr(engine, "_extract_input_ids", lambda inputs: calls.append(inputs) or original(inputs))
+
+    result = engine.execute_chain(nodes=nodes)
+    assert result["results"]["raw"]["output"] == {"input": 10}
+    assert len(calls) == len(nodes)
+
+
 def test_validate_dag_duplicate_ids():
     """Ensure duplicate node IDs are rejected."""
     engine = ReasoningEngine()
@@ -2488,6 +2915,35 @@ def test_topological_sort_cycle_error():
         engine._topological_sort(nodes)
 
 
+def test_topological_sort_deep_chain_without_recursion():
+    """A long linear chain sorts iteratively, well past the recursion limit."""
+    engine = ReasoningEngine()
+    depth = 5000
+    nodes = [{"node_id": "n0", "node_type": "data_input"}] + [
+        {"node_id": f"n{i}", "node_type": "transform", "inputs": [f"n{i - 1}"]}
+        for i in range(1, depth)
+    ]
+    order, graph, in_degree, nodes_by_id, inputs_by_id = engine._build_and_sort(nodes)
+    assert order == [f"n{i}" for i in range(depth)]
+    assert graph["n0"] == ["n1"]
+    assert graph[f"n{depth - 1}"] == [] and len(graph) == depth
+    assert in_degree["n0"] == 0 and in_degree["n1"] == 1
+    assert nodes_by_id["n0"] is nodes[0]
+    assert inputs_by_id["n0"] == () and inputs_by_id["n1"] == ("n0",)
+
+
+def test_validate_dag_detects_deep_cycle_without_recursion():
+    """A cycle closing a very long chain is rejected without RecursionError."""
+    engine = ReasoningEngine()
+    depth = 5000
+    nodes = [
+        {"node_id": f"n{i}", "node_type": "transform", "inputs": [f"n{(i - 1) % depth}"]}
+        for i in range(depth)
+    ]
+    with pytest.raises(DAGValidationError):
+        engine._validate_dag(nodes)
+
+
 def test_execute_chain_empty_nodes_failed():
     """execute_chain should fail for empty node list."""
     engine = ReasoningEngine()
@@ -74,3 +74,15 @@ def test_get_current_admin_forbidden():
 def test_get_current_admin_allows():
     user = {"id": 1, "role": "admin"}
     assert security.get_current_admin(user) == user
+
+
+def test_require_online_user_rejects_offline():
+    offline = {"id": 0, "role": "offline", "is_offline": True}
+    with pytest.raises(HTTPException) as exc:
+        security.require_online_user(offline)
+    assert exc.value.status_code == 403
+
+
+def test_require_online_user_passes_through():
+    user = {"id": 1, "role": "editor", "is_offline": False}
+    assert security.require_online_user(user) is user
@@ -2,6 +2,7 @@
 Additional coverage for script_service and reasoning_service.
 """
 
+from types import SimpleNamespace
 from uuid import uuid4
 
 import pytest
@@ -271,6 +272,47 @@ def test_reasoning_service_template_only_and_errors(test_db, monkeypatch):
     assert execution.error_log
 
 
+@pytest.mark.unit
+def test_reasoning_service_runs_nodes_in_parallel_on_worker_sessions(test_db, monkeypatch):
+    user = _create_user(test_db)
+    service = ReasoningService(test_db)
+    assert service.engine.enable_parallel is True
+    # Worker sessions come from a factory bound to the request session's engine
+    assert service.engine.session_factory.kw["bind"] is test_db.get_bind()
+
+    bound_sessions = []
+    bind_session = service.engine.executor.bind_session
+
+    def record_bind(session):
+        if session is not None:
+            bound_sessions.append(session)
+        bind_session(session)
+
+    monkeypatch.setattr(service.engine.executor, "bind_session", record_bind)
+
+    chain = service.create_chain(
+        name="parallel",
+        description="",
+        nodes=[
+            {"node_id": "a", "node_type": "data_input", "name": "A", "config": {"source_type": "constant", "value": 2}},
+            {"node_id": "b", "node_type": "data_input", "name": "B", "config": {"source_type": "constant", "value": 3}},
+            {
+                "node_id": "out",
+                "node_type": "output",
+                "name": "Out",
+                "inputs": ["a", "b"],
+                "config": {"output_format": "selected", "fields": ["a", "b"]},
+            },
+        ],
+        created_by_id=user.id,
+    )
+    execution = service.execute_chain(chain.id, {}, user_id=user.id)
+
+    assert execution.status == "completed"
+    assert len(bound_sessions) == 3
+    assert all(session is not test_db for session in bound_sessions)
+
+
 def test_reasoning_service_cache_and_db_errors(test_db, monkeypatch):
     user = _create_user(test_db)
     service = ReasoningService(test_db)
@@ -336,6 +378,23 @@ def test_reasoning_service_helpers_and_db_errors(test_db, monkeypatch):
     assert service.get_execution_history(uuid4()) == {}
 
 
+def test_reasoning_service_validate_chain_structure_single_pass(test_db):
+    service = ReasoningService(test_db)
+
+    with pytest.raises(InvalidChainError, match="Duplicate node IDs"):
+        service._validate_chain_structure([
+            {"node_id": "n1", "node_type": "data_input"},
+            {"node_id": "n1", "node_type": "output"},
+        ])
+    with pytest.raises(InvalidChainError, match="Invalid node type"):
+        service._validate_chain_structure([{"node_id": "n1", "node_type": "bogus"}])
+
+    service._validate_chain_structure([
+        {"node_id": "n1", "node_type": "data_input"},
+        {"node_id": "n2", "node_type": "output", "inputs": ["n1"]},
+    ])
+
+
 def test_reasoning_service_execute_with_errors(test_db, monkeypatch):
     user = _create_user(test_db)
     service = ReasoningService(test_db)
@@ -400,3 +459,84 @@ def test_reasoning_service_get_execution_cached(test_db, monkeypatch):
     monkeypatch.setattr(service.cache, "get", lambda key: execution)
     cached = service.get_execution(execution.id)
     assert cached.id == execution.id
+
+
+def test_reasoning_service_bulk_log_executions(test_db):
+    user = _create_user(test_db)
+    service = ReasoningService(test_db)
+    chain = service.create_chain(
+        name="bulk-log", description="", nodes=_basic_nodes(), created_by_id=user.id
+    )
+
+    written = service.bulk_log_executions(
+        [
+            {"chain_id": chain.id, "user_id": user.id, "results": {"n2": {"value": i}}}
+            for i in range(5)
+        ],
+        chunk_size=2,
+    )
+    assert written == 5
+    stored = test_db.query(models.ReasoningExecution).filter_by(chain_id=chain.id).all()
+    assert len(stored) == 5
+    assert {e.status for e in stored} == {"completed"}
+    assert sorted(e.results["n2"]["value"] for e in stored) == [0, 1, 2, 3, 4]
+
+    with pytest.raises(ReasoningServiceError):
+        service.bulk_log_executions([{"chain_id": chain.id, "status": "bogus"}])
+
+
+def test_reasoning_service_copy_executions_keeps_empty_strings_distinct_from_null(test_db):
+    service = ReasoningService(test_db)
+    copied = {}
+
+    class FakeCursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def copy_expert(self, sql, buffer):
+            copied["sql"] = sql
+            copied["rows"] = buffer.getvalue().splitlines()
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+
+    row = {column: None for column in service.EXECUTION_LOG_COLUMNS}
+    row.update(id="abc", status="failed", error_log="", results={"say": 'a "quote"'})
+    service._copy_executions(FakeConnection(), [row])
+
+    assert copied["sql"].endswith("FROM STDIN WITH CSV")
+    fields = dict(zip(service.EXECUTION_LOG_COLUMNS, copied["rows"][0].split(",")))
+    assert fields["id"] == '"abc"'
+    assert fields["error_log"] == '""'  # quoted empty string, not NULL
+    assert fields["user_id"] == ""  # unquoted empty field -> NULL
+    assert fields["results"] == '"{""say"": ""a \\""quote\\""""}"'
+
+
+def test_reasoning_service_bulk_log_wraps_copy_driver_errors(test_db, monkeypatch):
+    service = ReasoningService(test_db)
+
+    class DriverError(Exception):
+        pass
+
+    fake_bind = SimpleNamespace(
+        dialect=SimpleNamespace(driver="psycopg2", loaded_dbapi=SimpleNamespace(Error=DriverError))
+    )
+    monkeypatch.setattr(test_db, "get_bind", lambda *args, **kwargs: fake_bind)
+    monkeypatch.setattr(
+        test_db, "connection", lambda *args, **kwargs: SimpleNamespace(connection=SimpleNamespace(dbapi_connection=None))
+    )
+
+    def failing_copy(dbapi_connection, rows):
+        raise DriverError("COPY failed")
+
+    rolled_back = []
+    monkeypatch.setattr(service, "_copy_executions", failing_copy)
+    monkeypatch.setattr(test_db, "rollback", lambda: rolled_back.append(True))
+
+    with pytest.raises(ReasoningServiceError, match="COPY failed"):
+        service.bulk_log_executions([{"chain_id": uuid4()}])
+    assert rolled_back == [True]
@@ -125,6 +125,59 @@ def test_sync_with_valid_file():
         db.close()
 
 
+def test_sync_streams_in_small_batches(monkeypatch):
+    """測試分批讀取 - 批次小於記錄數時結果不變"""
+    import app.main as main
+
+    monkeypatch.setattr(main, "STREAM_BATCH_SIZE", 2)
+    db = SessionLocal()
+    db.query(models.File).delete()
+    db.commit()
+
+    test_file_path = "data/managed/test_sync_batch.txt"
+    os.makedirs(os.path.dirname(test_file_path), exist_ok=True)
+    with open(test_file_path, "w") as f:
+        f.write("batch content")
+
+    try:
+        db.add(
+            models.File(
+                filename="test_sync_batch.txt",
+                storage_key=test_file_path,
+                file_hash="2" * 64,
+            )
+        )
+        for index in range(5):
+            db.add(
+                models.File(
+                    filename=f"missing_{index}.txt",
+                    storage_key=f"data/managed/missing_{index}.txt",
+                    file_hash=str(index + 3) * 64,
+                )
+            )
+        db.commit()
+
+        data = client.get("/admin/file-status/").json()
+        assert data["total_db_records"] == 6
+        assert data["valid_files"] == 1
+        assert data["orphaned_files"] == 5
+
+        result = client.post("/admin/sync-files/").json()
+        assert result["status"] == "success"
+        assert result["deleted_files"] == 5
+
+        data = client.get("/admin/file-status/").json()
+        assert data["total_db_records"] == 1
+        assert data["orphaned_files"] == 0
+
+    finally:
+        if os.path.exists(test_file_path):
+            os.remove(test_file_path)
+        db.query(models.File).delete()
+        db.commit()
+        db.close()
+
+
 if __name__ == "__main__":
     test_file_status_empty()
     test_sync_files_with_orphaned()
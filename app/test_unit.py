@@ -11,6 +11,7 @@
 
 import os
 import tempfile
+import time
 from io import BytesIO
 
 import pytest
@@ -18,6 +19,7 @@ import pytest
 from app import security
 
 # 導入被測試的模組
+from app.annotation import LocalAnnotationProvider
 from app.models import Annotation, File, RoleEnum, Tag, User
 from app.storage import LocalStorage
 
@@ -236,6 +238,23 @@ class TestAnnotationModel:
             test_db.add(annotation)
             test_db.commit()
 
+    def test_local_provider_returns_column_dicts(self, test_db):
+        """測試本地供應商以欄位字典回傳標註"""
+        file = File(
+            filename="test.txt", storage_key="/data/test.txt", file_hash="a" * 64
+        )
+        test_db.add(file)
+        test_db.commit()
+
+        provider = LocalAnnotationProvider()
+        provider.add_annotation(test_db, file.id, {"phase": "alpha"}, "manual")
+
+        annotations = provider.get_annotations(test_db, file.id)
+        assert len(annotations) == 1
+        assert isinstance(annotations[0], dict)
+        assert annotations[0]["data"] == {"phase": "alpha"}
+        assert set(annotations[0]) == {"id", "file_id", "data", "source", "created_at"}
+
 
 # ============================================================================
 # LocalStorage 測試
@@ -303,6 +322,133 @@ class TestLocalStorage:
         assert not os.path.exists(storage_key)
 
 
+    @pytest.mark.asyncio
+    async def test_file_save_sharded_by_hash(self, temp_storage):
+        """測試檔案依 hash 前綴分層儲存"""
+        import hashlib
+
+        storage, tmpdir = temp_storage
+        test_content = b"Sharded content"
+        file_hash = hashlib.sha256(test_content).hexdigest()
+        mock_file = self._create_mock_file(test_content)
+
+        storage_key = await storage.save(mock_file)
+
+        assert storage_key == os.path.join(
+            tmpdir, file_hash[:2], file_hash[2:4], f"{file_hash}.bin"
+        )
+        assert os.path.exists(storage_key)
+
+    def test_scan_existing_reuses_unchanged_directories(self, temp_storage, monkeypatch):
+        """測試目錄 mtime 未變時重用掃描結果，變動後重新掃描"""
+        storage, tmpdir = temp_storage
+        first = os.path.join(tmpdir, "first.bin")
+        with open(first, "wb") as f:
+            f.write(b"1")
+        # 目錄 mtime 早於掃描時間超過容許範圍才會快取
+        old_mtime_ns = time.time_ns() - 60 * 1_000_000_000
+        os.utime(tmpdir, ns=(old_mtime_ns, old_mtime_ns))
+
+        assert os.path.abspath(first) in storage.scan_existing()
+
+        calls = {"count": 0}
+        real_scandir = os.scandir
+
+        def counting_scandir(path):
+            calls["count"] += 1
+            return real_scandir(path)
+
+        monkeypatch.setattr(os, "scandir", counting_scandir)
+        assert os.path.abspath(first) in storage.scan_existing()
+        assert calls["count"] == 0
+
+        os.remove(first)
+        assert os.path.abspath(first) not in storage.scan_existing()
+        assert calls["count"] == 1
+
+    def test_scan_existing_does_not_cache_recently_modified_directories(self, temp_storage):
+        """測試 mtime 精度較粗時，同一時間刻度內新增的檔案不會被快取漏掉"""
+        storage, tmpdir = temp_storage
+        first = os.path.join(tmpdir, "first.bin")
+        with open(first, "wb") as f:
+            f.write(b"1")
+        stat = os.stat(tmpdir)
+
+        assert storage.scan_existing() == {os.path.abspath(first)}
+
+        # 模擬粗精度檔案系統：新增檔案後目錄 mtime 不變
+        second = os.path.join(tmpdir, "second.bin")
+        with open(second, "wb") as f:
+            f.write(b"2")
+        os.utime(tmpdir, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert storage.scan_existing() == {os.path.abspath(first), os.path.abspath(second)}
+
+    def test_scan_existing_parallel_levels(self, temp_storage):
+        """測試目錄數量較多時並行掃描的結果與逐一掃描一致"""
+        from app import storage as storage_module
+
+        storage, tmpdir = temp_storage
+        expected = set()
+        for index in range(storage_module.PARALLEL_SCAN_THRESHOLD * 2):
+            file_hash = f"{index:02x}" * 32
+            path = storage.path_for_hash(file_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x")
+            expected.add(os.path.abspath(path))
+
+        assert storage.scan_existing() == expected
+
+    def test_relocate_flat_file(self, temp_storage):
+        """測試舊版平鋪檔案放到分層路徑：原檔保留到呼叫端刪除，重複執行沿用既有目標"""
+        storage, tmpdir = temp_storage
+        file_hash = "ab" * 32
+        flat_path = os.path.join(tmpdir, f"{file_hash}.bin")
+        with open(flat_path, "wb") as f:
+            f.write(b"legacy")
+
+        new_key = storage.relocate(flat_path, file_hash)
+
+        assert new_key == storage.path_for_hash(file_hash)
+        assert os.path.exists(flat_path)
+        assert storage.relocate(flat_path, file_hash) == new_key
+        storage.delete(flat_path)
+        assert storage.load(new_key) == b"legacy"
+        assert storage.relocate(new_key, file_hash) == new_key
+
+    def test_delete_many(self, temp_storage):
+        """測試並行批次刪除：不存在的檔案略過，無法刪除的路徑回報錯誤"""
+        storage, tmpdir = temp_storage
+        paths = []
+        for index in range(3):
+            path = os.path.join(tmpdir, f"file{index}.bin")
+            with open(path, "wb") as f:
+                f.write(b"x")
+            paths.append(path)
+        directory = os.path.join(tmpdir, "subdir")
+        os.makedirs(directory)
+
+        failures = storage.delete_many(
+            paths + [paths[0], os.path.join(tmpdir, "missing.bin"), directory, ""]
+        )
+
+        assert list(failures) == [directory]
+        assert not any(os.path.exists(path) for path in paths)
+
+
+    @pytest.mark.asyncio
+    async def test_scan_existing_includes_sharded_files(self, temp_storage):
+        """測試一次掃描可找到分層目錄中的檔案"""
+        storage, tmpdir = temp_storage
+        storage_key = await storage.save(self._create_mock_file(b"scan me"))
+
+        existing = storage.scan_existing()
+
+        assert os.path.abspath(storage_key) in existing
+        assert os.path.join(os.path.abspath(tmpdir), "missing.bin") not in existing
+
+
 # ============================================================================
 # 檔案 Hash 測試
 # ============================================================================
@@ -345,6 +491,24 @@ class TestFileHash:
 
         assert hash1 != hash2
 
+    @pytest.mark.asyncio
+    async def test_calculate_file_hash_upload_file(self):
+        """測試以分塊方式計算上傳檔案 hash 並重置指針"""
+        import hashlib
+
+        from starlette.datastructures import UploadFile
+
+        from app.storage import HASH_CHUNK_SIZE, calculate_file_hash
+
+        test_content = b"x" * (HASH_CHUNK_SIZE * 2 + 7)
+        upload = UploadFile(file=BytesIO(test_content), filename="big.bin")
+        await upload.read(10)
+
+        file_hash = await calculate_file_hash(upload)
+
+        assert file_hash == hashlib.sha256(test_content).hexdigest()
+        assert await upload.read() == test_content
+
 
 # ============================================================================
 # 安全函數測試
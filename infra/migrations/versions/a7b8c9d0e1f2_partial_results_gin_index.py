@@ -0,0 +1,57 @@
+"""limit the reasoning results gin index to completed executions
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, Sequence[str], None] = "f6a7b8c9d0e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = "idx_exec_results_gin"
+TABLE = "reasoning_executions"
+
+
+def _create(where=None) -> None:
+    op.create_index(
+        INDEX,
+        TABLE,
+        ["results"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"results": "jsonb_path_ops"},
+        postgresql_where=where,
+        if_not_exists=True,
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema - rebuild the results GIN index as a partial index.
+
+    Only completed executions are searched by result metrics, so the index
+    skips pending, running and failed rows.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not sa.inspect(bind).has_table(TABLE):
+        return
+
+    op.drop_index(INDEX, table_name=TABLE, if_exists=True)
+    _create(where=sa.text("status = 'completed'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not sa.inspect(bind).has_table(TABLE):
+        return
+
+    op.drop_index(INDEX, table_name=TABLE, if_exists=True)
+    _create()
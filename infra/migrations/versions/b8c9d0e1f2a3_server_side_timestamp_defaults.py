@@ -0,0 +1,59 @@
+"""generate reasoning/script timestamps on the database server
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, Sequence[str], None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TIMESTAMP_COLUMNS = {
+    "reasoning_nodes": ["created_at", "updated_at"],
+    "reasoning_executions": ["started_at"],
+    "scripts": ["created_at", "updated_at"],
+    "script_executions": ["started_at"],
+}
+
+
+def _set_defaults(server_default) -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        # batch mode recreates the table on SQLite, which cannot ALTER a default
+        with op.batch_alter_table(table, reflect_kwargs={"resolve_fks": False}) as batch_op:
+            for column in columns:
+                batch_op.alter_column(
+                    column,
+                    existing_type=sa.DateTime(timezone=True),
+                    existing_nullable=False,
+                    server_default=server_default,
+                )
+
+
+def upgrade() -> None:
+    """Upgrade schema - default the insert timestamps to now() on the server.
+
+    Rows written with Core/executemany or COPY no longer need a
+    Python-generated datetime bound per row. SQLite's CURRENT_TIMESTAMP only
+    has one-second resolution, so SQLite gets a millisecond strftime default
+    (matching models.server_now) to keep rows sortable by insert time.
+    """
+    if op.get_bind().dialect.name == "sqlite":
+        _set_defaults(sa.text("(strftime('%Y-%m-%d %H:%M:%f', 'now'))"))
+    else:
+        _set_defaults(sa.func.now())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _set_defaults(None)
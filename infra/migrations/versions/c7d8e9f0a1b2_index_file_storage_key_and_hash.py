@@ -0,0 +1,44 @@
+"""index files.storage_key and files.file_hash
+
+Revision ID: c7d8e9f0a1b2
+Revises: b1c2d3e4f5a6
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d8e9f0a1b2"
+down_revision: Union[str, Sequence[str], None] = "b1c2d3e4f5a6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - ensure the lookup indexes used by sync/dedupe exist.
+
+    The models declare both columns as unique+indexed, but databases created
+    before that (or by hand) may lack them, leaving sync_files' storage_key
+    join and batch upload's file_hash IN lookup as full table scans.
+    """
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("files"):
+        # Fresh database: create_all builds the table with its indexes.
+        return
+
+    def column_indexed(table: str, column: str) -> bool:
+        indexes = inspector.get_indexes(table) + inspector.get_unique_constraints(table)
+        return any(index["column_names"] == [column] for index in indexes)
+
+    if not column_indexed("files", "storage_key"):
+        op.create_index("ix_files_storage_key", "files", ["storage_key"], unique=True)
+    if not column_indexed("files", "file_hash"):
+        op.create_index("ix_files_file_hash", "files", ["file_hash"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema - no-op; both indexes are part of the File model."""
+    pass
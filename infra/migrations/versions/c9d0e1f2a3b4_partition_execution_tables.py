@@ -0,0 +1,148 @@
+"""partition execution log tables by started_at month
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c9d0e1f2a3b4"
+down_revision: Union[str, Sequence[str], None] = "b8c9d0e1f2a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 2
+
+FOREIGN_KEYS = {
+    "reasoning_executions": [
+        "FOREIGN KEY (chain_id) REFERENCES reasoning_chains (id)",
+        "FOREIGN KEY (user_id) REFERENCES users (id)",
+    ],
+    "script_executions": [
+        "FOREIGN KEY (script_id) REFERENCES scripts (id)",
+    ],
+}
+
+INDEXES = {
+    "reasoning_executions": [
+        "CREATE INDEX ix_reasoning_executions_chain_id ON reasoning_executions (chain_id)",
+        "CREATE INDEX ix_reasoning_executions_user_id ON reasoning_executions (user_id)",
+        "CREATE INDEX ix_reasoning_executions_model_name ON reasoning_executions (model_name)",
+        "CREATE INDEX ix_reasoning_executions_tool_name ON reasoning_executions (tool_name)",
+        "CREATE INDEX ix_reasoning_executions_status ON reasoning_executions (status)",
+        "CREATE INDEX idx_execution_chain_status ON reasoning_executions (chain_id, status)",
+        "CREATE INDEX idx_execution_started ON reasoning_executions (started_at)",
+        "CREATE INDEX idx_execution_status ON reasoning_executions (status)",
+        "CREATE INDEX idx_execution_user_started ON reasoning_executions (user_id, started_at)",
+        "CREATE INDEX idx_exec_results_gin ON reasoning_executions "
+        "USING gin (results jsonb_path_ops) WHERE status = 'completed'",
+        "CREATE INDEX idx_exec_input_data_gin ON reasoning_executions "
+        "USING gin (input_data jsonb_path_ops)",
+    ],
+    "script_executions": [
+        "CREATE INDEX ix_script_executions_script_id ON script_executions (script_id)",
+        "CREATE INDEX ix_script_executions_status ON script_executions (status)",
+        "CREATE INDEX idx_script_exec_script_status ON script_executions (script_id, status)",
+        "CREATE INDEX idx_script_exec_started ON script_executions (started_at)",
+        "CREATE INDEX idx_script_exec_input_params_gin ON script_executions "
+        "USING gin (input_params jsonb_path_ops)",
+        "CREATE INDEX idx_script_exec_result_gin ON script_executions "
+        "USING gin (result jsonb_path_ops)",
+    ],
+}
+
+
+def _month_start(year: int, month: int) -> datetime:
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _create_partitions(table: str, first: datetime) -> None:
+    now = datetime.now(timezone.utc)
+    last = _month_start(now.year, now.month + MONTHS_AHEAD)
+    year, month = first.year, first.month
+    while _month_start(year, month) <= last:
+        start, end = _month_start(year, month), _month_start(year, month + 1)
+        op.execute(
+            f"CREATE TABLE {table}_{start:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        year, month = end.year, end.month
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _is_partitioned(bind, table: str) -> bool:
+    return bool(
+        bind.execute(
+            sa.text(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": table},
+        ).scalar()
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema - rebuild execution logs as monthly range partitions.
+
+    Each table is renamed, recreated with PARTITION BY RANGE (started_at) and
+    a (id, started_at) primary key, given partitions from its oldest row up to
+    MONTHS_AHEAD months ahead plus a DEFAULT partition, and refilled.
+    PostgreSQL only.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    inspector = sa.inspect(bind)
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        if not inspector.has_table(table) or _is_partitioned(bind, table):
+            continue
+
+        legacy = f"{table}_unpartitioned"
+        op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (started_at)"
+        )
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, started_at)")
+        for foreign_key in foreign_keys:
+            op.execute(f"ALTER TABLE {table} ADD {foreign_key}")
+
+        oldest = bind.execute(sa.text(f"SELECT min(started_at) FROM {legacy}")).scalar()
+        _create_partitions(table, oldest or datetime.now(timezone.utc))
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+        op.execute(f"DROP TABLE {legacy}")
+        for index in INDEXES[table]:
+            op.execute(index)
+
+
+def downgrade() -> None:
+    """Downgrade schema - copy the rows back into plain tables."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        if not _is_partitioned(bind, table):
+            continue
+
+        partitioned = f"{table}_partitioned"
+        op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        for foreign_key in foreign_keys:
+            op.execute(f"ALTER TABLE {table} ADD {foreign_key}")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+        op.execute(f"DROP TABLE {partitioned} CASCADE")
+        for index in INDEXES[table]:
+            op.execute(index)
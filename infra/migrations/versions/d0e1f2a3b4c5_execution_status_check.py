@@ -0,0 +1,52 @@
+"""add CHECK constraints on execution status columns
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d0e1f2a3b4c5"
+down_revision: Union[str, Sequence[str], None] = "c9d0e1f2a3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUS_CHECKS = {
+    "reasoning_executions": (
+        "ck_reasoning_execution_status",
+        "status IN ('completed', 'failed', 'pending', 'running')",
+    ),
+    "script_executions": (
+        "ck_script_execution_status",
+        "status IN ('completed', 'failed', 'running')",
+    ),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema - enforce allowed execution statuses in the database.
+
+    Bulk writers (COPY, executemany) bypass the ORM validators.
+    """
+    inspector = sa.inspect(op.get_bind())
+    for table, (name, condition) in STATUS_CHECKS.items():
+        if not inspector.has_table(table):
+            continue
+        # batch mode recreates the table on SQLite, which cannot ADD CONSTRAINT
+        with op.batch_alter_table(table, reflect_kwargs={"resolve_fks": False}) as batch_op:
+            batch_op.create_check_constraint(name, condition)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for table, (name, _condition) in STATUS_CHECKS.items():
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table, reflect_kwargs={"resolve_fks": False}) as batch_op:
+            batch_op.drop_constraint(name, type_="check")
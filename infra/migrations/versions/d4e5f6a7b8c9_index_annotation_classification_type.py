@@ -0,0 +1,49 @@
+"""index auto_classification annotations by file_type
+
+Revision ID: d4e5f6a7b8c9
+Revises: c7d8e9f0a1b2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d4e5f6a7b8c9"
+down_revision: Union[str, Sequence[str], None] = "c7d8e9f0a1b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_annotations_classification_file_type"
+
+
+def upgrade() -> None:
+    """Upgrade schema - partial expression index for /classification/stats.
+
+    The stats endpoint groups auto_classification annotations by
+    data.classification.file_type; indexing that expression lets the
+    database answer the GROUP BY without reading every JSON blob.
+    """
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("annotations"):
+        return
+
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        expression = "(CAST(data #>> '{classification, file_type}' AS VARCHAR))"
+    elif dialect == "sqlite":
+        expression = "json_extract(data, '$.\"classification\".\"file_type\"')"
+    else:
+        return
+
+    op.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON annotations ({expression}) "
+        "WHERE source = 'auto_classification'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
@@ -0,0 +1,88 @@
+"""add trigger-maintained file_stats counter
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e1f2a3b4c5d6"
+down_revision: Union[str, Sequence[str], None] = "d0e1f2a3b4c5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGERS = {
+    "postgresql": (
+        """
+        CREATE OR REPLACE FUNCTION bump_file_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE file_stats SET total = total + 1 WHERE id = 1;
+            ELSE
+                UPDATE file_stats SET total = total - 1 WHERE id = 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_file_stats ON files",
+        "CREATE TRIGGER trg_file_stats AFTER INSERT OR DELETE ON files "
+        "FOR EACH ROW EXECUTE FUNCTION bump_file_stats()",
+    ),
+    "sqlite": (
+        "CREATE TRIGGER IF NOT EXISTS trg_file_stats_insert AFTER INSERT ON files "
+        "BEGIN UPDATE file_stats SET total = total + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_file_stats_delete AFTER DELETE ON files "
+        "BEGIN UPDATE file_stats SET total = total - 1 WHERE id = 1; END",
+    ),
+}
+
+DROP_TRIGGERS = {
+    "postgresql": (
+        "DROP TRIGGER IF EXISTS trg_file_stats ON files",
+        "DROP FUNCTION IF EXISTS bump_file_stats()",
+    ),
+    "sqlite": (
+        "DROP TRIGGER IF EXISTS trg_file_stats_insert",
+        "DROP TRIGGER IF EXISTS trg_file_stats_delete",
+    ),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema - keep the file count in a single-row table.
+
+    Triggers on files bump the counter, so list totals become a
+    primary-key lookup instead of COUNT(*) over files.
+    """
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("file_stats"):
+        op.create_table(
+            "file_stats",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("total", sa.BigInteger(), server_default=sa.text("0"), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    statements = TRIGGERS.get(bind.dialect.name)
+    if statements is None or not inspector.has_table("files"):
+        return
+    for statement in statements:
+        bind.exec_driver_sql(statement)
+    bind.exec_driver_sql(
+        "INSERT INTO file_stats (id, total) SELECT 1, (SELECT COUNT(*) FROM files) "
+        "WHERE NOT EXISTS (SELECT 1 FROM file_stats WHERE id = 1)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for statement in DROP_TRIGGERS.get(bind.dialect.name, ()):
+        bind.exec_driver_sql(statement)
+    op.drop_table("file_stats")
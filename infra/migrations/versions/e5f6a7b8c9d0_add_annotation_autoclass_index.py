@@ -0,0 +1,45 @@
+"""add partial index for auto_classification annotations
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e5f6a7b8c9d0"
+down_revision: Union[str, Sequence[str], None] = "d4e5f6a7b8c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+WHERE = sa.text("source = 'auto_classification'")
+
+
+def upgrade() -> None:
+    """Upgrade schema - partial (file_id) index for classification lookups.
+
+    classify_file and batch_classify_files look up a file's
+    auto_classification annotation by file_id; the partial index only holds
+    that subset. idx_annotation_file_source stays for the other sources.
+    """
+    if not sa.inspect(op.get_bind()).has_table("annotations"):
+        return
+
+    op.create_index(
+        "idx_annotation_autoclass",
+        "annotations",
+        ["file_id"],
+        unique=False,
+        sqlite_where=WHERE,
+        postgresql_where=WHERE,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_annotation_autoclass", table_name="annotations", if_exists=True)
@@ -0,0 +1,84 @@
+"""use jsonb and gin indexes for reasoning/script payload columns
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f6a7b8c9d0e1"
+down_revision: Union[str, Sequence[str], None] = "e5f6a7b8c9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JSONB_COLUMNS = {
+    "reasoning_nodes": ["config", "inputs", "outputs"],
+    "reasoning_executions": ["input_data", "results"],
+    "scripts": ["parameters"],
+    "script_executions": ["input_params", "result"],
+}
+
+GIN_INDEXES = [
+    ("idx_exec_results_gin", "reasoning_executions", "results"),
+    ("idx_exec_input_data_gin", "reasoning_executions", "input_data"),
+    ("idx_script_parameters_gin", "scripts", "parameters"),
+    ("idx_script_exec_input_params_gin", "script_executions", "input_params"),
+    ("idx_script_exec_result_gin", "script_executions", "result"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema - convert JSON payload columns to JSONB on PostgreSQL.
+
+    JSONB is stored decomposed, so reads skip the reparse and nested-key
+    filters can use the jsonb_path_ops GIN indexes. Other dialects keep JSON.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    inspector = sa.inspect(bind)
+    for table, columns in JSONB_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        for column in columns:
+            op.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb"
+            )
+
+    for name, table, column in GIN_INDEXES:
+        if not inspector.has_table(table):
+            continue
+        op.create_index(
+            name,
+            table,
+            [column],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={column: "jsonb_path_ops"},
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    for name, table, _column in GIN_INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
+
+    inspector = sa.inspect(bind)
+    for table, columns in JSONB_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        for column in columns:
+            op.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE json USING {column}::json"
+            )
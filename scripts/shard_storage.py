@@ -0,0 +1,70 @@
+"""
+將既有檔案從平鋪目錄搬移到依 hash 前綴分層的目錄，並更新 storage_key
+
+每批先以 LocalStorage.relocate 把檔案連結（或複製）到分層路徑並 commit 新的 storage_key，
+commit 成功後才刪除舊檔；中途中斷時資料庫指向的檔案都仍存在，
+最多只留下該批已建立的新路徑，重新執行即可接續。
+
+用法：
+    python scripts/shard_storage.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import models  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.storage import LocalStorage  # noqa: E402
+
+BATCH_SIZE = 500
+
+
+def shard_batch(db, storage: LocalStorage, records) -> int:
+    """
+    搬移一批檔案記錄：建立新路徑 -> commit storage_key -> 刪除舊檔
+
+    Returns:
+        本批搬移的檔案數
+    """
+    old_keys = []
+    for record in records:
+        target = storage.relocate(record.storage_key, record.file_hash)
+        if target == record.storage_key:
+            continue
+        old_keys.append(record.storage_key)
+        record.storage_key = target
+    db.commit()
+
+    for key, error in storage.delete_many(old_keys).items():
+        print(f"failed to remove {key}: {error}")
+    return len(old_keys)
+
+
+def main() -> None:
+    storage = LocalStorage()
+    db = SessionLocal()
+    moved = 0
+    last_id = 0
+    try:
+        # 以主鍵分批（keyset），每批 commit 後重新查詢，不跨 commit 持有游標
+        while True:
+            records = (
+                db.query(models.File)
+                .filter(models.File.id > last_id)
+                .order_by(models.File.id)
+                .limit(BATCH_SIZE)
+                .all()
+            )
+            if not records:
+                break
+            last_id = records[-1].id
+            moved += shard_batch(db, storage, records)
+    finally:
+        db.close()
+    print(f"moved {moved} files")
+
+
+if __name__ == "__main__":
+    main()